@@ -0,0 +1,148 @@
+"""Cross-session semantic answer cache.
+
+Visitors asking the same FAQ in slightly different words get the answer that
+was generated for the first of them. Queries are matched by cosine similarity
+of their embeddings; the cache is cleared whenever the knowledge base changes.
+
+With a shared ``store`` (the SQLite session store) answers are written there
+and every worker pulls the rows added since its last lookup into its own
+matrix, so the hit rate does not depend on how many workers run. Lookups then
+do one small indexed read, so call them off the event loop like other store
+calls. Without a store the cache is private to the process.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "0") == "1"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+
+
+class SemanticAnswerCache:
+    """Answers keyed by query embedding, matched above a similarity threshold."""
+
+    def __init__(
+        self,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+        store=None,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: List[Dict[str, Any]] = []
+        self._matrix: Optional[np.ndarray] = None  # unit-normalised embeddings, one row per entry
+        self._lock = threading.Lock()
+        self._store = store
+        self._last_id = 0  # newest store row already pulled into the matrix
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, embedding, scope: str = "") -> Optional[Dict[str, Any]]:
+        """Return ``{"answer", "sources", "query", "similarity"}`` for the closest fresh match.
+
+        Only answers stored under the same ``scope`` (tenant and filters) match.
+        """
+        query_vector = self._normalize(embedding)
+        with self._lock:
+            self._pull_from_store()
+            self._drop_expired()
+            if self._matrix is None or not self._entries:
+                self.misses += 1
+                return None
+
+            similarities = self._matrix @ query_vector
+            similarities[[entry["scope"] != scope for entry in self._entries]] = -np.inf
+            best = int(np.argmax(similarities))
+            entry = self._entries[best]
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return {**entry, "similarity": float(similarities[best])}
+
+    def _pull_from_store(self) -> None:
+        """Append answers other workers (or this one) stored since the last pull."""
+        if self._store is None:
+            return
+        rows = self._store.answers_since(self._last_id, self.ttl_seconds)
+        if not rows:
+            return
+        self._last_id = rows[-1][0]
+        for _, entry, embedding in rows:
+            self._append(entry, np.frombuffer(embedding, dtype=np.float32))
+
+    def _append(self, entry: Dict[str, Any], vector: np.ndarray) -> None:
+        if len(self._entries) >= self.max_entries:
+            # Entries are appended in time order, so the first one is the oldest
+            self._entries.pop(0)
+            self._matrix = self._matrix[1:]
+        self._entries.append(entry)
+        row = vector[np.newaxis, :]
+        self._matrix = row if self._matrix is None else np.vstack([self._matrix, row])
+
+    def _drop_expired(self) -> None:
+        """Drop entries older than the TTL; they are stored in time order, so they are a prefix."""
+        cutoff = time.time() - self.ttl_seconds
+        expired = 0
+        while expired < len(self._entries) and self._entries[expired]["timestamp"] < cutoff:
+            expired += 1
+        if expired:
+            self._entries = self._entries[expired:]
+            self._matrix = self._matrix[expired:] if self._entries else None
+
+    def store(self, query: str, embedding, answer: str, sources: List[str], scope: str = "") -> None:
+        """Remember the answer generated for ``query``."""
+        vector = self._normalize(embedding)
+        entry = {
+            "query": query,
+            "answer": answer,
+            "sources": sources,
+            "scope": scope,
+            "timestamp": time.time(),
+        }
+        if self._store is not None:
+            # Every worker, this one included, picks it up on its next lookup
+            self._store.save_answer(entry, vector.tobytes(), self.max_entries, self.ttl_seconds)
+            return
+        with self._lock:
+            self._append(entry, vector)
+
+    def clear(self, scope_prefix: Optional[str] = None) -> None:
+        """Drop cached answers (the knowledge base changed): all, or those whose scope starts with ``scope_prefix``.
+
+        Only this process's copy; the shared store drops its rows when the
+        knowledge base is invalidated.
+        """
+        with self._lock:
+            if scope_prefix is None:
+                self._entries = []
+                self._matrix = None
+                return
+            keep = [not entry["scope"].startswith(scope_prefix) for entry in self._entries]
+            self._entries = [entry for entry, kept in zip(self._entries, keep) if kept]
+            self._matrix = self._matrix[keep] if self._entries else None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": True,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -1,6 +1,7 @@
 import streamlit as st
 import requests
 import os
+import time
 import uuid
 from datetime import datetime
 
@@ -16,6 +17,10 @@ st.set_page_config(
 
 # API Configuration
 API_URL = "http://localhost:8000"
+# Uploads are admin-only: the same value as the API's ADMIN_TOKEN
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# Give up waiting for a background ingestion job after this long
+UPLOAD_POLL_TIMEOUT_SECONDS = 600
 
 # Custom CSS
 st.markdown(
@@ -114,15 +119,33 @@ with st.sidebar:
                     response = requests.post(
                         f"{API_URL}/upload/",
                         files={"file": f},
+                        headers={"X-Admin-Token": ADMIN_TOKEN},
                         timeout=30,
                     )
 
-                if response.status_code == 200:
-                    result = response.json()
+                result = response.json() if response.status_code == 200 else {}
+                if "job_id" in result:
+                    # Poll the background ingestion job until it finishes
+                    job_id = result["job_id"]
+                    deadline = time.monotonic() + UPLOAD_POLL_TIMEOUT_SECONDS
+                    while True:
+                        status_response = requests.get(f"{API_URL}/upload/{job_id}", timeout=10)
+                        if status_response.status_code == 404:
+                            result = {"errors": ["The server lost track of this upload. Please upload it again."]}
+                            break
+                        result = status_response.json() if status_response.status_code == 200 else {}
+                        if result.get("status") in ("completed", "failed"):
+                            break
+                        if time.monotonic() > deadline:
+                            result = {"errors": ["Processing is taking longer than expected. Check back later."]}
+                            break
+                        time.sleep(1)
+
+                if result.get("status") == "completed":
                     st.session_state.document_info = {
                         "name": uploaded_file.name,
                         "upload_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        "chunks": result.get("chunks", 0),
+                        "chunks": result.get("chunks_total", 0),
                     }
                     st.session_state.document_loaded = True
                     st.session_state.messages = []
@@ -138,6 +161,8 @@ with st.sidebar:
                         - **Chunks**: {st.session_state.document_info['chunks']}
                         """
                     )
+                elif result.get("errors"):
+                    st.error(f"❌ Error processing document: {'; '.join(result['errors'])}")
                 else:
                     st.error(f"❌ Error processing document: {response.text}")
             except requests.exceptions.Timeout:
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark chat-log delivery: one POST per log vs buffered, pooled batches.
+
+Starts a local HTTP server that answers like the analytics webhook after a
+fixed latency and counts requests and bytes received. Sends N chat logs the
+old way (one synchronous send_chat_log call each, which is what /log-chat/
+used to block on) and then through ChatLogBuffer (offer() on the request
+path, batches posted in the background), with and without gzip. Reports the
+request-path cost per log, outbound request count, bytes on the wire and
+total time to deliver everything.
+
+Usage: python bench_chat_log_delivery.py [logs] [webhook_latency_ms]
+"""
+
+import asyncio
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from chat_log_buffer import ChatLogBuffer
+from webhook_handler import WebhookHandler
+
+
+def start_fake_webhook(latency_seconds):
+    received = {"requests": 0, "bytes": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-alive, so the pooled session can reuse connections
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with lock:
+                received["requests"] += 1
+                received["bytes"] += len(body)
+            time.sleep(latency_seconds)
+            self.send_response(200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, received
+
+
+def sample_chat(i):
+    history = [
+        {"role": "user", "content": "How much is the 200L solar freezer?", "timestamp": "2024-01-01T10:00:00"},
+        {"role": "assistant", "content": "The SF-200 costs ... and is available on pay-as-you-go. " * 5,
+         "timestamp": "2024-01-01T10:00:05"},
+    ] * 3
+    return f"session-{i}", history, {"name": f"Ada Customer{i}"}
+
+
+def run_direct(handler, logs):
+    offer_times = []
+    start = time.perf_counter()
+    for i in range(logs):
+        call_start = time.perf_counter()
+        handler.send_chat_log(*sample_chat(i))
+        offer_times.append(time.perf_counter() - call_start)
+    return time.perf_counter() - start, offer_times
+
+
+async def run_buffered(handler, logs, compress):
+    buffer = ChatLogBuffer(lambda batch: handler.send_chat_logs(batch, compress=compress))
+    task = buffer.start()
+    offer_times = []
+    start = time.perf_counter()
+    for i in range(logs):
+        call_start = time.perf_counter()
+        buffer.offer(handler.build_chat_log(*sample_chat(i)))
+        offer_times.append(time.perf_counter() - call_start)
+        if i % 100 == 0:
+            await asyncio.sleep(0)  # Let the flush loop run, as it would between requests
+    await buffer.flush()
+    task.cancel()
+    return time.perf_counter() - start, offer_times
+
+
+def report(label, elapsed, offer_times, received, logs):
+    p50, p99 = np.percentile(np.asarray(offer_times) * 1e6, [50, 99])
+    print(f"   {label:<18} request path p50 {p50:9.1f}µs p99 {p99:9.1f}µs  "
+          f"requests {received['requests']:>5}  {received['bytes'] / 1024:8.1f} KiB  "
+          f"{logs / elapsed:8.1f} logs/s")
+
+
+def main():
+    logs = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    server, received = start_fake_webhook(latency_ms / 1000)
+    handler = WebhookHandler()
+    handler.webhook_url = f"http://127.0.0.1:{server.server_port}/webhook"
+
+    print(f"🚀 {logs} chat logs, fake webhook {latency_ms:.0f}ms latency\n")
+    elapsed, offer_times = run_direct(handler, logs)
+    report("one POST per log", elapsed, offer_times, received, logs)
+    for compress in (False, True):
+        received.update(requests=0, bytes=0)
+        elapsed, offer_times = asyncio.run(run_buffered(handler, logs, compress))
+        report("batched + gzip" if compress else "batched", elapsed, offer_times, received, logs)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Benchmark lead delivery to a rate-limited CRM: one call per lead vs batches.
+
+Starts a local stub CRM that speaks just enough of the Zoho Insert Records
+API (/zoho) and of HubSpot's form (/hubspot/form) and contacts batch
+(/hubspot/batch) endpoints. It answers after a fixed latency, allows RATE
+calls per second (429 beyond that, with Retry-After on the HubSpot paths
+only, as the real APIs do) and rejects leads without a valid email per
+record. Each run queues N leads (every tenth invalid) in a fresh outbox and
+drains it through OutboxDispatcher, first one lead per call and then in
+batching mode. Reports sustained leads/s, calls, 429s, and whether the
+dead-lettered leads are exactly the invalid ones.
+
+Usage: python bench_crm_batching.py [leads] [calls_per_second] [crm_latency_ms]
+"""
+
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from outbox import Outbox, OutboxDispatcher
+from webhook_handler import HubSpotWebhook, ZohoCRMWebhook
+
+
+def start_stub_crm(calls_per_second, latency_seconds):
+    counters = {"calls": 0, "rate_limited": 0}
+    lock = threading.Lock()
+    window = {"start": time.monotonic(), "calls": 0}
+
+    def admit():
+        with lock:
+            now = time.monotonic()
+            if now - window["start"] >= 1:
+                window.update(start=now, calls=0)
+            if window["calls"] >= calls_per_second:
+                counters["rate_limited"] += 1
+                return False
+            window["calls"] += 1
+            counters["calls"] += 1
+            return True
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def reply(self, status, body, headers=None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            if not admit():
+                headers = {"Retry-After": "1"} if self.path.startswith("/hubspot") else {}
+                return self.reply(429, {"code": "TOO_MANY_REQUESTS"}, headers)
+            time.sleep(latency_seconds)
+            if self.path == "/zoho":
+                self.reply(201, {"data": [
+                    {"code": "SUCCESS", "status": "success", "message": "record added"}
+                    if "@" in record["Email"] else
+                    {"code": "INVALID_DATA", "status": "error", "message": "invalid email"}
+                    for record in body["data"]
+                ]})
+            elif self.path == "/hubspot/batch":
+                errors = [
+                    {"status": "error", "message": "Invalid email",
+                     "context": {"objectWriteTraceId": [item["objectWriteTraceId"]]}}
+                    for item in body["inputs"] if "@" not in item["properties"]["email"]
+                ]
+                self.reply(207 if errors else 201, {"status": "COMPLETE", "results": [], "errors": errors})
+            else:
+                fields = {field["name"]: field["value"] for field in body["fields"]}
+                self.reply(200 if "@" in fields["email"] else 400, {})
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, counters
+
+
+def sample_lead(i):
+    return {
+        "name": f"Ada Customer{i}",
+        "email": f"ada{i}.example.com" if i % 10 == 0 else f"ada{i}@example.com",
+        "phone": "+234 800 000 0000",
+        "message": "Interested in the 200L solar freezer on pay-as-you-go",
+        "interested_products": ["SF-200"],
+        "session_id": f"session-{i}",
+    }
+
+
+async def run(handler, leads, batched):
+    outbox = Outbox(path=os.path.join(tempfile.mkdtemp(prefix="bench_crm_"), "outbox.db"), max_attempts=1)
+    for i in range(leads):
+        outbox.append("lead", sample_lead(i))
+    dispatcher = OutboxDispatcher(
+        outbox,
+        lambda topic, payload: handler.send_lead(**payload),
+        poll_seconds=0.05,
+        deliver_batch=(lambda topic, payloads: handler.send_leads(payloads)) if batched else None,
+        batch_size=handler.batch_size,
+    )
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # handlers log every lead
+        task = dispatcher.start()
+        await dispatcher.drain(timeout=600)
+        task.cancel()
+    elapsed = time.perf_counter() - start
+    dead = {letter["payload"]["session_id"] for letter in outbox.dead_letters(limit=leads)}
+    return elapsed, dispatcher.stats(), dead
+
+
+def main():
+    leads = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    calls_per_second = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    latency_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 30
+
+    server, counters = start_stub_crm(calls_per_second, latency_ms / 1000)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    invalid = {f"session-{i}" for i in range(0, leads, 10)}
+
+    print(f"🚀 {leads} leads ({len(invalid)} invalid), stub CRM {calls_per_second} calls/s, "
+          f"{latency_ms:.0f}ms latency\n")
+    for provider in ("zoho", "hubspot"):
+        for batched in (False, True):
+            if provider == "zoho":
+                handler = ZohoCRMWebhook()
+                handler.webhook_url = f"{base_url}/zoho"
+            else:
+                handler = HubSpotWebhook()
+                handler.webhook_url = f"{base_url}/hubspot/form"
+                handler.batch_url = f"{base_url}/hubspot/batch"
+                handler.webhook_secret = "token"
+            handler.batch_size = handler.MAX_BATCH_RECORDS if batched else 1
+            counters.update(calls=0, rate_limited=0)
+            elapsed, stats, dead = asyncio.run(run(handler, leads, batched))
+            mode = f"batches of {handler.batch_size}" if batched else "one per call"
+            print(f"   {provider:<8} {mode:<16} {stats['delivered'] / elapsed:8.1f} leads/s  "
+                  f"calls {counters['calls']:>4}  429s {counters['rate_limited']:>4}  "
+                  f"delivered {stats['delivered']}  failed {len(dead)}  "
+                  f"failures mapped {'✅' if dead == invalid else '❌'}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Load test for the chat LLM call path against a local fake completion server.
+
+Compares the old pattern (sync client inside asyncio.to_thread) with the
+native async client from query_llm. The fake server answers every
+/chat/completions request after a fixed delay, so throughput is bounded only
+by how many calls the client side can keep in flight.
+
+Usage: python bench_llm_concurrency.py [concurrency] [latency_seconds]
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+
+FAKE_HOST = "127.0.0.1"
+FAKE_PORT = 8765
+
+COMPLETION_BODY = json.dumps({
+    "id": "chatcmpl-fake",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-4o-mini",
+    "choices": [{
+        "index": 0,
+        "message": {"role": "assistant", "content": "Fake answer from the local server."},
+        "finish_reason": "stop",
+    }],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}).encode()
+
+
+async def _handle_connection(reader, writer, latency):
+    """Serve keep-alive HTTP/1.1 requests with a canned completion."""
+    try:
+        while True:
+            header_block = await reader.readuntil(b"\r\n\r\n")
+            content_length = 0
+            for line in header_block.decode("latin-1").split("\r\n"):
+                if line.lower().startswith("content-length:"):
+                    content_length = int(line.split(":", 1)[1])
+            if content_length:
+                await reader.readexactly(content_length)
+
+            await asyncio.sleep(latency)
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: application/json\r\n"
+                b"Connection: keep-alive\r\n"
+                + f"Content-Length: {len(COMPLETION_BODY)}\r\n\r\n".encode()
+                + COMPLETION_BODY
+            )
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionResetError):
+        pass
+    finally:
+        writer.close()
+
+
+def start_fake_server(latency):
+    """Run the fake completion server on a background event loop."""
+    ready = threading.Event()
+
+    def _run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        server = loop.run_until_complete(asyncio.start_server(
+            lambda r, w: _handle_connection(r, w, latency),
+            FAKE_HOST,
+            FAKE_PORT,
+            backlog=4096,
+        ))
+        ready.set()
+        loop.run_until_complete(server.serve_forever())
+
+    threading.Thread(target=_run, daemon=True).start()
+    ready.wait()
+
+
+async def run_threaded(concurrency):
+    """Old path: sync client in the default thread pool."""
+    from query_llm import generate_chat_response
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        asyncio.to_thread(generate_chat_response, query="ping", context=[])
+        for _ in range(concurrency)
+    ])
+    return time.perf_counter() - start
+
+
+async def run_async(concurrency):
+    """New path: pooled async client awaited directly."""
+    from query_llm import agenerate_chat_response
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        agenerate_chat_response(query="ping", context=[])
+        for _ in range(concurrency)
+    ])
+    return time.perf_counter() - start
+
+
+def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+
+    # Point the OpenAI clients at the fake server before query_llm is imported
+    os.environ["OPENAI_BASE_URL"] = f"http://{FAKE_HOST}:{FAKE_PORT}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+    start_fake_server(latency)
+
+    print(f"🚀 {concurrency} concurrent chats, {latency:.2f}s simulated LLM latency\n")
+    for label, runner in [("to_thread + sync client", run_threaded), ("async client", run_async)]:
+        elapsed = asyncio.run(runner(concurrency))
+        print(f"   {label:<24} {elapsed:6.2f}s  {concurrency / elapsed:8.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Benchmark serial vs. process-pool OCR in pdf_extractor.extract_images_from_pdf.
+
+Builds a synthetic multi-page PDF where every page carries a distinct embedded
+image of rendered text, then times extraction for a range of worker counts.
+
+Usage: python bench_ocr_parallel.py [pages] [images_per_page]
+"""
+
+import io
+import os
+import sys
+import time
+
+import fitz
+from PIL import Image, ImageDraw
+
+
+def build_synthetic_pdf(pages, images_per_page):
+    """Return PDF bytes with unique text images embedded on every page."""
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        for img_index in range(images_per_page):
+            image = Image.new("RGB", (800, 200), "white")
+            draw = ImageDraw.Draw(image)
+            draw.text((20, 40), f"Koolboks SF-{page_num:03d}-{img_index} Solar Freezer", fill="black")
+            draw.text((20, 110), f"Price N{150000 + page_num * 1000 + img_index}", fill="black")
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG")
+            top = 40 + img_index * 180
+            page.insert_image(fitz.Rect(40, top, 560, top + 130), stream=buffer.getvalue())
+    pdf_bytes = doc.tobytes()
+    doc.close()
+    return pdf_bytes
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 24
+    images_per_page = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+
+    from pdf_extractor import extract_images_from_pdf
+
+    pdf_bytes = build_synthetic_pdf(pages, images_per_page)
+    cpu_count = os.cpu_count() or 1
+    worker_counts = sorted({1, 2, 4, 8, cpu_count} & set(range(1, cpu_count + 1)))
+
+    print(f"🚀 OCR over {pages} pages x {images_per_page} images ({cpu_count} cores)\n")
+    baseline = None
+    for workers in worker_counts:
+        if workers > 1:
+            # Warm the pool so PaddleOCR start-up is not counted
+            extract_images_from_pdf(build_synthetic_pdf(workers, 1), workers=workers)
+        start = time.perf_counter()
+        texts = extract_images_from_pdf(pdf_bytes, workers=workers)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        print(f"   workers={workers:<3} {elapsed:7.2f}s  speedup {baseline / elapsed:4.2f}x  ({len(texts)} texts)")
+
+
+if __name__ == "__main__":
+    main()
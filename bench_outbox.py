@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark lead delivery through the durable outbox against a fake CRM.
+
+Starts a local HTTP server that answers like a CRM webhook after a fixed
+latency and fails a share of requests with 503, appends N leads to a fresh
+outbox (reporting append latency, i.e. the cost left on the request path),
+then drains it with OutboxDispatcher at several concurrency levels and
+reports delivered leads/s, retries and dead letters.
+
+Usage: python bench_outbox.py [leads] [crm_latency_ms] [failure_rate]
+"""
+
+import asyncio
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from outbox import Outbox, OutboxDispatcher
+from webhook_handler import WebhookHandler
+
+
+def start_fake_crm(latency_seconds, failure_rate):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency_seconds)
+            status = 503 if random.random() < failure_rate else 200
+            self.send_response(status)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def sample_lead(i):
+    return {
+        "name": f"Ada Customer{i}",
+        "email": f"ada{i}@example.com",
+        "phone": "+234 800 000 0000",
+        "message": "Interested in the 200L solar freezer on pay-as-you-go",
+        "interested_products": ["SF-200"],
+        "session_id": f"session-{i}",
+        "chat_history": [{"role": "user", "content": "How much is the SF-200?"}],
+    }
+
+
+async def run(handler, leads, concurrency):
+    outbox = Outbox(
+        path=os.path.join(tempfile.mkdtemp(prefix="bench_outbox_"), "outbox.db"),
+        backoff_base_seconds=0.05,
+        backoff_max_seconds=0.5,
+    )
+    append_times = []
+    for i in range(leads):
+        start = time.perf_counter()
+        outbox.append("lead", sample_lead(i))
+        append_times.append(time.perf_counter() - start)
+
+    dispatcher = OutboxDispatcher(
+        outbox, lambda topic, payload: handler.send_lead(**payload), concurrency=concurrency, poll_seconds=0.05
+    )
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # send_lead logs every lead
+        task = dispatcher.start()
+        await dispatcher.drain(timeout=300)
+        task.cancel()
+    return time.perf_counter() - start, dispatcher.stats(), append_times
+
+
+def main():
+    leads = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 50
+    failure_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.1
+
+    server = start_fake_crm(latency_ms / 1000, failure_rate)
+    handler = WebhookHandler()
+    handler.webhook_url = f"http://127.0.0.1:{server.server_port}/webhook"
+
+    print(f"🚀 {leads} leads, fake CRM {latency_ms:.0f}ms latency, {failure_rate:.0%} failures\n")
+    for concurrency in (1, 4, 16):
+        elapsed, stats, append_times = asyncio.run(run(handler, leads, concurrency))
+        p50, p99 = np.percentile(np.asarray(append_times) * 1000, [50, 99])
+        print(f"   concurrency {concurrency:>2}  {stats['delivered'] / elapsed:7.1f} leads/s  "
+              f"delivered {stats['delivered']}  retries {stats['retried']}  dead {stats['dead_lettered']}  "
+              f"append p50 {p50:.3f}ms p99 {p99:.3f}ms")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
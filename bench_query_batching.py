@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Benchmark query-embedding throughput under concurrent chats.
+
+Runs N concurrent "chats", each embedding a stream of distinct queries, first
+with one batch-of-1 encode per query on the default thread pool (the old
+hybrid_search path) and then through embedding_batcher.MicroBatcher.
+
+Usage: python bench_query_batching.py [concurrency] [queries_per_chat]
+"""
+
+import asyncio
+import sys
+import time
+
+from sentence_transformers import SentenceTransformer
+
+from embedding_batcher import MicroBatcher
+
+MODEL_NAME = "sentence-transformers/multi-qa-mpnet-base-dot-v1"
+
+
+async def run_unbatched(model, concurrency, queries_per_chat):
+    async def chat(chat_id):
+        for i in range(queries_per_chat):
+            await asyncio.to_thread(model.encode, [f"how much is the solar freezer {chat_id}-{i}"])
+
+    start = time.perf_counter()
+    await asyncio.gather(*[chat(c) for c in range(concurrency)])
+    return time.perf_counter() - start
+
+
+async def run_batched(model, concurrency, queries_per_chat, max_batch_size, max_wait_ms):
+    batcher = MicroBatcher(
+        lambda texts: model.encode(list(texts), show_progress_bar=False),
+        max_batch_size=max_batch_size,
+        max_wait_ms=max_wait_ms,
+    )
+
+    async def chat(chat_id):
+        for i in range(queries_per_chat):
+            await batcher.embed(f"how much is the solar freezer {chat_id}-{i}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*[chat(c) for c in range(concurrency)])
+    return time.perf_counter() - start, batcher.stats()
+
+
+def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    queries_per_chat = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    total = concurrency * queries_per_chat
+
+    model = SentenceTransformer(MODEL_NAME)
+    model.encode(["warm up"])
+
+    print(f"🚀 {concurrency} concurrent chats x {queries_per_chat} queries\n")
+    elapsed = asyncio.run(run_unbatched(model, concurrency, queries_per_chat))
+    print(f"   batch-of-1 encode        {elapsed:6.2f}s  {total / elapsed:7.1f} queries/s")
+    for max_batch_size, max_wait_ms in [(16, 5), (32, 5), (64, 10)]:
+        elapsed, stats = asyncio.run(run_batched(model, concurrency, queries_per_chat, max_batch_size, max_wait_ms))
+        print(f"   micro-batch {max_batch_size:>2} / {max_wait_ms:>2}ms   {elapsed:6.2f}s  "
+              f"{total / elapsed:7.1f} queries/s  (mean batch {stats['mean_batch_size']:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Benchmark retrieval quality and latency: vector-only, BM25-only and fused.
+
+Builds a synthetic product catalog (one chunk per product, each with a model
+code, capacity and naira price), then asks questions the way customers type
+them: by exact code, by price, and in plain words. Reports recall@k and mean
+per-query search latency for each retriever. Vectors are kept in memory so
+the numbers isolate ranking quality rather than Chroma overhead.
+
+Usage: python bench_retrieval.py [products]
+"""
+
+import random
+import sys
+import time
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from bm25_index import BM25Index, reciprocal_rank_fusion
+
+MODEL_NAME = "sentence-transformers/multi-qa-mpnet-base-dot-v1"
+CANDIDATES = 10
+KS = (1, 3, 5)
+
+KINDS = ["solar freezer", "solar fridge", "chest freezer", "ice maker", "cold room"]
+USES = ["fish sellers", "drinks vendors", "pharmacies", "restaurants", "farm produce"]
+
+
+def build_catalog(n_products, rng):
+    products = []
+    for i in range(n_products):
+        kind = rng.choice(KINDS)
+        code = f"{kind.split()[-1][:2].upper()}-{100 + i}"
+        litres = rng.choice([100, 150, 200, 250, 300, 400, 500])
+        price = rng.randrange(250, 3000) * 1000
+        use = rng.choice(USES)
+        text = (
+            f"The Koolboks {code} is a {litres} litre {kind} built for {use}. "
+            f"It runs on solar power with an ice battery that keeps it cold for days "
+            f"without sunlight. Outright price: ₦{price:,}. Pay-as-you-go plans are available."
+        )
+        products.append({"id": f"catalog:{i}", "code": code, "price": price, "kind": kind, "use": use, "text": text})
+    return products
+
+
+def build_queries(products, rng, n_queries):
+    queries = []
+    for product in rng.sample(products, min(n_queries, len(products))):
+        queries.append((f"How much is the {product['code']}?", product["id"], "code"))
+        queries.append((f"which one costs ₦{product['price']:,}", product["id"], "price"))
+        queries.append((f"{product['code'].replace('-', '')} warranty and capacity", product["id"], "code"))
+    return queries
+
+
+def recall_at(rankings, queries, k):
+    hits = sum(1 for ranking, (_, target, _) in zip(rankings, queries) if target in ranking[:k])
+    return hits / len(queries)
+
+
+def main():
+    n_products = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    rng = random.Random(7)
+    products = build_catalog(n_products, rng)
+    queries = build_queries(products, rng, n_queries=100)
+    ids = [product["id"] for product in products]
+
+    model = SentenceTransformer(MODEL_NAME)
+    start = time.perf_counter()
+    doc_vectors = model.encode([product["text"] for product in products], batch_size=64, show_progress_bar=False)
+    print(f"🔄 Embedded {n_products} catalog chunks in {time.perf_counter() - start:.1f}s")
+
+    index = BM25Index()
+    start = time.perf_counter()
+    index.add(ids, [product["text"] for product in products])
+    print(f"🔄 Built BM25 index in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    query_vectors = model.encode([query for query, _, _ in queries], batch_size=64, show_progress_bar=False)
+
+    vector_rankings, lexical_rankings, fused_rankings = [], [], []
+    vector_time = lexical_time = fusion_time = 0.0
+    for (query, _, _), query_vector in zip(queries, query_vectors):
+        start = time.perf_counter()
+        scores = doc_vectors @ query_vector
+        top = np.argpartition(-scores, CANDIDATES)[:CANDIDATES]
+        vector_ranking = [ids[i] for i in top[np.argsort(-scores[top])]]
+        vector_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        lexical_ranking = [chunk_id for chunk_id, _ in index.search(query, CANDIDATES)]
+        lexical_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        fused_ranking = reciprocal_rank_fusion([vector_ranking, lexical_ranking])
+        fusion_time += time.perf_counter() - start
+
+        vector_rankings.append(vector_ranking)
+        lexical_rankings.append(lexical_ranking)
+        fused_rankings.append(fused_ranking)
+
+    n = len(queries)
+    print(f"\n🚀 {n} queries over {n_products} chunks (top {CANDIDATES} candidates per retriever)\n")
+    header = "   retriever     " + "".join(f"recall@{k:<4}" for k in KS) + "  latency/query"
+    print(header)
+    rows = [
+        ("vector only", vector_rankings, vector_time),
+        ("BM25 only", lexical_rankings, lexical_time),
+        ("fused (RRF)", fused_rankings, vector_time + lexical_time + fusion_time),
+    ]
+    for name, rankings, elapsed in rows:
+        recalls = "".join(f"{recall_at(rankings, queries, k):<11.2f}" for k in KS)
+        print(f"   {name:<13} {recalls} {elapsed / n * 1000:8.3f}ms")
+
+    for kind in ("code", "price"):
+        subset = [i for i, (_, _, query_kind) in enumerate(queries) if query_kind == kind]
+        by_kind = [
+            f"{name} {recall_at([rankings[i] for i in subset], [queries[i] for i in subset], 3):.2f}"
+            for name, rankings, _ in rows
+        ]
+        print(f"\n   recall@3 on {kind} queries: " + ", ".join(by_kind))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Benchmark chat-path session bookkeeping with many live sessions.
+
+Compares the old per-request full scan (cleanup_old_sessions over a dict) with
+the new path, where a request only touches its own session and expiry runs in
+the background reaper.
+
+Usage: python bench_session_reaper.py [live_sessions] [requests]
+"""
+
+import sys
+import time
+
+from session_store import InProcessStore
+
+
+def old_request_path(conversations, session_id, now):
+    """Bookkeeping as main.chat did it before the reaper."""
+    for sid in list(conversations.keys()):
+        if now - conversations[sid]["last_access"] > 3600:
+            del conversations[sid]
+    state = conversations.setdefault(session_id, {"history": [], "last_access": now})
+    state["last_access"] = now
+
+
+def main():
+    live_sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    now = time.time()
+
+    print(f"🚀 {live_sessions} live sessions, {requests} chat requests\n")
+    for sessions in (1_000, live_sessions):
+        conversations = {f"s{i}": {"history": [], "last_access": now} for i in range(sessions)}
+        start = time.perf_counter()
+        for i in range(requests):
+            old_request_path(conversations, f"s{i}", time.time())
+        old_us = (time.perf_counter() - start) / requests * 1e6
+
+        store = InProcessStore(100, 600, max_sessions=sessions * 2)
+        for i in range(sessions):
+            store.touch_session(f"s{i}", now)
+        start = time.perf_counter()
+        for i in range(requests):
+            store.touch_session(f"s{i}", time.time())
+        new_us = (time.perf_counter() - start) / requests * 1e6
+
+        start = time.perf_counter()
+        store.expire_sessions(3600)
+        reap_us = (time.perf_counter() - start) * 1e6
+
+        print(f"   {sessions:>7} sessions: scan per request {old_us:9.1f} us | "
+              f"touch per request {new_us:5.2f} us | background reap pass {reap_us:6.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for ttl_cache.TTLCache.
+
+Fills the cache to capacity and measures the mean cost of get/set (with
+eviction) as the capacity grows, to show per-operation cost stays flat.
+
+Usage: python bench_ttl_cache.py [operations]
+"""
+
+import sys
+import time
+
+from ttl_cache import TTLCache
+
+
+def bench(max_entries, operations):
+    cache = TTLCache(max_entries=max_entries, ttl_seconds=600)
+    context = ["chunk of retrieved context"] * 3
+    for i in range(max_entries):
+        cache.set(f"session:{i}", context)
+
+    # Every set is a new key, so each one evicts the least recently used entry
+    start = time.perf_counter()
+    for i in range(operations):
+        cache.set(f"new:{i}", context)
+    set_ns = (time.perf_counter() - start) / operations * 1e9
+
+    start = time.perf_counter()
+    for i in range(operations):
+        cache.get(f"new:{i % max_entries}")
+    get_ns = (time.perf_counter() - start) / operations * 1e9
+    return set_ns, get_ns
+
+
+def main():
+    operations = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    print(f"🚀 TTLCache, {operations} operations per size\n")
+    print(f"   {'entries':>8}  {'set+evict ns/op':>16}  {'get ns/op':>10}")
+    for max_entries in (100, 1_000, 10_000, 100_000):
+        set_ns, get_ns = bench(max_entries, operations)
+        print(f"   {max_entries:>8}  {set_ns:>16.0f}  {get_ns:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark vector-search latency: Chroma vs the in-memory NumPy engine.
+
+Indexes random 768-dimensional embeddings (the size of our model's vectors)
+at several corpus sizes into a throwaway persistent Chroma collection and
+into vector_index.NumpyVectorIndex (float32 and float16, memory-mapped from
+disk as in production), then times single queries (p50/p99) and one batched
+call of the same queries on the NumPy engine.
+
+Usage: python bench_vector_engine.py [sizes...]   (default: 1000 10000 100000)
+"""
+
+import shutil
+import sys
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+from chromadb.config import Settings
+
+from vector_index import NumpyVectorIndex
+
+DIM = 768
+QUERIES = 200
+TOP_K = 10
+
+
+def percentiles(samples):
+    samples = np.asarray(samples) * 1000
+    return np.percentile(samples, 50), np.percentile(samples, 99)
+
+
+def bench_chroma(workdir, ids, vectors, queries):
+    client = chromadb.PersistentClient(path=f"{workdir}/chroma", settings=Settings(anonymized_telemetry=False))
+    collection = client.create_collection(name="bench")
+    for start in range(0, len(ids), 5000):
+        collection.add(ids=ids[start:start + 5000], embeddings=vectors[start:start + 5000].tolist())
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        collection.query(query_embeddings=[query.tolist()], n_results=TOP_K)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def bench_numpy(workdir, ids, vectors, queries, dtype):
+    index = NumpyVectorIndex(f"{workdir}/vectors-{dtype}", dtype=dtype, space="l2")
+    index.reset(ids, vectors)
+    index.save()  # Searches below run against the memory-mapped file
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, TOP_K)
+        timings.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    index.search_batch(queries, TOP_K)
+    return timings, time.perf_counter() - start
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    rng = np.random.default_rng(0)
+    queries = rng.standard_normal((QUERIES, DIM), dtype=np.float32)
+
+    print(f"🚀 {QUERIES} queries, top {TOP_K}, {DIM} dims\n")
+    print(f"   {'chunks':>7}  {'engine':<14} {'p50 ms':>8} {'p99 ms':>8}  {'batched ms/query':>16}")
+    for size in sizes:
+        ids = [f"doc:{i}" for i in range(size)]
+        vectors = rng.standard_normal((size, DIM), dtype=np.float32)
+        workdir = tempfile.mkdtemp(prefix="bench_vector_engine_")
+        try:
+            p50, p99 = percentiles(bench_chroma(workdir, ids, vectors, queries))
+            print(f"   {size:>7}  {'chroma':<14} {p50:8.3f} {p99:8.3f}  {'-':>16}")
+            for dtype in ("float32", "float16"):
+                timings, batched = bench_numpy(workdir, ids, vectors, queries, dtype)
+                p50, p99 = percentiles(timings)
+                print(f"   {size:>7}  {'numpy ' + dtype:<14} {p50:8.3f} {p99:8.3f}  "
+                      f"{batched / QUERIES * 1000:16.3f}")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Measure per-worker and total memory of the gunicorn deployment.
+
+Starts gunicorn with 1, 4 and 8 workers, with and without PRELOAD_MODELS,
+lets every worker warm up its models (WARMUP_ON_STARTUP=1), then reads RSS and
+PSS of the master and each worker from /proc. PSS is the fair total: shared
+copy-on-write pages are split between the processes that map them.
+
+Usage: python bench_worker_memory.py [settle_seconds]
+"""
+
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import requests
+
+from memory_stats import process_memory
+
+PORT = 8011
+
+
+def child_pids(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def wait_until_up(timeout=300):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"http://127.0.0.1:{PORT}/health", timeout=2).ok:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(1)
+    return False
+
+
+def measure(workers, preload, settle_seconds):
+    env = dict(os.environ, PRELOAD_MODELS="1" if preload else "0", WARMUP_ON_STARTUP="1")
+    master = subprocess.Popen(
+        ["gunicorn", "-c", "gunicorn.conf.py", "-w", str(workers),
+         "-k", "uvicorn.workers.UvicornWorker", "main:app", f"--bind=127.0.0.1:{PORT}"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        if not wait_until_up():
+            return None
+        time.sleep(settle_seconds)  # background warm-up in every worker
+        worker_stats = [process_memory(pid) for pid in child_pids(master.pid)]
+        worker_stats = [stats for stats in worker_stats if stats]
+        master_stats = process_memory(master.pid)
+        return master_stats, worker_stats
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait(timeout=60)
+
+
+def main():
+    settle_seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 60
+
+    print("🚀 gunicorn memory (MiB)\n")
+    print(f"   {'preload':<8}{'workers':>8}{'RSS/worker':>12}{'total RSS':>11}{'total PSS':>11}")
+    for preload in (False, True):
+        for workers in (1, 4, 8):
+            result = measure(workers, preload, settle_seconds)
+            if result is None:
+                print(f"   {str(preload):<8}{workers:>8}  failed to start")
+                continue
+            master_stats, worker_stats = result
+            all_stats = [master_stats] + worker_stats
+            per_worker = sum(s["rss_mb"] for s in worker_stats) / max(len(worker_stats), 1)
+            total_rss = sum(s["rss_mb"] for s in all_stats)
+            total_pss = sum(s["pss_mb"] for s in all_stats)
+            print(f"   {str(preload):<8}{workers:>8}{per_worker:>12.0f}{total_rss:>11.0f}{total_pss:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""In-process BM25 inverted index over stored chunks.
+
+Vector search is weak on exact product codes, model numbers and naira
+prices, so retrieval also runs this lexical index and fuses both rankings
+with reciprocal rank fusion. The index is updated incrementally alongside
+the Chroma collection and persisted as JSON next to it; other workers
+reload it when the file changes. Changes not yet saved are kept in a journal
+and replayed over every reload, and saves merge under a cross-process lock
+(see ``file_lock``), so concurrent workers never drop each other's chunks.
+"""
+
+import itertools
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Collection, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from file_lock import file_lock, file_version
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-.,/][a-z0-9]+)*")
+_SEPARATOR_RE = re.compile(r"[-.,/]")
+_STOPWORDS = frozenset(
+    "a an and are as at be by do for from has have how i in is it of on or our "
+    "the this to was what when where which with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens that keep codes and prices searchable.
+
+    A compound such as ``sf-400`` or ``1,324,000`` yields the compound, its
+    separator-free form (``sf400``, ``1324000``) and its alphanumeric parts,
+    so "SF400", "SF-400" and "sf 400" all meet.
+    """
+    tokens = []
+    for match in _TOKEN_RE.findall(text.lower()):
+        if match in _STOPWORDS:
+            continue
+        tokens.append(match)
+        if _SEPARATOR_RE.search(match):
+            tokens.append(_SEPARATOR_RE.sub("", match))
+            tokens.extend(part for part in _SEPARATOR_RE.split(match) if len(part) > 1)
+    return tokens
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[str]:
+    """Merge ranked id lists: each id scores ``sum(1 / (k + rank))`` over the lists."""
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] += 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def metadata_matches(metadata: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+    """True if every filter key equals (or, for a list, is one of) the metadata value."""
+    for key, expected in filters.items():
+        value = metadata.get(key)
+        if isinstance(expected, (list, tuple, set)):
+            if value not in expected:
+                return False
+        elif value != expected:
+            return False
+    return True
+
+
+class BM25Index:
+    """Incrementally updatable BM25 index of ``chunk id -> text``."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._lock = threading.RLock()
+        self._texts: Dict[str, str] = {}
+        self._metadatas: Dict[str, Dict] = {}
+        self._term_freqs: Dict[str, Counter] = {}
+        self._lengths: Dict[str, int] = {}
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._total_length = 0
+        self._loaded_version = None
+        # Unsaved changes: chunk id -> (text, metadata), or None once removed
+        self._unsaved: Dict[str, Optional[Tuple[str, Dict]]] = {}
+        # Set by reset(): the next save replaces the file instead of merging
+        self._replaced = False
+        if path and os.path.exists(path):
+            with file_lock(path, shared=True):
+                self._load()
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._texts
+
+    def add(self, ids: Iterable[str], texts: Iterable[str], metadatas: Optional[Iterable[Dict]] = None) -> None:
+        metadatas = metadatas if metadatas is not None else itertools.repeat(None)
+        with self._lock:
+            for chunk_id, text, metadata in zip(ids, texts, metadatas):
+                self._add_one(chunk_id, text, metadata or {})
+                if self.path:
+                    self._unsaved[chunk_id] = (text, metadata or {})
+
+    def remove(self, ids: Iterable[str]) -> None:
+        with self._lock:
+            for chunk_id in ids:
+                if chunk_id in self._texts:
+                    self._remove_one(chunk_id)
+                if self.path:
+                    self._unsaved[chunk_id] = None
+
+    def reset(self, ids: Iterable[str], texts: Iterable[str], metadatas: Optional[Iterable[Dict]] = None) -> None:
+        """Replace every entry, e.g. when rebuilding from the Chroma collection."""
+        with self._lock:
+            self._clear()
+            self.add(ids, texts, metadatas)
+            self._replaced = True
+
+    def _clear(self) -> None:
+        self._texts.clear()
+        self._metadatas.clear()
+        self._term_freqs.clear()
+        self._lengths.clear()
+        self._postings.clear()
+        self._total_length = 0
+
+    def _add_one(self, chunk_id: str, text: str, metadata: Dict) -> None:
+        if chunk_id in self._texts:
+            self._remove_one(chunk_id)
+        term_freqs = Counter(tokenize(text))
+        self._texts[chunk_id] = text
+        self._metadatas[chunk_id] = metadata
+        self._term_freqs[chunk_id] = term_freqs
+        self._lengths[chunk_id] = sum(term_freqs.values())
+        self._total_length += self._lengths[chunk_id]
+        for term, freq in term_freqs.items():
+            self._postings[term][chunk_id] = freq
+
+    def _remove_one(self, chunk_id: str) -> None:
+        term_freqs = self._term_freqs.pop(chunk_id)
+        self._texts.pop(chunk_id)
+        self._metadatas.pop(chunk_id, None)
+        self._total_length -= self._lengths.pop(chunk_id)
+        for term in term_freqs:
+            postings = self._postings[term]
+            postings.pop(chunk_id, None)
+            if not postings:
+                del self._postings[term]
+
+    def get_text(self, chunk_id: str) -> Optional[str]:
+        return self._texts.get(chunk_id)
+
+    def metadatas(self) -> Dict[str, Dict]:
+        """Snapshot of ``chunk id -> metadata``."""
+        self.reload_if_changed()
+        with self._lock:
+            return dict(self._metadatas)
+
+    def ids_matching(self, filters: Dict[str, Any]) -> set:
+        """Ids of chunks whose metadata satisfies ``filters`` (see ``metadata_matches``)."""
+        self.reload_if_changed()
+        with self._lock:
+            return {
+                chunk_id for chunk_id, metadata in self._metadatas.items()
+                if metadata_matches(metadata, filters)
+            }
+
+    def search(
+        self, query: str, top_k: int = 10, allowed_ids: Optional[Collection[str]] = None
+    ) -> List[Tuple[str, float]]:
+        """Return up to ``top_k`` ``(chunk id, BM25 score)`` pairs, best first.
+
+        With ``allowed_ids`` only those chunks are scored.
+        """
+        self.reload_if_changed()
+        with self._lock:
+            doc_count = len(self._texts)
+            if not doc_count:
+                return []
+            avg_length = self._total_length / doc_count
+            scores: Dict[str, float] = defaultdict(float)
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                # idf stays corpus-wide so filtered and unfiltered scores are comparable
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, freq in postings.items():
+                    if allowed_ids is not None and chunk_id not in allowed_ids:
+                        continue
+                    length_ratio = self._lengths[chunk_id] / avg_length if avg_length else 1.0
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * length_ratio)
+                    scores[chunk_id] += idf * freq * (BM25_K1 + 1) / (freq + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+    # Persistence
+
+    def save(self) -> None:
+        """Merge with the file's current contents and atomically write the result.
+
+        Texts and metadata are stored; tokens are rebuilt on load.
+        """
+        if not self.path:
+            return
+        with self._lock, file_lock(self.path):
+            if not self._replaced:
+                # Pick up chunks other workers saved since our last load
+                self._reload_locked()
+            payload = {
+                chunk_id: {"text": text, "metadata": self._metadatas.get(chunk_id, {})}
+                for chunk_id, text in self._texts.items()
+            }
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f)
+            os.replace(tmp_path, self.path)
+            self._loaded_version = file_version(self.path)
+            self._unsaved.clear()
+            self._replaced = False
+
+    def _load(self) -> None:
+        """Read the file, then replay changes this process has not saved yet."""
+        version = file_version(self.path)
+        with open(self.path, encoding="utf-8") as f:
+            payload = json.load(f)
+        with self._lock:
+            self._clear()
+            for chunk_id, entry in payload.items():
+                if chunk_id not in self._unsaved:
+                    self._add_one(chunk_id, entry["text"], entry.get("metadata", {}))
+            for chunk_id, entry in self._unsaved.items():
+                if entry is not None:
+                    self._add_one(chunk_id, *entry)
+            self._loaded_version = version
+
+    def _reload_locked(self) -> None:
+        if not self._replaced and file_version(self.path) not in (None, self._loaded_version):
+            self._load()
+
+    def reload_if_changed(self) -> None:
+        """Pick up an index file rewritten by another worker."""
+        if not self.path or self._replaced:
+            return
+        if file_version(self.path) in (None, self._loaded_version):
+            return
+        with self._lock, file_lock(self.path, shared=True):
+            self._reload_locked()
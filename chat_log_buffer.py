@@ -0,0 +1,140 @@
+"""In-memory buffer that ships chat logs to the analytics webhook in batches.
+
+``/log-chat/`` only appends to this buffer. A background task flushes it when
+``CHAT_LOG_BATCH_SIZE`` logs are waiting or every ``CHAT_LOG_FLUSH_SECONDS``,
+posting each batch as one request over the handler's pooled keep-alive
+session, so the number of outbound requests drops by the batch factor. When
+``CHAT_LOG_MAX_BUFFERED`` logs are already waiting, ``offer`` refuses new ones
+and the endpoint tells the client to back off instead of growing without
+bound. Analytics logs are best effort: a failed batch is requeued once if
+there is room, then dropped and counted.
+"""
+
+import asyncio
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+CHAT_LOG_BATCH_SIZE = int(os.getenv("CHAT_LOG_BATCH_SIZE", "50"))
+CHAT_LOG_FLUSH_SECONDS = float(os.getenv("CHAT_LOG_FLUSH_SECONDS", "2"))
+CHAT_LOG_MAX_BUFFERED = int(os.getenv("CHAT_LOG_MAX_BUFFERED", "5000"))
+CHAT_LOG_MAX_IN_FLIGHT = int(os.getenv("CHAT_LOG_MAX_IN_FLIGHT", "2"))
+CHAT_LOG_GZIP = os.getenv("CHAT_LOG_GZIP", "0") == "1"
+
+
+class ChatLogBuffer:
+    """Bounded buffer flushed in batches by size or interval via ``send_batch(logs)``."""
+
+    def __init__(
+        self,
+        send_batch: Callable[[List[Dict[str, Any]]], bool],
+        batch_size: int = CHAT_LOG_BATCH_SIZE,
+        flush_seconds: float = CHAT_LOG_FLUSH_SECONDS,
+        max_buffered: int = CHAT_LOG_MAX_BUFFERED,
+        max_in_flight: int = CHAT_LOG_MAX_IN_FLIGHT,
+    ):
+        self.send_batch = send_batch
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_buffered = max_buffered
+        self.max_in_flight = max_in_flight
+        self.accepted = 0
+        self.rejected = 0
+        self.batches_sent = 0
+        self.logs_sent = 0
+        self.batches_failed = 0
+        self.dropped = 0
+        # (log, already retried) pairs
+        self._buffer: Deque[Tuple[Dict[str, Any], bool]] = deque()
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="chat-log")
+        self._in_flight: set = set()
+        self._full: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def offer(self, log: Dict[str, Any]) -> bool:
+        """Buffer one log; False if the buffer is full (the caller should back off)."""
+        if len(self._buffer) >= self.max_buffered:
+            self.rejected += 1
+            return False
+        self._buffer.append((log, False))
+        self.accepted += 1
+        if len(self._buffer) >= self.batch_size and self._full is not None:
+            self._full.set()
+        return True
+
+    def start(self) -> asyncio.Task:
+        """Start the flush loop on the running event loop."""
+        self._full = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self._task
+
+    def _take_batch(self) -> List[Tuple[Dict[str, Any], bool]]:
+        count = min(self.batch_size, len(self._buffer))
+        return [self._buffer.popleft() for _ in range(count)]
+
+    async def _send(self, batch: List[Tuple[Dict[str, Any], bool]]) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            ok = await loop.run_in_executor(self._executor, self.send_batch, [log for log, _ in batch])
+        except Exception as e:
+            print(f"❌ Chat log batch error: {str(e)}")
+            ok = False
+
+        if ok:
+            self.batches_sent += 1
+            self.logs_sent += len(batch)
+            return
+        self.batches_failed += 1
+        for log, retried in batch:
+            if retried or len(self._buffer) >= self.max_buffered:
+                self.dropped += 1
+            else:
+                self._buffer.append((log, True))
+
+    def _flush_ready(self, force: bool) -> None:
+        """Start sends for full batches (or any remainder when ``force``) while slots are free."""
+        while self._buffer and len(self._in_flight) < self.max_in_flight:
+            if len(self._buffer) < self.batch_size and not force:
+                break
+            task = asyncio.ensure_future(self._send(self._take_batch()))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.flush_seconds)
+                    self._flush_ready(force=False)
+                except asyncio.TimeoutError:
+                    self._flush_ready(force=True)
+                self._full.clear()
+                if len(self._buffer) >= self.batch_size:
+                    if self._in_flight:
+                        # All send slots busy: wait for one before taking the next batch
+                        await asyncio.wait(self._in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    self._full.set()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Chat log flush error: {str(e)}")
+
+    async def flush(self) -> None:
+        """Send everything still buffered (e.g. on shutdown); each log is tried at most twice."""
+        while self._buffer or self._in_flight:
+            self._flush_ready(force=True)
+            if self._in_flight:
+                await asyncio.wait(self._in_flight)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "buffered": len(self._buffer),
+            "in_flight_batches": len(self._in_flight),
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "batches_sent": self.batches_sent,
+            "logs_sent": self.logs_sent,
+            "batches_failed": self.batches_failed,
+            "dropped": self.dropped,
+        }
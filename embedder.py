@@ -1,13 +1,31 @@
-import chromadb
-from chromadb.config import Settings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from sentence_transformers import SentenceTransformer
+import asyncio
+import hashlib
 import os
+import re
 import shutil
+import time
+from collections import defaultdict
 from functools import lru_cache
+from bm25_index import BM25Index, reciprocal_rank_fusion
+from embedding_batcher import MicroBatcher
+from embedding_cache import EmbeddingCache, EMBEDDING_CACHE_ENABLED, encode_with_cache
+from lazy_resource import LazyResource, LazyResourceMap
+from tracing import add_span, span
+from metrics import (
+    INGESTION_STAGE_SECONDS,
+    LEXICAL_SEARCH_SECONDS,
+    QUERY_EMBEDDING_SECONDS,
+    RERANK_SECONDS,
+    VECTOR_SEARCH_SECONDS,
+)
+from reranker import Reranker, RERANK_CANDIDATES, RERANK_ENABLED
+from vector_index import NumpyVectorIndex
 
 def init_chroma_db():
     """Initialise Chroma using the new settings-style client."""
+    import chromadb
+    from chromadb.config import Settings
+
     persist_dir = "chroma_db"
     settings = Settings(
         anonymized_telemetry=False,
@@ -22,7 +40,7 @@ def init_chroma_db():
         return client, collection
 
     try:
-        return _create_client()
+        client, collection = _create_client()
     except Exception as first_error:
         print(f"Error accessing ChromaDB: {first_error}. Resetting persistence store...")
         shutil.rmtree(persist_dir, ignore_errors=True)
@@ -32,25 +50,228 @@ def init_chroma_db():
             return _create_client()
         except Exception as second_error:
             raise Exception(f"Failed to initialize ChromaDB after reset: {second_error}") from second_error
+    _tag_legacy_chunks(collection)
+    return client, collection
 
-# Load embedding model once at module initialization (cached)
 # Using the same model to match existing embeddings (768 dimensions)
-embedding_model = SentenceTransformer("sentence-transformers/multi-qa-mpnet-base-dot-v1")
+EMBEDDING_MODEL_NAME = "sentence-transformers/multi-qa-mpnet-base-dot-v1"
+
+# Inference backend: torch (reference), torch-int8 (dynamic quantization) or onnx
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+
+def load_embedding_model(backend=EMBEDDING_BACKEND):
+    """Load the embedding model on the requested CPU inference backend.
+
+    Check a non-reference backend with ``validate_embedding_backend.py`` before
+    serving it against embeddings stored by the reference model.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "onnx":
+        try:
+            return SentenceTransformer(EMBEDDING_MODEL_NAME, backend="onnx")
+        except Exception as e:
+            print(f"⚠️ ONNX backend unavailable ({e}); install optimum[onnxruntime]. Using torch.")
+            return SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    if backend == "torch-int8":
+        import torch
+        # Int8 weights for every Linear layer, activations quantized on the fly
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if backend != "torch":
+        print(f"⚠️ Unknown EMBEDDING_BACKEND '{backend}', using torch")
+    return model
+
+# Heavy objects are built on first use so importing this module stays cheap
+_embedding_model = LazyResource("embedding_model", load_embedding_model)
+_chroma = LazyResource("chromadb", init_chroma_db)
+
+# Vectors from different backends differ slightly, so each gets its own cache namespace
+EMBEDDING_CACHE_KEY = EMBEDDING_MODEL_NAME if EMBEDDING_BACKEND == "torch" else f"{EMBEDDING_MODEL_NAME}@{EMBEDDING_BACKEND}"
+
+# Persistent on-disk cache consulted before every encode
+_embedding_cache = LazyResource(
+    "embedding_cache", lambda: EmbeddingCache() if EMBEDDING_CACHE_ENABLED else None
+)
+
+# Each tenant has its own collection, BM25 index and vector matrix, so search
+# cost within a tenant does not depend on how much other tenants have stored
+DEFAULT_TENANT = "default"
+_TENANT_RE = re.compile(r"^[A-Za-z0-9](?:[A-Za-z0-9_-]{0,46}[A-Za-z0-9])?$")
+
+def validate_tenant(tenant):
+    """Return ``tenant`` if it is a valid tenant name, else raise ValueError."""
+    if not isinstance(tenant, str) or not _TENANT_RE.match(tenant):
+        raise ValueError(f"Invalid tenant '{tenant}': use up to 48 letters, digits, '-' or '_'")
+    return tenant
+
+def collection_name(tenant=DEFAULT_TENANT):
+    return "rag_docs" if tenant == DEFAULT_TENANT else f"rag_docs_{tenant}"
+
+def _tenant_path(path, tenant):
+    """``chroma_db/bm25_index.json`` -> ``chroma_db/bm25_index.<tenant>.json`` for non-default tenants."""
+    if tenant == DEFAULT_TENANT:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{tenant}{ext}"
+
+_tenant_collections = LazyResourceMap(
+    "chroma_collection", lambda tenant: _chroma.get()[0].get_or_create_collection(name=collection_name(tenant))
+)
+
+def get_collection(tenant=DEFAULT_TENANT):
+    """Return the tenant's Chroma collection, opening the store on first use."""
+    if tenant == DEFAULT_TENANT:
+        return _chroma.get()[1]
+    return _tenant_collections.get(tenant)
+
+def tenant_exists(tenant):
+    """True if ``tenant`` has a collection, without creating one."""
+    if tenant == DEFAULT_TENANT or _tenant_collections.loaded(tenant):
+        return True
+    try:
+        _chroma.get()[0].get_collection(name=collection_name(tenant))
+        return True
+    except Exception:
+        return False
+
+# Lexical index over the same chunks, persisted next to the Chroma store
+BM25_INDEX_PATH = os.getenv("BM25_INDEX_PATH", os.path.join("chroma_db", "bm25_index.json"))
+
+def _load_bm25_index(tenant):
+    """Open the tenant's persisted BM25 index, rebuilding it if it is out of step with Chroma."""
+    collection = get_collection(tenant)
+    index = BM25Index(_tenant_path(BM25_INDEX_PATH, tenant))
+    count = collection.count()
+    untagged = any("doc_id" not in metadata for metadata in index.metadatas().values())
+    if len(index) != count or untagged:
+        print(f"🔄 Rebuilding BM25 index for {tenant} from {count} stored chunks")
+        stored = collection.get(include=["documents", "metadatas"])
+        index.reset(stored["ids"], stored["documents"], stored["metadatas"])
+        index.save()
+    return index
+
+_bm25 = LazyResourceMap("bm25_index", _load_bm25_index)
+
+def get_bm25_index(tenant=DEFAULT_TENANT):
+    """Return the tenant's BM25 index, loading (or rebuilding) it on first use."""
+    return _bm25.get(tenant)
 
-# Initialize ChromaDB
-chroma_client, collection = init_chroma_db()
+# Vector search engine: chroma, numpy (exact search over a memory-mapped
+# matrix) or auto (numpy up to NUMPY_ENGINE_MAX_CHUNKS, Chroma beyond)
+VECTOR_ENGINE = os.getenv("VECTOR_ENGINE", "chroma")
+NUMPY_ENGINE_MAX_CHUNKS = int(os.getenv("NUMPY_ENGINE_MAX_CHUNKS", "50000"))
+VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", os.path.join("chroma_db", "vectors"))
+VECTOR_INDEX_DTYPE = os.getenv("VECTOR_INDEX_DTYPE", "float32")
+
+def _load_vector_index(tenant):
+    """Open the tenant's memory-mapped matrix, rebuilding it if it is out of step with Chroma."""
+    if VECTOR_ENGINE not in ("numpy", "auto"):
+        if VECTOR_ENGINE != "chroma":
+            print(f"⚠️ Unknown VECTOR_ENGINE '{VECTOR_ENGINE}', using chroma")
+        return None
+    collection = get_collection(tenant)
+    space = (collection.metadata or {}).get("hnsw:space", "l2")
+    index = NumpyVectorIndex(_tenant_path(VECTOR_INDEX_PATH, tenant), dtype=VECTOR_INDEX_DTYPE, space=space)
+    count = collection.count()
+    if len(index) != count:
+        print(f"🔄 Rebuilding vector matrix for {tenant} from {count} stored chunks")
+        stored = collection.get(include=["embeddings"])
+        index.reset(stored["ids"], stored["embeddings"])
+        index.save()
+    return index
+
+_vector_index = LazyResourceMap("vector_index", _load_vector_index)
+
+def get_vector_index(tenant=DEFAULT_TENANT):
+    """Return the tenant's NumPy vector index, or None when Chroma serves vector search."""
+    return _vector_index.get(tenant)
+
+def _numpy_engine(tenant):
+    index = get_vector_index(tenant)
+    if index is None or (VECTOR_ENGINE == "auto" and len(index) > NUMPY_ENGINE_MAX_CHUNKS):
+        return None
+    return index
+
+def get_embedding_model():
+    """Return the embedding model, loading it on first use."""
+    return _embedding_model.get()
+
+def __getattr__(name):
+    # Keep ``embedder.embedding_model`` / ``embedder.collection`` working, lazily
+    if name == "embedding_model":
+        return get_embedding_model()
+    if name == "collection":
+        return get_collection()
+    if name == "chroma_client":
+        return _chroma.get()[0]
+    if name == "embedding_cache":
+        return _embedding_cache.get()
+    if name == "bm25_index":
+        return get_bm25_index()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def preload_model():
+    """Load only the model weights, e.g. in the gunicorn master before fork.
+
+    Nothing is encoded here: running inference would start torch thread pools
+    that must not be inherited across fork.
+    """
+    get_embedding_model()
+
+def warm_up():
+    """Load the embedding model, Chroma, the search indexes and the embedding cache ahead of traffic."""
+    get_collection()
+    get_bm25_index()
+    get_vector_index()
+    _embedding_cache.get()
+    get_embedding_model().encode(["warm up"], show_progress_bar=False)
+    if reranker is not None:
+        reranker.warm_up()
 
 # Cache embedding computation for frequently accessed queries
 @lru_cache(maxsize=500)
 def _get_query_embedding(query: str):
     """Cache embeddings for repeated queries to avoid recomputation."""
-    return embedding_model.encode([query])[0]
+    return encode_queries([query])[0]
+
+def encode_texts(texts, batch_size=32, persist=True):
+    """Encode texts, reusing (and, if ``persist``, storing) vectors in the persistent embedding cache."""
+    return encode_with_cache(
+        _embedding_cache.get(),
+        get_embedding_model(),
+        EMBEDDING_CACHE_KEY,
+        list(texts),
+        persist=persist,
+        show_progress_bar=False,
+        batch_size=batch_size,
+    )
+
+def encode_queries(queries):
+    """Encode user queries: they read the persistent cache but are never written to it."""
+    return encode_texts(queries, persist=False)
+
+def embedding_cache_stats():
+    """Hit/miss counters of the persistent embedding cache (None when disabled or unused)."""
+    cache = _embedding_cache.get() if _embedding_cache.loaded else None
+    return cache.stats() if cache else None
+
+# Concurrent query embeddings are coalesced into batched encode calls
+QUERY_BATCH_MAX_SIZE = int(os.getenv("QUERY_BATCH_MAX_SIZE", "32"))
+QUERY_BATCH_MAX_WAIT_MS = float(os.getenv("QUERY_BATCH_MAX_WAIT_MS", "5"))
+query_batcher = MicroBatcher(
+    encode_queries,
+    max_batch_size=QUERY_BATCH_MAX_SIZE,
+    max_wait_ms=QUERY_BATCH_MAX_WAIT_MS,
+)
 
 def chunk_text(text, chunk_size=1024, overlap=128):
     """Chunk text into meaningful segments for retrieval - optimized for speed."""
     if not text or not text.strip():
         return []
     
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size, 
         chunk_overlap=overlap,
@@ -61,58 +282,363 @@ def chunk_text(text, chunk_size=1024, overlap=128):
     print(f"� Created {len(chunks)} chunks from {len(text)} characters")
     return chunks
 
-def store_chunks_and_embeddings(chunks):
-    """Store document chunks in ChromaDB with batch processing for speed."""
+DEFAULT_DOC_ID = "default"
+
+def chunk_id(doc_id, chunk):
+    """Content-addressed id for a chunk: same text in the same document, same id."""
+    digest = hashlib.sha256(chunk.encode("utf-8")).hexdigest()[:32]
+    return f"{doc_id}:{digest}"
+
+def _tag_legacy_chunks(collection):
+    """Give chunks stored before per-document ids (``doc_{i}``, no metadata) the ``default`` doc id.
+
+    Older versions replaced the whole collection on every upload, so those
+    chunks are a single document. Tagged, it is listed, filtered and deleted
+    like any other (``DELETE /documents/default``) instead of lingering
+    next to re-uploaded copies. Returns the number of chunks tagged.
+    """
+    try:
+        stored = collection.get(include=["metadatas"])
+        metadatas = stored["metadatas"] or [None] * len(stored["ids"])
+        legacy_ids = [
+            stored_id for stored_id, chunk_metadata in zip(stored["ids"], metadatas)
+            if not (chunk_metadata or {}).get("doc_id")
+        ]
+        metadata = {"doc_id": DEFAULT_DOC_ID, "tenant": DEFAULT_TENANT}
+        for start in range(0, len(legacy_ids), 5000):
+            batch = legacy_ids[start:start + 5000]
+            collection.update(ids=batch, metadatas=[metadata] * len(batch))
+    except Exception as e:
+        print(f"⚠️ Could not tag chunks stored without a document id: {e}")
+        return 0
+    if legacy_ids:
+        print(f"🏷️ Tagged {len(legacy_ids)} chunks stored without a document id as '{DEFAULT_DOC_ID}'")
+    return len(legacy_ids)
+
+def _existing_chunk_ids(doc_id, tenant=DEFAULT_TENANT):
+    """Return the ids of every chunk currently stored for ``doc_id``."""
+    try:
+        stored = get_collection(tenant).get(where={"doc_id": doc_id}, include=[])
+        return set(stored.get("ids", []))
+    except Exception as e:
+        print(f"⚠️ Could not list stored chunks for {doc_id}: {e}")
+        return set()
+
+def _index_chunks(chunk_records, doc_id, progress_callback=None, batch_size=256, tenant=DEFAULT_TENANT, metadata=None):
+    """Incrementally index ``(chunk, metadata)`` records for one document of ``tenant``.
+
+    Only chunks whose content-addressed id is not already stored are encoded
+    and added; chunks of ``doc_id`` that no longer appear are deleted, and
+    unchanged chunks get the new document-level ``metadata`` (e.g. upload
+    time). The BM25 index (and the NumPy vector matrix, when that engine is
+    enabled) is kept in step with the collection and saved once at the end.
+    If indexing fails partway, the chunks added so far are removed again so
+    the previous version of the document stays whole, and the error is
+    re-raised. Returns counts of added, unchanged and deleted chunks.
+    """
+    collection = get_collection(tenant)
+    bm25 = get_bm25_index(tenant)
+    vectors = get_vector_index(tenant)
+    document_metadata = {"doc_id": doc_id, "tenant": tenant, **(metadata or {})}
+    existing_ids = _existing_chunk_ids(doc_id, tenant)
+    seen_ids = set()
+    pending = []
+    stats = {"added": 0, "unchanged": 0, "deleted": 0}
+    added_ids = []
+    chunks_done = 0
+    chunks_seen = 0
+
+    def _flush(batch):
+        nonlocal chunks_done
+        new_records = [record for record in batch if record[0] not in existing_ids]
+        unchanged_records = [record for record in batch if record[0] in existing_ids]
+        if new_records:
+            with span("embed", chunks=len(new_records)), INGESTION_STAGE_SECONDS.labels("embed").time():
+                embeddings = encode_texts([chunk for _, chunk, _ in new_records])
+        store_started = time.perf_counter()
+        if new_records:
+            collection.add(
+                ids=[record_id for record_id, _, _ in new_records],
+                embeddings=embeddings.tolist(),
+                documents=[chunk for _, chunk, _ in new_records],
+                metadatas=[chunk_metadata for _, _, chunk_metadata in new_records],
+            )
+            added_ids.extend(record_id for record_id, _, _ in new_records)
+            if vectors is not None:
+                vectors.add([record_id for record_id, _, _ in new_records], embeddings)
+        if unchanged_records:
+            # Refresh metadata only; the stored embeddings are still valid
+            collection.update(
+                ids=[record_id for record_id, _, _ in unchanged_records],
+                metadatas=[chunk_metadata for _, _, chunk_metadata in unchanged_records],
+            )
+        bm25.add(
+            [record_id for record_id, _, _ in batch],
+            [chunk for _, chunk, _ in batch],
+            [chunk_metadata for _, _, chunk_metadata in batch],
+        )
+        INGESTION_STAGE_SECONDS.labels("store").observe(time.perf_counter() - store_started)
+        add_span("store", store_started, chunks=len(batch))
+        stats["added"] += len(new_records)
+        stats["unchanged"] += len(unchanged_records)
+        chunks_done += len(batch)
+        if progress_callback:
+            progress_callback(chunks_done, chunks_seen)
+
+    try:
+        for chunk, chunk_metadata in chunk_records:
+            record_id = chunk_id(doc_id, chunk)
+            if record_id in seen_ids:
+                continue  # Identical chunk already queued for this document
+            seen_ids.add(record_id)
+            chunks_seen += 1
+            pending.append((record_id, chunk, {**document_metadata, **chunk_metadata}))
+            if len(pending) >= batch_size:
+                _flush(pending)
+                pending = []
+
+        if pending:
+            _flush(pending)
+    except Exception:
+        print(f"↩️ Indexing {doc_id} for {tenant} failed; removing {len(added_ids)} chunks added so far")
+        try:
+            _delete_chunks(added_ids, tenant)
+        except Exception as e:
+            print(f"⚠️ Could not roll back chunks of {doc_id}: {e}")
+        raise
+
+    # Drop only the chunks of this document that disappeared (this also saves the indexes)
+    with span("store"), INGESTION_STAGE_SECONDS.labels("store").time():
+        stats["deleted"] = _delete_chunks(list(existing_ids - seen_ids), tenant)
+
+    print(f"✅ Indexed {doc_id} for {tenant}: {stats}")
+    return stats
+
+def _delete_chunks(ids, tenant=DEFAULT_TENANT):
+    """Delete chunks from the tenant's collection and indexes, then save the indexes.
+
+    The indexes are saved even if the collection delete fails, so additions
+    made since the last save still reach the other workers.
+    """
+    bm25 = get_bm25_index(tenant)
+    vectors = get_vector_index(tenant)
+    try:
+        for start in range(0, len(ids), 5000):
+            get_collection(tenant).delete(ids=ids[start:start + 5000])
+        bm25.remove(ids)
+        if vectors is not None:
+            vectors.remove(ids)
+    finally:
+        bm25.save()
+        if vectors is not None:
+            vectors.save()
+    return len(ids)
+
+def store_chunks_and_embeddings(
+    chunks, doc_id=DEFAULT_DOC_ID, progress_callback=None, batch_size=256, tenant=DEFAULT_TENANT, metadata=None
+):
+    """Store document chunks in ChromaDB, embedding only chunks not already stored.
+
+    ``metadata`` (e.g. ``source_type``, ``uploaded_at``) is stored on every chunk.
+    ``progress_callback(chunks_done, chunks_total)`` is called after each batch.
+    """
     if not chunks:
         print("⚠️ No chunks to store")
-        return
-    
-    # Clear existing documents first
-    try:
-        collection.delete(where={})
-    except:
-        pass
+        return {"added": 0, "unchanged": 0, "deleted": 0}
     
-    # Batch encode all chunks at once (much faster than one-by-one)
-    print(f"🔄 Encoding {len(chunks)} chunks...")
-    embeddings = embedding_model.encode(chunks, show_progress_bar=False, batch_size=32)
-    
-    # Batch insert into ChromaDB
-    print(f"� Storing {len(chunks)} chunks in ChromaDB...")
-    collection.add(
-        ids=[f"doc_{i}" for i in range(len(chunks))],
-        embeddings=embeddings.tolist(),
-        documents=chunks
+    print(f"🔄 Indexing {len(chunks)} chunks...")
+    return _index_chunks(
+        ((chunk, {}) for chunk in chunks),
+        doc_id,
+        progress_callback=progress_callback,
+        batch_size=batch_size,
+        tenant=tenant,
+        metadata=metadata,
     )
-    
-    print(f"✅ Stored {len(chunks)} chunks successfully!")
 
-def hybrid_search(query, top_k=5):
-    """Retrieve relevant chunks using vector similarity - optimized without reranker."""
+def store_page_stream(
+    pages, doc_id=DEFAULT_DOC_ID, progress_callback=None, batch_size=256, tenant=DEFAULT_TENANT, metadata=None
+):
+    """Chunk and embed per-page records (see ``pdf_extractor.iter_pdf_pages``) incrementally.
+
+    Chunks are indexed as soon as ``batch_size`` of them are pending, so memory
+    is bounded by one batch and embedding overlaps with extraction.
+    ``progress_callback(chunks_done, chunks_seen)`` is called after each batch.
+    Returns counts of added, unchanged and deleted chunks.
+    """
+    def _page_chunks():
+        for page in pages:
+            page_text = "\n".join([page["text"]] + page["ocr_texts"])
+            with span("chunk"), INGESTION_STAGE_SECONDS.labels("chunk").time():
+                chunks = chunk_text(page_text)
+            for chunk in chunks:
+                yield chunk, {"page": page["page_number"]}
+
+    return _index_chunks(
+        _page_chunks(),
+        doc_id,
+        progress_callback=progress_callback,
+        batch_size=batch_size,
+        tenant=tenant,
+        metadata=metadata,
+    )
+
+def list_documents(tenant=DEFAULT_TENANT):
+    """Summarise the tenant's stored documents: chunk and page counts, source type, upload time."""
+    if not tenant_exists(tenant):
+        return []
+    documents = {}
+    pages = defaultdict(set)
+    for chunk_metadata in get_bm25_index(tenant).metadatas().values():
+        doc_id = chunk_metadata.get("doc_id", DEFAULT_DOC_ID)
+        document = documents.setdefault(doc_id, {
+            "doc_id": doc_id,
+            "tenant": tenant,
+            "source_type": chunk_metadata.get("source_type"),
+            "uploaded_at": chunk_metadata.get("uploaded_at"),
+            "chunks": 0,
+            "pages": 0,
+        })
+        document["chunks"] += 1
+        if chunk_metadata.get("page") is not None:
+            pages[doc_id].add(chunk_metadata["page"])
+    for doc_id, document_pages in pages.items():
+        documents[doc_id]["pages"] = len(document_pages)
+    return sorted(documents.values(), key=lambda document: document["uploaded_at"] or 0, reverse=True)
+
+def delete_document(doc_id, tenant=DEFAULT_TENANT):
+    """Delete every chunk of ``doc_id`` for ``tenant``; returns the number deleted."""
+    if not tenant_exists(tenant):
+        return 0
+    deleted = _delete_chunks(list(_existing_chunk_ids(doc_id, tenant)), tenant)
+    print(f"🗑️ Deleted {deleted} chunks of {doc_id} for {tenant}")
+    return deleted
+
+# Candidates taken from each retriever before fusion (and reranking, when enabled)
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "10"))
+if RERANK_ENABLED:
+    RETRIEVAL_CANDIDATES = max(RETRIEVAL_CANDIDATES, RERANK_CANDIDATES)
+NO_RESULTS = ["No relevant information found in the document."]
+
+reranker = Reranker() if RERANK_ENABLED else None
+
+def reranker_stats():
+    """Counters of the rerank stage, or ``{"enabled": False}``."""
+    return reranker.stats() if reranker else {"enabled": False}
+
+def _chroma_where(filters):
+    """Translate ``{"key": value or [values]}`` filters into a Chroma ``where`` clause."""
+    clauses = [
+        {key: {"$in": list(value)} if isinstance(value, (list, tuple, set)) else value}
+        for key, value in (filters or {}).items()
+    ]
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def _vector_candidates(query_embedding, n_results=RETRIEVAL_CANDIDATES, tenant=DEFAULT_TENANT, filters=None):
+    """``(chunk id, text)`` pairs closest to the query embedding, best first."""
+    index = _numpy_engine(tenant)
+    if index is not None:
+        with span("vector_search", engine="numpy"), VECTOR_SEARCH_SECONDS.labels("numpy").time():
+            bm25 = get_bm25_index(tenant)
+            allowed_ids = bm25.ids_matching(filters) if filters else None
+            hits = [
+                (chunk_id, bm25.get_text(chunk_id))
+                for chunk_id, _ in index.search(query_embedding, n_results, allowed_ids=allowed_ids)
+            ]
+        if all(text is not None for _, text in hits):
+            return hits
+        print("⚠️ Vector matrix and chunk texts out of step; querying Chroma")
+    with span("vector_search", engine="chroma"), VECTOR_SEARCH_SECONDS.labels("chroma").time():
+        results = get_collection(tenant).query(
+            query_embeddings=[query_embedding.tolist()],
+            n_results=n_results,
+            where=_chroma_where(filters),
+        )
+    if not results["ids"] or not results["documents"]:
+        return []
+    return list(zip(results["ids"][0], results["documents"][0]))
+
+def _lexical_candidates(query, n_results=RETRIEVAL_CANDIDATES, tenant=DEFAULT_TENANT, filters=None):
+    """``(chunk id, text)`` pairs ranked by BM25 over the query terms, best first."""
+    with span("lexical_search"), LEXICAL_SEARCH_SECONDS.time():
+        bm25 = get_bm25_index(tenant)
+        allowed_ids = bm25.ids_matching(filters) if filters else None
+        return [
+            (chunk_id, bm25.get_text(chunk_id))
+            for chunk_id, _ in bm25.search(query, n_results, allowed_ids=allowed_ids)
+        ]
+
+def _fuse_candidates(query, vector_hits, lexical_hits, top_k):
+    """Merge both rankings with reciprocal rank fusion, optionally rerank, return the top texts."""
+    texts = dict(lexical_hits)
+    texts.update(vector_hits)
+    fused = reciprocal_rank_fusion([
+        [chunk_id for chunk_id, _ in vector_hits],
+        [chunk_id for chunk_id, _ in lexical_hits],
+    ])
+    candidates = [(chunk_id, texts[chunk_id]) for chunk_id in fused if texts.get(chunk_id)]
+    if not candidates:
+        return NO_RESULTS
+
+    print(f"✅ Retrieved {len(candidates)} chunks for query "
+          f"({len(vector_hits)} vector, {len(lexical_hits)} lexical)")
+    if reranker is not None and query:
+        with span("rerank", candidates=len(candidates)), RERANK_SECONDS.time():
+            candidates = reranker.rerank(query, candidates[:RERANK_CANDIDATES])
+    return [text for _, text in candidates[:min(top_k, 3)]]  # Return top 3
+
+def search_by_embedding(query_embedding, top_k=5, query=None, tenant=DEFAULT_TENANT, filters=None):
+    """Retrieve chunks for an already computed query embedding.
+
+    When the query text is given, BM25 hits are fused with the vector hits and
+    the result is reranked if the rerank stage is enabled. Search is scoped to
+    ``tenant`` and, with ``filters`` (``{"doc_id": ..., "source_type": [...]}``),
+    to chunks whose metadata match.
+    """
+    if not tenant_exists(tenant):
+        return NO_RESULTS
+    vector_hits = _vector_candidates(query_embedding, tenant=tenant, filters=filters)
+    lexical_hits = _lexical_candidates(query, tenant=tenant, filters=filters) if query else []
+    return _fuse_candidates(query, vector_hits, lexical_hits, top_k)
+
+def hybrid_search(query, top_k=5, tenant=DEFAULT_TENANT, filters=None):
+    """Retrieve relevant chunks by fusing vector similarity with BM25 keyword matches."""
     if not query or not query.strip():
         return ["No query provided."]
     
     # Use cached embedding
     query_embedding = _get_query_embedding(query.strip())
-    
-    # Retrieve relevant chunks from ChromaDB
-    results = collection.query(
-        query_embeddings=[query_embedding.tolist()],
-        n_results=min(top_k, 5)  # Limit results for speed
+    return search_by_embedding(query_embedding, top_k, query=query, tenant=tenant, filters=filters)
+
+async def aget_query_embedding(query):
+    """Embed a query through the micro-batcher so concurrent chats share one encode."""
+    with span("embed_query"), QUERY_EMBEDDING_SECONDS.time():
+        return await query_batcher.embed(query.strip())
+
+async def ahybrid_search(query, top_k=5, query_embedding=None, tenant=DEFAULT_TENANT, filters=None):
+    """Async ``hybrid_search``: the BM25 lookup runs while the query is embedded and searched."""
+    if not query or not query.strip():
+        return ["No query provided."]
+    if not await asyncio.to_thread(tenant_exists, tenant):
+        return NO_RESULTS
+
+    async def _vector_hits():
+        embedding = query_embedding if query_embedding is not None else await aget_query_embedding(query)
+        return await asyncio.to_thread(_vector_candidates, embedding, tenant=tenant, filters=filters)
+
+    vector_hits, lexical_hits = await asyncio.gather(
+        _vector_hits(), asyncio.to_thread(_lexical_candidates, query, tenant=tenant, filters=filters)
     )
-    
-    retrieved_chunks = results["documents"][0] if results["documents"] else []
-    
-    if not retrieved_chunks:
-        return ["No relevant information found in the document."]
-    
-    # Return top chunks directly (skip slow reranking for speed)
-    print(f"✅ Retrieved {len(retrieved_chunks)} chunks for query")
-    return retrieved_chunks[:3]  # Return top 3
+    if reranker is not None:
+        # Reranking waits on the model for up to its latency budget
+        return await asyncio.to_thread(_fuse_candidates, query, vector_hits, lexical_hits, top_k)
+    return _fuse_candidates(query, vector_hits, lexical_hits, top_k)
 
 def check_chromadb_content():
     """Check if ChromaDB contains stored chunks."""
-    stored_docs = collection.get()
+    stored_docs = get_collection().get()
     print("📌 Stored Document IDs:", stored_docs.get("ids", []))
     print("📄 Stored Documents (First 3):", stored_docs.get("documents", [])[:3]) 
 
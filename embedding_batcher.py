@@ -0,0 +1,93 @@
+"""Micro-batching scheduler for query embeddings.
+
+Concurrent chats each need one query embedding. Instead of running many
+batch-of-1 forward passes, callers await ``MicroBatcher.embed``; requests that
+arrive within ``max_wait_ms`` of each other (up to ``max_batch_size``) are
+encoded together in one call on a worker thread and each caller's future is
+resolved with its own vector.
+"""
+
+import asyncio
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+
+class MicroBatcher:
+    """Coalesce concurrent ``embed`` calls into batched ``encode_fn`` calls."""
+
+    def __init__(
+        self,
+        encode_fn: Callable[[Sequence[str]], np.ndarray],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5,
+    ):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_ms / 1000
+        self.batches = 0
+        self.requests = 0
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._wakeup = None
+        self._full = None
+        self._worker = None
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Return the embedding of ``text``, batched with other concurrent callers."""
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._full = asyncio.Event()
+            self._worker = loop.create_task(self._run())
+
+        future = loop.create_future()
+        self._pending.append((text, future))
+        self.requests += 1
+        if len(self._pending) >= self.max_batch_size:
+            self._full.set()
+        self._wakeup.set()
+        return await future
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+
+            # Give concurrent callers a moment to join the batch
+            self._full.clear()
+            if len(self._pending) < self.max_batch_size:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_wait_seconds)
+                except asyncio.TimeoutError:
+                    pass
+
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            if not self._pending:
+                self._wakeup.clear()
+            if not batch:
+                continue
+
+            # Identical queries in one batch are encoded once
+            unique_texts: Dict[str, int] = {}
+            for text, _ in batch:
+                unique_texts.setdefault(text, len(unique_texts))
+
+            self.batches += 1
+            try:
+                vectors = await asyncio.to_thread(self.encode_fn, list(unique_texts))
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for text, future in batch:
+                if not future.done():
+                    future.set_result(vectors[unique_texts[text]])
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+        }
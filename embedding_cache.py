@@ -0,0 +1,137 @@
+"""Persistent embedding cache shared by chunk and query embedding.
+
+Vectors are stored as float32 blobs in SQLite, keyed by ``(model name, sha256
+of whitespace-normalised text)``, so they survive worker restarts and
+re-uploads. WAL mode lets every gunicorn worker read and write the same file.
+
+Only chunk embeddings are written: query embeddings read the cache but stay
+in the bounded in-process LRU, so a public chat endpoint cannot grow the file
+with one row per distinct question. The file is further capped at
+``EMBEDDING_CACHE_MAX_ROWS``; beyond it the oldest-written rows are evicted.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.db")
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "1") == "1"
+# About 3 KB per 768-d vector, so the default keeps the file near 600 MB at most (0 = no cap)
+EMBEDDING_CACHE_MAX_ROWS = int(os.getenv("EMBEDDING_CACHE_MAX_ROWS", "200000"))
+
+# Keep IN (...) lists well under SQLite's bound-parameter limit
+_LOOKUP_BATCH = 500
+
+
+def text_key(text: str) -> bytes:
+    """Hash of the whitespace-normalised text used as the cache key."""
+    normalized = " ".join(text.split())
+    return hashlib.sha256(normalized.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """SQLite-backed ``(model, text hash) -> float32 vector`` store with hit/miss counters."""
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_rows: int = EMBEDDING_CACHE_MAX_ROWS):
+        self.path = path
+        self.max_rows = max_rows
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash BLOB NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )"""
+        )
+        self._conn.commit()
+        # Upper-bound estimate of the row count (other workers write too); recounted before evicting
+        self._rows = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model: str, texts: Sequence[str]) -> Dict[int, np.ndarray]:
+        """Return ``{index: vector}`` for every text in ``texts`` that is cached."""
+        keys = [text_key(text) for text in texts]
+        found: Dict[bytes, np.ndarray] = {}
+        with self._lock:
+            for start in range(0, len(keys), _LOOKUP_BATCH):
+                batch = keys[start:start + _LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *batch],
+                ).fetchall()
+                for text_hash, vector in rows:
+                    found[bytes(text_hash)] = np.frombuffer(vector, dtype=np.float32)
+
+            result = {index: found[key] for index, key in enumerate(keys) if key in found}
+            self.hits += len(result)
+            self.misses += len(keys) - len(result)
+        return result
+
+    def put_many(self, model: str, texts: Sequence[str], vectors: np.ndarray) -> None:
+        """Store one vector per text."""
+        rows = [
+            (model, text_key(text), np.asarray(vector, dtype=np.float32).tobytes())
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                rows,
+            )
+            self._rows += len(rows)
+            if self.max_rows and self._rows > self.max_rows:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """Drop the oldest-written rows down to 90% of ``max_rows`` (so eviction is not per insert)."""
+        self._rows = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = self._rows - int(self.max_rows * 0.9)
+        if self._rows <= self.max_rows or excess <= 0:
+            return
+        # INSERT OR REPLACE gives a rewritten row a new rowid, so rowid order is write order
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY rowid LIMIT ?)",
+            (excess,),
+        )
+        self._rows -= excess
+        self.evictions += excess
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters for this process."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+def encode_with_cache(
+    cache, model, model_name: str, texts: List[str], persist: bool = True, **encode_kwargs
+) -> np.ndarray:
+    """Encode ``texts`` with ``model``, reusing ``cache`` when given (and filling it if ``persist``)."""
+    if cache is None:
+        return np.asarray(model.encode(texts, **encode_kwargs), dtype=np.float32)
+
+    cached = cache.get_many(model_name, texts)
+    missing = [index for index in range(len(texts)) if index not in cached]
+    if missing:
+        fresh = np.asarray(model.encode([texts[i] for i in missing], **encode_kwargs), dtype=np.float32)
+        if persist:
+            cache.put_many(model_name, [texts[i] for i in missing], fresh)
+        cached.update(zip(missing, fresh))
+
+    return np.stack([cached[index] for index in range(len(texts))])
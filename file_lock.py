@@ -0,0 +1,45 @@
+"""Cross-process locking for index files shared by gunicorn workers.
+
+Every worker keeps its own in-memory copy of the BM25 index and the NumPy
+vector matrix. Saves take an exclusive ``flock`` on ``<path>.lock`` and merge
+the file's current contents first, so one worker never overwrites another's
+additions; loads take a shared lock so they never see a half-swapped save.
+Without ``fcntl`` (Windows, single-process dev server) the lock is a no-op.
+"""
+
+import os
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path: str, shared: bool = False) -> Iterator[None]:
+    """Hold an advisory lock on ``<path>.lock`` for the duration of the block."""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def file_version(path: str) -> Optional[Tuple[int, int, int]]:
+    """Identity of the file's current contents, or None if it does not exist.
+
+    Saves replace the file atomically, so the inode changes even when two
+    saves land within the filesystem's timestamp resolution.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
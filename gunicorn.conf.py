@@ -0,0 +1,17 @@
+"""Gunicorn settings.
+
+With PRELOAD_MODELS=1 the app (and the embedding model, see main.py) is loaded
+once in the master before workers are forked, so the model weights are shared
+copy-on-write instead of being loaded again by every worker.
+"""
+
+import gc
+import os
+
+preload_app = os.getenv("PRELOAD_MODELS", "0") == "1"
+
+
+def pre_fork(server, worker):
+    # Move everything loaded so far out of the collector's reach so gc passes in
+    # the workers do not write to (and thereby un-share) the master's objects
+    gc.freeze()
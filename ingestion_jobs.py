@@ -0,0 +1,311 @@
+"""Background ingestion jobs for uploaded PDFs.
+
+Uploads are queued and run in a pool of ``INGEST_WORKERS`` spawned ingestion
+processes, so extraction, OCR and embedding neither run on the event loop nor
+compete with it for the web worker's GIL and index locks; PaddleOCR and the
+ingestion copy of the embedding model live only in those processes. The
+ingestion process writes Chroma and saves the BM25/vector indexes under their
+file locks, and the web workers reload them on their next search. With
+``INGEST_SUBPROCESS=0`` jobs run on a thread of the web worker instead
+(handy for debugging). Each job records its stage and progress so
+clients can poll ``/upload/{job_id}``. With a ``store`` (see
+``session_store``) the record is also published there on every stage change
+and at most once per ``JOB_PUBLISH_INTERVAL_SECONDS`` of progress, so the
+poll can land on any gunicorn worker.
+"""
+
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field, asdict
+from typing import Any, Callable, Dict, List, Optional
+
+from pdf_extractor import iter_pdf_pages, warm_up as warm_up_ocr
+from embedder import DEFAULT_TENANT, store_page_stream, warm_up as warm_up_embeddings
+from metrics import INGESTION_JOBS, INGESTION_STAGE_SECONDS
+from session_store import MAX_TRACKED_JOBS
+from tracing import is_tracing, trace
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
+INGEST_SUBPROCESS = os.getenv("INGEST_SUBPROCESS", "1") == "1"
+JOB_PUBLISH_INTERVAL_SECONDS = float(os.getenv("JOB_PUBLISH_INTERVAL_SECONDS", "1"))
+
+# One thread per running job: it waits on the ingestion process (or, with
+# INGEST_SUBPROCESS=0, does the work itself) and then finishes the job record
+_executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+_ingest_pool: Optional[ProcessPoolExecutor] = None
+_ingest_pool_lock = threading.Lock()
+# In the web worker, progress messages from ingestion processes; in an
+# ingestion process, where to send them
+_progress_queue = None
+_active_progress: Dict[str, "_JobProgress"] = {}
+_progress_lock = threading.Lock()
+_jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+_jobs_lock = threading.Lock()
+
+
+@dataclass
+class IngestionJob:
+    """Progress record for a single document ingestion."""
+    job_id: str
+    filename: str
+    status: str = "queued"  # queued, running, completed, failed
+    stage: str = "queued"  # queued, ingesting, done, failed
+    pages_done: int = 0
+    pages_total: int = 0
+    chunks_embedded: int = 0
+    chunks_total: int = 0
+    doc_id: str = ""
+    tenant: str = DEFAULT_TENANT
+    source_type: str = "pdf"
+    ocr_stats: Dict[str, int] = field(default_factory=dict)
+    index_stats: Dict[str, int] = field(default_factory=dict)
+    errors: List[str] = field(default_factory=list)
+    # Span tree of the job when the upload request was traced (see tracing.py)
+    trace: Optional[Dict] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def submit_ingestion(
+    pdf_bytes: bytes,
+    filename: str = "",
+    on_complete: Optional[Callable[["IngestionJob"], None]] = None,
+    doc_id: Optional[str] = None,
+    tenant: str = DEFAULT_TENANT,
+    source_type: str = "pdf",
+    store=None,
+) -> IngestionJob:
+    """Queue a PDF for ingestion and return its job record immediately.
+
+    Re-uploading the same ``doc_id`` for a tenant updates that document in
+    place. ``doc_id`` defaults to the filename, or to a hash of the bytes.
+    ``on_complete(job)`` runs once the job finishes, whether it completed or
+    failed (a failed job may still have touched the knowledge base).
+    The record is published to ``store`` (if given) before this returns.
+    """
+    doc_id = doc_id or filename or hashlib.sha256(pdf_bytes).hexdigest()[:16]
+    job = IngestionJob(
+        job_id=uuid.uuid4().hex,
+        filename=filename,
+        doc_id=doc_id,
+        tenant=tenant,
+        source_type=source_type,
+    )
+    with _jobs_lock:
+        _jobs[job.job_id] = job
+        # Forget the oldest finished jobs once we track too many
+        while len(_jobs) > MAX_TRACKED_JOBS:
+            oldest_id, oldest = next(iter(_jobs.items()))
+            if oldest.status in ("queued", "running"):
+                break
+            _jobs.pop(oldest_id)
+
+    _publish(job, store)
+    _executor.submit(_run_job, job, pdf_bytes, on_complete, is_tracing(), store)
+    return job
+
+
+def get_job(job_id: str, store=None) -> Optional[Dict[str, Any]]:
+    """Return the record of ``job_id``: this worker's own if it ran the job, else the ``store``'s."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    if job is not None:
+        return job.to_dict()
+    return store.get_job(job_id) if store is not None else None
+
+
+def _publish(job: IngestionJob, store) -> None:
+    if store is None:
+        return
+    try:
+        store.save_job(job.to_dict())
+    except Exception as e:
+        # Progress reporting must never fail the ingestion itself
+        print(f"⚠️ Could not publish ingestion job {job.job_id}: {e}")
+
+
+class _JobProgress:
+    """Apply page and chunk progress to ``job``, publishing it at most once per interval."""
+
+    def __init__(self, job: IngestionJob, store):
+        self.job = job
+        self.store = store
+        self.last_published = time.time()
+
+    def pages(self, pages_done: int, pages_total: int) -> None:
+        self.job.pages_done = pages_done
+        self.job.pages_total = pages_total
+        self._publish()
+
+    def chunks(self, chunks_embedded: int, chunks_total: int) -> None:
+        self.job.chunks_embedded = chunks_embedded
+        self.job.chunks_total = chunks_total
+        self._publish()
+
+    def _publish(self) -> None:
+        if time.time() - self.last_published >= JOB_PUBLISH_INTERVAL_SECONDS:
+            self.last_published = time.time()
+            _publish(self.job, self.store)
+
+
+def _ingest(job_id, pdf_bytes, doc_id, tenant, metadata, traced, on_pages, on_chunks) -> Dict[str, Any]:
+    """Extract, OCR, chunk and embed one PDF (as its own trace if ``traced``).
+
+    Failures are returned as ``error`` rather than raised, so the trace and
+    OCR counters of a failed job still reach its record.
+    """
+    result: Dict[str, Any] = {"ocr_stats": {}, "index_stats": {}, "error": None, "trace": None}
+    with trace("ingestion", enabled=traced, job_id=job_id, doc_id=doc_id, tenant=tenant) as job_trace:
+        try:
+            # Extraction, OCR, chunking and embedding overlap page by page
+            pages = iter_pdf_pages(pdf_bytes, progress_callback=on_pages, stats=result["ocr_stats"])
+            result["index_stats"] = store_page_stream(
+                pages, doc_id=doc_id, progress_callback=on_chunks, tenant=tenant, metadata=metadata
+            )
+        except Exception as e:
+            result["error"] = str(e) or type(e).__name__
+    if job_trace is not None:
+        result["trace"] = job_trace.to_dict()
+    return result
+
+
+def _init_ingest_process(progress_queue) -> None:
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+def _ingest_in_subprocess(job_id, pdf_bytes, doc_id, tenant, metadata, traced) -> Dict[str, Any]:
+    """Run ``_ingest`` in an ingestion process, reporting progress over the queue."""
+    result = _ingest(
+        job_id,
+        pdf_bytes,
+        doc_id,
+        tenant,
+        metadata,
+        traced,
+        on_pages=lambda done, total: _progress_queue.put((job_id, "pages", done, total)),
+        on_chunks=lambda done, total: _progress_queue.put((job_id, "chunks", done, total)),
+    )
+    # Stage timings are observed here; hand them to the web worker's /metrics
+    result["stage_seconds"] = INGESTION_STAGE_SECONDS.take_samples()
+    return result
+
+
+def _warm_up_ingest_process() -> None:
+    warm_up_ocr()
+    warm_up_embeddings()
+
+
+def warm_up() -> None:
+    """Load OCR and the embedding model where ingestion runs, ahead of the first upload."""
+    if INGEST_SUBPROCESS:
+        # Warms one ingestion process; with INGEST_WORKERS > 1 the others load on first use
+        _get_ingest_pool().submit(_warm_up_ingest_process).result()
+    else:
+        warm_up_ocr()
+
+
+def _forward_progress(progress_queue) -> None:
+    """Apply progress messages from ingestion processes to the jobs they belong to."""
+    while True:
+        job_id, kind, done, total = progress_queue.get()
+        with _progress_lock:
+            progress = _active_progress.get(job_id)
+        if progress is not None:
+            getattr(progress, kind)(done, total)
+
+
+def _get_ingest_pool() -> ProcessPoolExecutor:
+    """Return the ingestion process pool, starting it (and its progress reader) on first use."""
+    global _ingest_pool, _progress_queue
+    with _ingest_pool_lock:
+        if _ingest_pool is None:
+            # Spawn rather than fork, like the OCR pool: no inherited model or thread state
+            context = multiprocessing.get_context("spawn")
+            if _progress_queue is None:
+                _progress_queue = context.Queue()
+                threading.Thread(
+                    target=_forward_progress, args=(_progress_queue,), name="ingest-progress", daemon=True
+                ).start()
+            _ingest_pool = ProcessPoolExecutor(
+                max_workers=INGEST_WORKERS,
+                mp_context=context,
+                initializer=_init_ingest_process,
+                initargs=(_progress_queue,),
+            )
+        return _ingest_pool
+
+
+def _ingest_out_of_process(job: IngestionJob, pdf_bytes: bytes, metadata, traced: bool, progress) -> Dict[str, Any]:
+    global _ingest_pool
+    with _progress_lock:
+        _active_progress[job.job_id] = progress
+    pool = _get_ingest_pool()
+    try:
+        result = pool.submit(
+            _ingest_in_subprocess, job.job_id, pdf_bytes, job.doc_id, job.tenant, metadata, traced
+        ).result()
+    except BrokenProcessPool as e:
+        # The ingestion process died (e.g. out of memory); start a fresh pool for the next job
+        with _ingest_pool_lock:
+            if _ingest_pool is pool:
+                _ingest_pool = None
+        pool.shutdown(wait=False)
+        return {"ocr_stats": {}, "index_stats": {}, "error": f"Ingestion process failed: {e}", "trace": None}
+    finally:
+        with _progress_lock:
+            _active_progress.pop(job.job_id, None)
+    INGESTION_STAGE_SECONDS.add_samples(result.pop("stage_seconds"))
+    return result
+
+
+def _run_job(job: IngestionJob, pdf_bytes: bytes, on_complete, traced: bool = False, store=None) -> None:
+    """Run every ingestion stage for ``job``, in an ingestion process unless ``INGEST_SUBPROCESS=0``."""
+    job.status = "running"
+    job.stage = "ingesting"
+    job.started_at = time.time()
+    _publish(job, store)
+    progress = _JobProgress(job, store)
+    metadata = {"source_type": job.source_type, "uploaded_at": job.created_at}
+
+    try:
+        if INGEST_SUBPROCESS:
+            result = _ingest_out_of_process(job, pdf_bytes, metadata, traced, progress)
+        else:
+            result = _ingest(
+                job.job_id, pdf_bytes, job.doc_id, job.tenant, metadata, traced, progress.pages, progress.chunks
+            )
+    except Exception as e:
+        result = {"ocr_stats": {}, "index_stats": {}, "error": str(e) or type(e).__name__, "trace": None}
+
+    job.ocr_stats = result["ocr_stats"]
+    job.index_stats = result["index_stats"]
+    job.trace = result["trace"]
+    if result["error"] is None:
+        job.stage = "done"
+        job.status = "completed"
+    else:
+        print(f"❌ Ingestion job {job.job_id} failed: {result['error']}")
+        job.errors.append(result["error"])
+        job.stage = "failed"
+        job.status = "failed"
+
+    job.finished_at = time.time()
+    if on_complete:
+        try:
+            on_complete(job)
+        except Exception as e:
+            print(f"⚠️ Post-ingestion hook failed for job {job.job_id}: {e}")
+    INGESTION_JOBS.labels(job.status).inc()
+    _publish(job, store)
@@ -0,0 +1,73 @@
+"""Thread-safe lazy initialization for heavy objects (models, clients, stores).
+
+Each ``LazyResource`` builds its object on first ``get()`` and records how long
+that took, so workers boot without loading anything and ``resource_report()``
+can show what has been paid for so far.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List
+
+_resources: List["LazyResource"] = []
+
+
+class LazyResource:
+    """Build ``factory()`` once, on first use, from whichever thread gets there first."""
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        self.name = name
+        self.factory = factory
+        self.load_seconds = None
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        _resources.append(self)
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def get(self) -> Any:
+        if self._loaded:
+            return self._value
+        with self._lock:
+            if not self._loaded:
+                start = time.perf_counter()
+                self._value = self.factory()
+                self.load_seconds = time.perf_counter() - start
+                self._loaded = True
+                print(f"⏱️ Loaded {self.name} in {self.load_seconds:.2f}s")
+        return self._value
+
+
+class LazyResourceMap:
+    """One ``LazyResource`` per key (e.g. per tenant), each built on first use."""
+
+    def __init__(self, name: str, factory: Callable[[Hashable], Any]):
+        self.name = name
+        self.factory = factory
+        self._resources: Dict[Hashable, LazyResource] = {}
+        self._lock = threading.Lock()
+
+    def loaded(self, key: Hashable) -> bool:
+        resource = self._resources.get(key)
+        return resource is not None and resource.loaded
+
+    def get(self, key: Hashable) -> Any:
+        resource = self._resources.get(key)
+        if resource is None:
+            with self._lock:
+                resource = self._resources.get(key)
+                if resource is None:
+                    resource = LazyResource(f"{self.name}[{key}]", lambda: self.factory(key))
+                    self._resources[key] = resource
+        return resource.get()
+
+
+def resource_report() -> Dict[str, Dict[str, Any]]:
+    """Load state and load time of every lazy resource in this process."""
+    return {
+        resource.name: {"loaded": resource.loaded, "load_seconds": resource.load_seconds}
+        for resource in _resources
+    }
@@ -1,14 +1,49 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+import time
+
+# Measured so the startup report can show how long importing the app took
+_IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
-from typing import List, Dict, Any, Optional
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from typing import List, Dict, Any, Optional, Union
 from pydantic import BaseModel
-from pdf_extractor import extract_text_from_pdf, extract_images_from_pdf
-from embedder import chunk_text, store_chunks_and_embeddings, hybrid_search
-from query_llm import generate_chat_response
-from webhook_handler import webhook_handler
+from embedder import (
+    DEFAULT_TENANT,
+    ahybrid_search,
+    aget_query_embedding,
+    delete_document,
+    embedding_cache_stats,
+    list_documents,
+    preload_model,
+    reranker_stats,
+    validate_tenant,
+    warm_up as warm_up_embeddings,
+)
+from answer_cache import SemanticAnswerCache, ANSWER_CACHE_ENABLED
+from ingestion_jobs import submit_ingestion, get_job, warm_up as warm_up_ingestion
+from session_store import create_session_store
+from query_llm import (
+    LLM_ERROR_PREFIX,
+    LLMStreamError,
+    agenerate_chat_response,
+    astream_chat_response,
+    warm_up as warm_up_llm,
+)
+from lazy_resource import resource_report
+from memory_stats import process_memory
+from metrics import CHAT_REQUEST_SECONDS, HTTP_REQUESTS_IN_FLIGHT, CallbackMetric, render_metrics
+from sampling_profiler import collapsed_stacks
+from tracing import TracingMiddleware, span
+from chat_log_buffer import ChatLogBuffer, CHAT_LOG_GZIP
+from outbox import OUTBOX_LEASE_SECONDS, Outbox, OutboxDispatcher
+from webhook_handler import CRM_SEND_BUDGET_SECONDS, webhook_handler
+from concurrent.futures import ThreadPoolExecutor
 import asyncio
-import time
+import hmac
+import json
+import os
 
 app = FastAPI(title="RAG System API")
 
@@ -24,43 +59,217 @@ app.add_middleware(
 # Add Gzip compression
 app.add_middleware(GZipMiddleware, minimum_size=1000)
 
-# Store conversation history for each session with TTL
-conversations: Dict[str, Dict] = {}
+class InFlightMiddleware:
+    """Count HTTP requests in flight; plain ASGI so streamed responses count until their last event."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+
+app.add_middleware(InFlightMiddleware)
+
+# Opt-in per-request spans (TRACING_ENABLED=1, see tracing.py)
+app.add_middleware(TracingMiddleware)
+
+# Admin endpoints (profiler, lead outbox) are disabled unless this token is set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+def _require_admin(x_admin_token: str) -> None:
+    """Reject the request unless ``ADMIN_TOKEN`` is configured and sent as ``X-Admin-Token``."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin endpoints disabled.")
+    if not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+
+# Overall time allowed for a chat answer, streamed or not
+CHAT_TIMEOUT_SECONDS = float(os.getenv("CHAT_TIMEOUT_SECONDS", "50"))
 
 # Cache for retrieved contexts with TTL (seconds)
-document_cache: Dict[str, Dict[str, Any]] = {}
 CACHE_TTL_SECONDS = 600
 CACHE_MAX_ENTRIES = 100
+CACHE_MAX_BYTES = 16 * 1024 * 1024
 
-def get_cached_context(cache_key: str):
-    """Return cached context if still fresh."""
-    entry = document_cache.get(cache_key)
-    if not entry:
-        return None
-
-    if time.time() - entry["timestamp"] > CACHE_TTL_SECONDS:
-        document_cache.pop(cache_key, None)
-        return None
+# Sessions idle longer than the TTL are removed by a background reaper
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "3600"))
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "100000"))
+SESSION_REAP_INTERVAL_SECONDS = float(os.getenv("SESSION_REAP_INTERVAL_SECONDS", "60"))
 
-    return entry["context"]
+# Conversation history and context cache, in-process or shared across workers
+session_store = create_session_store(
+    CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS, CACHE_MAX_BYTES, max_sessions=SESSION_MAX_COUNT
+)
 
-def set_cached_context(cache_key: str, context: List[str]):
-    """Cache retrieval results with simple LRU eviction."""
-    if len(document_cache) >= CACHE_MAX_ENTRIES:
-        oldest_key = min(document_cache, key=lambda key: document_cache[key]["timestamp"])
-        document_cache.pop(oldest_key, None)
+# Optional cross-session cache of answers to first-turn questions, shared by
+# every worker when the session store is
+answer_cache = (
+    SemanticAnswerCache(store=session_store if session_store.shared else None) if ANSWER_CACHE_ENABLED else None
+)
 
-    document_cache[cache_key] = {
-        "context": context,
-        "timestamp": time.time(),
+# Leads are appended to a durable local outbox and delivered to the CRM by a
+# background dispatcher, so a CRM outage or a worker restart never loses one
+lead_outbox = Outbox()
+
+def _deliver_outbox_message(topic: str, payload: Dict[str, Any]) -> bool:
+    if topic == "lead":
+        return webhook_handler.send_lead(**payload)
+    raise ValueError(f"Unknown outbox topic '{topic}'")
+
+def _deliver_outbox_batch(topic: str, payloads: List[Dict[str, Any]]) -> List[Optional[str]]:
+    if topic == "lead":
+        return webhook_handler.send_leads(payloads)
+    raise ValueError(f"Unknown outbox topic '{topic}'")
+
+# With CRM_BATCH_ENABLED=1 (Zoho/HubSpot) pending leads go out as multi-record calls
+lead_dispatcher = OutboxDispatcher(
+    lead_outbox,
+    _deliver_outbox_message,
+    deliver_batch=_deliver_outbox_batch if webhook_handler.batch_size > 1 else None,
+    batch_size=webhook_handler.batch_size,
+)
+if CRM_SEND_BUDGET_SECONDS >= OUTBOX_LEASE_SECONDS:
+    print(f"⚠️ CRM_SEND_BUDGET_SECONDS ({CRM_SEND_BUDGET_SECONDS}) should be below OUTBOX_LEASE_SECONDS "
+          f"({OUTBOX_LEASE_SECONDS}), or slow batches may be delivered twice")
+
+# Chat logs are buffered and posted in batches over the pooled webhook session
+chat_log_buffer = ChatLogBuffer(lambda logs: webhook_handler.send_chat_logs(logs, compress=CHAT_LOG_GZIP))
+
+def _cache_lookups() -> Dict[tuple, int]:
+    """Hit/miss counters every cache already keeps, read when /metrics is scraped."""
+    caches = {
+        "context": session_store.context_stats(),
+        "embedding": embedding_cache_stats(),
+        "answer": answer_cache.stats() if answer_cache else None,
+        "rerank_score": reranker_stats().get("score_cache"),
     }
+    lookups = {}
+    for cache, stats in caches.items():
+        if stats:
+            lookups[(cache, "hit")] = stats["hits"]
+            lookups[(cache, "miss")] = stats["misses"]
+    return lookups
+
+CallbackMetric(
+    "koolboks_cache_lookups", "Cache lookups by cache and result.", _cache_lookups, ["cache", "result"], "counter"
+)
+CallbackMetric("koolboks_lead_outbox_messages", "Leads in the CRM outbox by status.", lead_outbox.counts, ["status"])
+CallbackMetric(
+    "koolboks_chat_log_buffered", "Chat logs waiting for the next batch.", lambda: chat_log_buffer.stats()["buffered"]
+)
+
+# Knowledge-base version, per tenant, this worker's in-process caches were built against
+_seen_kb_versions: Dict[str, int] = {}
+
+# A shared (SQLite) store can wait on other workers' locks, so its calls run
+# here instead of on the event loop, without tying up the default thread pool
+_session_store_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="session-store")
+
+async def _store_call(fn, *args):
+    """Run a session-store method, off the event loop when the backend blocks."""
+    if not session_store.blocking:
+        return fn(*args)
+    return await asyncio.get_running_loop().run_in_executor(_session_store_executor, fn, *args)
+
+# The lead outbox is a SQLite file shared by every worker, so an append or a
+# count can wait on another worker's write lock; keep that off the event loop too
+_outbox_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="outbox-store")
+
+async def _outbox_call(fn, *args):
+    """Run a lead-outbox method (or one that reads the outbox) off the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(_outbox_executor, fn, *args)
+
+async def get_cached_context(cache_key: str):
+    """Return cached context if still fresh."""
+    return await _store_call(session_store.get_context, cache_key)
+
+async def set_cached_context(cache_key: str, context: List[str]):
+    """Cache retrieval results with LRU eviction and TTL expiry."""
+    await _store_call(session_store.set_context, cache_key, context)
 
 def cleanup_old_sessions():
-    """Remove conversation histories older than 1 hour"""
-    current_time = time.time()
-    for session_id in list(conversations.keys()):
-        if current_time - conversations[session_id]["last_access"] > 3600:
-            del conversations[session_id]
+    """Remove conversation histories idle for longer than SESSION_TTL_SECONDS."""
+    return session_store.expire_sessions(SESSION_TTL_SECONDS)
+
+async def _session_reaper():
+    """Expire idle sessions periodically, off the request path."""
+    while True:
+        await asyncio.sleep(SESSION_REAP_INTERVAL_SECONDS)
+        try:
+            expired = await _store_call(cleanup_old_sessions)
+            if expired:
+                print(f"🧹 Expired {expired} idle sessions")
+        except Exception as e:
+            print(f"❌ Session reaper error: {str(e)}")
+
+@app.on_event("startup")
+async def _start_session_reaper():
+    app.state.session_reaper = asyncio.create_task(_session_reaper())
+
+@app.on_event("startup")
+async def _start_lead_dispatcher():
+    # Without a CRM URL leads stay queued until one is configured
+    if webhook_handler.webhook_url:
+        app.state.lead_dispatcher = lead_dispatcher.start()
+
+@app.on_event("startup")
+async def _start_chat_log_buffer():
+    app.state.chat_log_buffer = chat_log_buffer.start()
+
+@app.on_event("shutdown")
+async def _flush_chat_logs():
+    await chat_log_buffer.flush()
+
+# Models load lazily on first use; set WARMUP_ON_STARTUP=1 to load them in the
+# background as soon as the worker is up (without delaying /health)
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "0") == "1"
+
+# With gunicorn preload (see gunicorn.conf.py) this import runs in the master,
+# so the weights loaded here are shared copy-on-write by every worker
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "0") == "1"
+if PRELOAD_MODELS:
+    preload_model()
+
+def _warm_up(include_ocr: bool = False):
+    """Load the chat-path models and clients (and optionally OCR, where ingestion runs) now."""
+    warm_up_llm()
+    warm_up_embeddings()
+    if include_ocr:
+        warm_up_ingestion()
+
+@app.on_event("startup")
+async def _start_warm_up():
+    if WARMUP_ON_STARTUP:
+        app.state.warm_up = asyncio.create_task(asyncio.to_thread(_warm_up))
+
+async def _sync_knowledge_base_version(tenant: str) -> int:
+    """Drop the tenant's in-process caches if another worker changed its knowledge base.
+
+    Returns the current version; results computed from it are only cached
+    while it is still current (see ``_kb_unchanged``).
+    """
+    version = await _store_call(session_store.kb_version, tenant)
+    seen = _seen_kb_versions.get(tenant)
+    _seen_kb_versions[tenant] = version
+    if seen is not None and version != seen and answer_cache is not None:
+        answer_cache.clear(f"{tenant}:")
+    return version
+
+async def _kb_unchanged(tenant: str, kb_version: Optional[int]) -> bool:
+    """True unless an upload or delete changed the tenant's knowledge base since ``kb_version``.
+
+    Checked right before caching, so a result built from the old documents is
+    not written back after ``_reset_caches_for_tenant`` cleared the caches.
+    """
+    if kb_version is None:
+        return True
+    return await _store_call(session_store.kb_version, tenant) == kb_version
 
 class ChatMessage(BaseModel):
     role: str
@@ -75,11 +284,16 @@ class ChatSettings(BaseModel):
     max_tokens: int = 500
     top_p: float = 0.95
 
+FilterValue = Union[str, int, float, bool]
+
 class ChatRequest(BaseModel):
     query: str
     session_id: str
     chat_history: List[ChatHistory] = []
     settings: Optional[ChatSettings] = None
+    tenant: str = DEFAULT_TENANT
+    # Metadata filters, e.g. {"doc_id": "price-list.pdf"} or {"source_type": ["faq", "catalog"]}
+    filters: Optional[Dict[str, Union[FilterValue, List[FilterValue]]]] = None
 
 class LeadCapture(BaseModel):
     name: str
@@ -90,81 +304,220 @@ class LeadCapture(BaseModel):
     session_id: str
     chat_history: List[Dict[str, str]] = []
 
-@app.post("/upload/")
-async def upload_pdf(file: UploadFile = File(...)):
+def _reset_caches_for_tenant(tenant: str):
+    """Reset the tenant's caches so its responses align with the changed documents.
+
+    Context cache keys and answer-cache scopes start with ``<tenant>:``, so
+    other tenants' caches and everyone's sessions are left alone.
+    """
+    _seen_kb_versions[tenant] = session_store.invalidate_knowledge_base(tenant)
+    if answer_cache is not None:
+        answer_cache.clear(f"{tenant}:")
+
+def _checked_tenant(tenant: str) -> str:
     try:
-        pdf_bytes = await file.read()
-        pdf_text = extract_text_from_pdf(pdf_bytes)
-        image_texts = extract_images_from_pdf(pdf_bytes)
+        return validate_tenant(tenant)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
 
-        full_text = pdf_text + "\n" + "\n".join(image_texts)
-        print(f"📜 Extracted Text Length: {len(full_text)} characters")
+def _search_scope(request: ChatRequest) -> str:
+    """Key separating cached context and answers of different tenants and filters."""
+    return f"{request.tenant}:{json.dumps(request.filters or {}, sort_keys=True)}"
 
-        chunks = chunk_text(full_text)
-        store_chunks_and_embeddings(chunks)
+@app.post("/upload/")
+async def upload_pdf(
+    file: UploadFile = File(...),
+    tenant: str = Form(DEFAULT_TENANT),
+    doc_id: Optional[str] = Form(None),
+    source_type: str = Form("pdf"),
+    x_admin_token: str = Header(""),
+):
+    """Queue a PDF for background ingestion and return its job id. Admin only.
+
+    Each ``doc_id`` (default: the filename) is stored alongside the tenant's
+    other documents; re-uploading it replaces only that document.
+    """
+    _require_admin(x_admin_token)
+    tenant = _checked_tenant(tenant)
+    try:
+        with span("upload.read") as read_span:
+            pdf_bytes = await file.read()
+            read_span.set(bytes=len(pdf_bytes))
+        with span("ingestion.submit"):
+            # A traced upload also traces its ingestion job (see GET /upload/{job_id})
+            # The job record goes to the session store so any worker can answer the poll
+            job = await asyncio.to_thread(
+                submit_ingestion,
+                pdf_bytes,
+                filename=file.filename or "",
+                on_complete=lambda finished_job: _reset_caches_for_tenant(finished_job.tenant),
+                doc_id=doc_id,
+                tenant=tenant,
+                source_type=source_type,
+                store=session_store,
+            )
 
-        # Reset caches so responses align with the new document
-        document_cache.clear()
-        conversations.clear()
-        
         return {
-            "message": "Knowledge base uploaded successfully! You can now start chatting.",
-            "chunks": len(chunks)
+            "message": "Document received. Processing has started in the background.",
+            "job_id": job.job_id,
+            "status_url": f"/upload/{job.job_id}",
         }
 
     except Exception as e:
         return {"error": f"Failed to process document: {str(e)}"}
 
+@app.get("/upload/{job_id}")
+async def upload_status(job_id: str):
+    """Report the stage and progress of an ingestion job."""
+    job = await asyncio.to_thread(get_job, job_id, session_store)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown ingestion job.")
+    return job
+
+@app.get("/documents")
+async def documents(tenant: str = DEFAULT_TENANT):
+    """List the tenant's stored documents."""
+    tenant = _checked_tenant(tenant)
+    return {"tenant": tenant, "documents": await asyncio.to_thread(list_documents, tenant)}
+
+@app.delete("/documents/{doc_id}")
+async def remove_document(doc_id: str, tenant: str = DEFAULT_TENANT, x_admin_token: str = Header("")):
+    """Delete one document (all of its chunks) from the tenant's knowledge base. Admin only."""
+    _require_admin(x_admin_token)
+    tenant = _checked_tenant(tenant)
+    deleted = await asyncio.to_thread(delete_document, doc_id, tenant)
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Unknown document.")
+    await asyncio.to_thread(_reset_caches_for_tenant, tenant)
+    return {"tenant": tenant, "doc_id": doc_id, "chunks_deleted": deleted}
+
+async def _retrieve_context(
+    query: str,
+    session_id: str,
+    query_embedding=None,
+    tenant: str = DEFAULT_TENANT,
+    filters: Optional[Dict[str, Any]] = None,
+    scope: str = "",
+    kb_version: Optional[int] = None,
+) -> List[str]:
+    """Retrieve relevant context from the tenant's documents (if available).
+
+    The context is cached only if the knowledge base is still at ``kb_version``.
+    """
+    normalized_query = query.strip().lower()
+    # Scope (tenant first) leads the key so one tenant's entries can be dropped together
+    cache_key = f"{scope}:{session_id}:{normalized_query}"
+    with span("retrieval") as retrieval_span:
+        with span("context_cache.lookup"):
+            cached_context = await get_cached_context(cache_key)
+        if cached_context is not None:
+            retrieval_span.set(cache="hit")
+            return cached_context
+        retrieval_span.set(cache="miss")
+
+        # Try to get context from documents, but don't fail if none exist
+        try:
+            retrieved_context = await ahybrid_search(
+                query, top_k=3, query_embedding=query_embedding, tenant=tenant, filters=filters
+            )
+            if await _kb_unchanged(tenant, kb_version):
+                await set_cached_context(cache_key, retrieved_context)
+            return retrieved_context
+        except Exception as search_error:
+            # No documents uploaded yet, that's fine - chatbot works without them
+            print(f"No document context available: {search_error}")
+            return []
+
+async def _lookup_cached_answer(query: str, chat_history: List[ChatHistory], scope: str = ""):
+    """Return ``(query_embedding, cached_answer)`` for first-turn queries.
+
+    Both are None when the answer cache is disabled or the chat has history,
+    since follow-up answers depend on the earlier turns.
+    """
+    if answer_cache is None or chat_history:
+        return None, None
+
+    with span("answer_cache.lookup") as lookup_span:
+        try:
+            query_embedding = await aget_query_embedding(query)
+        except Exception as embed_error:
+            print(f"Answer cache lookup skipped: {embed_error}")
+            return None, None
+
+        cached_answer = await _store_call(answer_cache.lookup, query_embedding, scope)
+        lookup_span.set(cache="hit" if cached_answer is not None else "miss")
+        return query_embedding, cached_answer
+
+async def _store_cached_answer(
+    query: str,
+    query_embedding,
+    answer: str,
+    sources: List[str],
+    scope: str = "",
+    tenant: str = DEFAULT_TENANT,
+    kb_version: Optional[int] = None,
+):
+    """Remember a freshly generated first-turn answer (never an error reply).
+
+    Skipped if the tenant's knowledge base changed while the answer was generated.
+    """
+    if query_embedding is None or answer.startswith(LLM_ERROR_PREFIX):
+        return
+    if not await _kb_unchanged(tenant, kb_version):
+        return
+    await _store_call(answer_cache.store, query, query_embedding, answer, sources, scope)
+
+def _format_history(chat_history: List[ChatHistory]) -> List[Dict[str, str]]:
+    """Format the recent chat history for the LLM."""
+    formatted_history: List[Dict[str, str]] = []
+    for msg in chat_history:
+        formatted_history.extend(
+            [
+                {"role": "user", "content": msg.user},
+                {"role": "assistant", "content": msg.assistant},
+            ]
+        )
+    return formatted_history
+
+def _sse_event(event: str, data: Any) -> str:
+    """Encode a single server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @app.post("/chat/")
 async def chat(request: ChatRequest):
     if not request.query.strip():
         raise HTTPException(status_code=400, detail="Query cannot be empty.")
+    _checked_tenant(request.tenant)
+    scope = _search_scope(request)
 
     try:
-        # Clean up stale sessions periodically
-        cleanup_old_sessions()
+        kb_version = await _sync_knowledge_base_version(request.tenant)
 
         start_time = time.time()
-        session_state = conversations.setdefault(
-            request.session_id,
-            {"history": [], "last_access": start_time},
+        await _store_call(session_store.touch_session, request.session_id, start_time)
+
+        query_embedding, cached_answer = await _lookup_cached_answer(request.query, request.chat_history, scope)
+        if cached_answer is not None:
+            processing_time = time.time() - start_time
+            CHAT_REQUEST_SECONDS.labels("chat", "true").observe(processing_time)
+            return {
+                "response": cached_answer["answer"],
+                "context": "\n\nSources:\n" + "\n\n".join(cached_answer["sources"]),
+                "processing_time": processing_time,
+                "cached": True,
+            }
+
+        retrieved_context = await _retrieve_context(
+            request.query, request.session_id, query_embedding, request.tenant, request.filters, scope, kb_version
         )
-        session_state["last_access"] = start_time
-
-        # Retrieve relevant context from uploaded documents (if available)
-        normalized_query = request.query.strip().lower()
-        cache_key = f"{request.session_id}:{normalized_query}"
-        cached_context = get_cached_context(cache_key)
-        
-        # Try to get context from documents, but don't fail if none exist
-        try:
-            if cached_context is not None:
-                retrieved_context = cached_context
-            else:
-                retrieved_context = hybrid_search(request.query, top_k=3)
-                set_cached_context(cache_key, retrieved_context)
-        except Exception as search_error:
-            # No documents uploaded yet, that's fine - chatbot works without them
-            print(f"No document context available: {search_error}")
-            retrieved_context = []
-
-        # Format the recent chat history for the LLM
         trimmed_history = request.chat_history[-5:]
-        formatted_history: List[Dict[str, str]] = []
-        for msg in trimmed_history:
-            formatted_history.extend(
-                [
-                    {"role": "user", "content": msg.user},
-                    {"role": "assistant", "content": msg.assistant},
-                ]
-            )
+        formatted_history = _format_history(trimmed_history)
 
         # Generate response using the LLM with timeout protection
         llm_settings = request.settings or ChatSettings()
         try:
             response = await asyncio.wait_for(
-                asyncio.to_thread(
-                    generate_chat_response,
+                agenerate_chat_response(
                     query=request.query,
                     context=retrieved_context,
                     chat_history=formatted_history,
@@ -172,16 +525,26 @@ async def chat(request: ChatRequest):
                     max_tokens=llm_settings.max_tokens,
                     top_p=llm_settings.top_p,
                 ),
-                timeout=50,  # Increased to 50 seconds
+                timeout=CHAT_TIMEOUT_SECONDS,
             )
         except asyncio.TimeoutError as exc:
             raise HTTPException(status_code=504, detail="Response generation timed out") from exc
 
+        await _store_cached_answer(
+            request.query, query_embedding, response, retrieved_context, scope, request.tenant, kb_version
+        )
+
         # Persist trimmed history for potential server-side analytics
-        session_state["history"] = [msg.dict() for msg in trimmed_history]
+        with span("session.save"):
+            await _store_call(
+                session_store.save_session_history,
+                request.session_id,
+                [msg.dict() for msg in trimmed_history],
+                time.time(),
+            )
 
         processing_time = time.time() - start_time
-        session_state["last_access"] = time.time()
+        CHAT_REQUEST_SECONDS.labels("chat", "false").observe(processing_time)
 
         return {
             "response": response,
@@ -194,6 +557,125 @@ async def chat(request: ChatRequest):
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Failed to process chat request: {exc}") from exc
 
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Stream the chat response as server-sent events.
+
+    Emits a ``sources`` event with the retrieved context, one ``token`` event per
+    generated token, and a final ``done`` event carrying timing information, or
+    an ``error`` event if generation fails or runs past ``CHAT_TIMEOUT_SECONDS``.
+    """
+    if not request.query.strip():
+        raise HTTPException(status_code=400, detail="Query cannot be empty.")
+    _checked_tenant(request.tenant)
+    scope = _search_scope(request)
+
+    kb_version = await _sync_knowledge_base_version(request.tenant)
+
+    start_time = time.time()
+    await _store_call(session_store.touch_session, request.session_id, start_time)
+
+    query_embedding, cached_answer = await _lookup_cached_answer(request.query, request.chat_history, scope)
+
+    async def cached_event_stream():
+        yield _sse_event("sources", {"context": cached_answer["sources"]})
+        yield _sse_event("token", {"token": cached_answer["answer"]})
+        elapsed = time.time() - start_time
+        CHAT_REQUEST_SECONDS.labels("stream", "true").observe(elapsed)
+        yield _sse_event(
+            "done",
+            {"processing_time": elapsed, "time_to_first_token": elapsed, "cached": True},
+        )
+
+    retrieved_context = []
+    if cached_answer is None:
+        retrieved_context = await _retrieve_context(
+            request.query, request.session_id, query_embedding, request.tenant, request.filters, scope, kb_version
+        )
+    trimmed_history = request.chat_history[-5:]
+    formatted_history = _format_history(trimmed_history)
+    llm_settings = request.settings or ChatSettings()
+
+    async def event_stream():
+        yield _sse_event("sources", {"context": retrieved_context})
+
+        first_token_time = None
+        response_tokens: List[str] = []
+        deadline = start_time + CHAT_TIMEOUT_SECONDS
+        tokens = astream_chat_response(
+            query=request.query,
+            context=retrieved_context,
+            chat_history=formatted_history,
+            temperature=llm_settings.temperature,
+            max_tokens=llm_settings.max_tokens,
+            top_p=llm_settings.top_p,
+        )
+        # Every stream ends with exactly one ``done`` or ``error`` event
+        try:
+            while True:
+                try:
+                    token = await asyncio.wait_for(tokens.__anext__(), max(0.0, deadline - time.time()))
+                except StopAsyncIteration:
+                    break
+                if first_token_time is None:
+                    first_token_time = time.time()
+                response_tokens.append(token)
+                yield _sse_event("token", {"token": token})
+        except asyncio.TimeoutError:
+            yield _sse_event("error", {"message": "Response generation timed out"})
+            return
+        except LLMStreamError as stream_error:
+            # Whatever was streamed is incomplete: report it, and never cache it
+            yield _sse_event("error", {"message": str(stream_error)})
+            return
+        except Exception as exc:
+            print(f"❌ Chat stream error: {str(exc)}")
+            yield _sse_event("error", {"message": f"Failed to process chat request: {exc}"})
+            return
+        finally:
+            await tokens.aclose()
+
+        # The answer is complete; bookkeeping failures must not withhold ``done``
+        try:
+            await _store_cached_answer(
+                request.query,
+                query_embedding,
+                "".join(response_tokens),
+                retrieved_context,
+                scope,
+                request.tenant,
+                kb_version,
+            )
+            await _store_call(
+                session_store.save_session_history,
+                request.session_id,
+                [msg.dict() for msg in trimmed_history],
+                time.time(),
+            )
+        except Exception as exc:
+            print(f"⚠️ Could not save chat stream session: {str(exc)}")
+
+        processing_time = time.time() - start_time
+        CHAT_REQUEST_SECONDS.labels("stream", "false").observe(processing_time)
+        yield _sse_event(
+            "done",
+            {
+                "processing_time": processing_time,
+                "time_to_first_token": (first_token_time - start_time) if first_token_time else None,
+            },
+        )
+
+    # Content-Encoding stops GZipMiddleware from buffering the event stream
+    return StreamingResponse(
+        cached_event_stream() if cached_answer else event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Content-Encoding": "identity",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
 @app.post("/capture-lead/")
 async def capture_lead(lead: LeadCapture):
     """Capture lead information and send to CRM via webhook."""
@@ -209,19 +691,22 @@ async def capture_lead(lead: LeadCapture):
         print(f"Session ID: {lead.session_id}")
         print(f"{'='*60}\n")
         
-        # Send lead to CRM webhook asynchronously (non-blocking)
-        asyncio.create_task(
-            asyncio.to_thread(
-                webhook_handler.send_lead,
-                name=lead.name,
-                email=lead.email,
-                phone=lead.phone,
-                message=lead.message,
-                interested_products=lead.interested_products,
-                session_id=lead.session_id,
-                chat_history=lead.chat_history
+        # Queue the lead durably; the dispatcher delivers it to the CRM with retries
+        with span("webhook.outbox_append"):
+            await _outbox_call(
+                lead_outbox.append,
+                "lead",
+                {
+                    "name": lead.name,
+                    "email": lead.email,
+                    "phone": lead.phone,
+                    "message": lead.message,
+                    "interested_products": lead.interested_products,
+                    "session_id": lead.session_id,
+                    "chat_history": lead.chat_history,
+                },
             )
-        )
+        lead_dispatcher.notify()
         
         # Return immediately to user without waiting for webhook
         return {
@@ -241,17 +726,50 @@ async def capture_lead(lead: LeadCapture):
 
 @app.post("/log-chat/")
 async def log_chat(session_id: str, chat_history: List[Dict], user_info: Optional[Dict] = None):
-    """Log complete chat session to webhook for analytics."""
+    """Queue a complete chat session for batched delivery to the analytics webhook."""
+    if not webhook_handler.webhook_url:
+        return {"status": "failed"}
     try:
-        webhook_handler.send_chat_log(
-            session_id=session_id,
-            chat_history=chat_history,
-            user_info=user_info
-        )
-        return {"status": "logged"}
+        with span("webhook.chat_log_offer"):
+            accepted = chat_log_buffer.offer(
+                webhook_handler.build_chat_log(session_id=session_id, chat_history=chat_history, user_info=user_info)
+            )
     except Exception as e:
         print(f"❌ Chat log error: {str(e)}")
         return {"status": "failed"}
+    if not accepted:
+        # Buffer full: ask the client to retry later rather than queueing without bound
+        return JSONResponse({"status": "busy"}, status_code=503, headers={"Retry-After": "5"})
+    return {"status": "logged"}
+
+class OutboxReplay(BaseModel):
+    ids: Optional[List[int]] = None
+
+# Payload fields shown in dead-letter listings; contact details and chat text are masked
+_UNREDACTED_PAYLOAD_FIELDS = {"session_id", "interested_products"}
+
+def _redacted(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        key: value if key in _UNREDACTED_PAYLOAD_FIELDS or not value else "[redacted]"
+        for key, value in payload.items()
+    }
+
+@app.get("/outbox")
+async def outbox_status(limit: int = 100, x_admin_token: str = Header("")):
+    """Delivery counters and the oldest dead-lettered leads (payloads redacted). Admin only."""
+    _require_admin(x_admin_token)
+    dead_letters = await _outbox_call(lead_outbox.dead_letters, limit)
+    for message in dead_letters:
+        message["payload"] = _redacted(message["payload"])
+    return {**await _outbox_call(lead_dispatcher.stats), "dead_letters": dead_letters}
+
+@app.post("/outbox/replay")
+async def outbox_replay(request: OutboxReplay, x_admin_token: str = Header("")):
+    """Requeue dead-lettered leads (all of them, or the given ids). Admin only."""
+    _require_admin(x_admin_token)
+    requeued = await _outbox_call(lead_outbox.replay, request.ids)
+    lead_dispatcher.notify()
+    return {"requeued": requeued}
 
 @app.get("/health")
 async def health_check():
@@ -259,9 +777,60 @@ async def health_check():
     return {
         "status": "healthy",
         "webhook_configured": bool(webhook_handler.webhook_url),
+        "context_cache": await _store_call(session_store.context_stats),
+        "embedding_cache": embedding_cache_stats(),
+        "answer_cache": answer_cache.stats() if answer_cache else {"enabled": False},
+        "reranker": reranker_stats(),
+        "lead_outbox": await _outbox_call(lead_outbox.counts),
+        "crm_pacing": webhook_handler.pacer.stats(),
+        "chat_log_buffer": chat_log_buffer.stats(),
         "timestamp": time.time()
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint: latency histograms, cache and queue counters of this worker."""
+    body = await asyncio.to_thread(render_metrics)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/admin/profile")
+async def profile(seconds: float = 10, interval_ms: float = 5, x_admin_token: str = Header("")):
+    """Sample this worker's stacks for ``seconds`` and return them collapsed, ready for a flamegraph.
+
+    Needs ``ADMIN_TOKEN`` configured and sent as ``X-Admin-Token``.
+    """
+    _require_admin(x_admin_token)
+    if seconds <= 0 or interval_ms <= 0:
+        raise HTTPException(status_code=400, detail="seconds and interval_ms must be positive.")
+    try:
+        stacks = await asyncio.to_thread(collapsed_stacks, seconds, interval_ms / 1000)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    return PlainTextResponse(stacks)
+
+def _startup_report() -> Dict[str, Any]:
+    return {
+        "app_import_seconds": APP_IMPORT_SECONDS,
+        "pid": os.getpid(),
+        "memory": process_memory(),
+        "resources": resource_report(),
+    }
+
+@app.get("/startup")
+async def startup_report():
+    """Report app import time and which heavy resources have been loaded so far."""
+    return _startup_report()
+
+@app.post("/warmup")
+async def warmup(ocr: bool = False, x_admin_token: str = Header("")):
+    """Load models and clients ahead of traffic; ocr=true also warms the ingestion process. Admin only."""
+    _require_admin(x_admin_token)
+    await asyncio.to_thread(_warm_up, ocr)
+    return _startup_report()
+
+APP_IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
+print(f"🚀 App imported in {APP_IMPORT_SECONDS:.2f}s")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host = "0.0.0.0", port = 8000)
\ No newline at end of file
@@ -0,0 +1,28 @@
+"""Process memory figures from /proc (Linux).
+
+RSS counts shared pages in every process that maps them, so with preloaded,
+copy-on-write models the per-worker RSS overstates real usage. PSS splits
+shared pages between the processes sharing them and sums to the true total.
+"""
+
+from typing import Dict, Optional, Union
+
+
+def process_memory(pid: Union[int, str] = "self") -> Optional[Dict[str, float]]:
+    """Return RSS, PSS and shared memory in MiB for ``pid`` (None if unavailable)."""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        return None
+
+    shared_kb = fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)
+    return {
+        "rss_mb": fields.get("Rss", 0) / 1024,
+        "pss_mb": fields.get("Pss", 0) / 1024,
+        "shared_mb": shared_kb / 1024,
+    }
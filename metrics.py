@@ -0,0 +1,309 @@
+"""Process-local metrics served at ``/metrics`` in the Prometheus text format.
+
+Histograms and gauges on the hot path are plain in-memory counters: an
+observation is a ``perf_counter`` pair, a bisect over the bucket bounds and a
+few additions under a lock (about a microsecond, see ``bench_metrics.py``),
+against chat latencies of tens of milliseconds. Values that components already count (cache hits and
+misses, outbox depth, ...) are not re-counted; ``CallbackMetric`` reads them
+when ``/metrics`` is scraped.
+
+Every worker process keeps its own registry, so with several gunicorn workers
+each scrape reports the worker that answered it; the ``pid`` label tells
+them apart.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple, Union
+
+# Seconds; spans sub-millisecond cache paths up to slow LLM calls and OCR pages
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry: List["_Metric"] = []
+_pid_label = f'pid="{os.getpid()}"'
+
+
+def _reset_pid_after_fork() -> None:
+    global _pid_label
+    _pid_label = f'pid="{os.getpid()}"'
+
+
+os.register_at_fork(after_in_child=_reset_pid_after_fork)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(labelnames: Sequence[str], labelvalues: Sequence[str], extra: str = "") -> str:
+    pairs = [_pid_label]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}"
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def labels(self, *labelvalues: str):
+        """Child metric for one combination of label values (created on first use)."""
+        child = self._children.get(labelvalues)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(labelvalues, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _default(self):
+        return self.labels() if not self.labelnames else None
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for labelvalues, child in list(self._children.items()):
+            lines.extend(child.render(self.name, _label_text(self.labelnames, labelvalues), self.labelnames, labelvalues))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def render(self, name, labels, labelnames, labelvalues):
+        return [f"{name}_total{labels} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    """Monotonic count; the exposed sample name gets a ``_total`` suffix."""
+
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1) -> None:
+        self._default().inc(amount)
+
+
+class _GaugeChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def render(self, name, labels, labelnames, labelvalues):
+        return [f"{name}{labels} {_format_value(self.value)}"]
+
+
+class Gauge(_Metric):
+    """Value that goes up and down, e.g. requests in flight."""
+
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float) -> None:
+        self._default().set(value)
+
+    def inc(self, amount: float = 1) -> None:
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self._default().dec(amount)
+
+
+class _Timer:
+    """``with histogram.time():`` observes the elapsed seconds of the block."""
+
+    __slots__ = ("_child", "_start")
+
+    def __init__(self, child: "_HistogramChild"):
+        self._child = child
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._child.observe(time.perf_counter() - self._start)
+        return False
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        # Per-bucket (not cumulative) counts; the last slot is +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+    def render(self, name, labels, labelnames, labelvalues):
+        with self._lock:
+            counts = list(self.counts)
+            total = self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(list(self.buckets) + [float("inf")], counts):
+            cumulative += count
+            bucket_labels = _label_text(labelnames, labelvalues, f'le="{_format_value(bound)}"')
+            lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+        lines.append(f"{name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{name}_count{labels} {cumulative}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Distribution of durations (seconds) over fixed buckets."""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(float(bound) for bound in buckets)
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default().observe(value)
+
+    def time(self) -> _Timer:
+        return self._default().time()
+
+    def take_samples(self) -> Dict[Tuple[str, ...], Tuple[List[int], float]]:
+        """Return and reset every child's bucket counts and sum (to hand them to another process)."""
+        samples = {}
+        for labelvalues, child in list(self._children.items()):
+            with child._lock:
+                samples[labelvalues] = (list(child.counts), child.sum)
+                child.counts = [0] * len(child.counts)
+                child.sum = 0.0
+        return samples
+
+    def add_samples(self, samples: Dict[Tuple[str, ...], Tuple[List[int], float]]) -> None:
+        """Fold in counts from ``take_samples`` of the same histogram in another process."""
+        for labelvalues, (counts, total) in samples.items():
+            child = self.labels(*labelvalues)
+            with child._lock:
+                child.counts = [mine + theirs for mine, theirs in zip(child.counts, counts)]
+                child.sum += total
+
+
+class CallbackMetric(_Metric):
+    """Gauge or counter whose value is read from ``fn`` at scrape time.
+
+    ``fn`` returns a number, or a dict mapping label values (a tuple, or a
+    string for a single label) to numbers. Errors and None skip the metric.
+    """
+
+    def __init__(self, name: str, documentation: str, fn: Callable[[], Union[None, float, Dict]],
+                 labelnames: Sequence[str] = (), type_name: str = "gauge"):
+        self.fn = fn
+        self.type_name = type_name
+        super().__init__(name, documentation, labelnames)
+
+    def render(self) -> List[str]:
+        try:
+            values = self.fn()
+        except Exception as e:
+            print(f"⚠️ Metric {self.name} unavailable: {e}")
+            return []
+        if values is None:
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        sample = f"{self.name}_total" if self.type_name == "counter" else self.name
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for labelvalues, value in values.items():
+            if not isinstance(labelvalues, tuple):
+                labelvalues = (labelvalues,)
+            lines.append(f"{sample}{_label_text(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+
+def render_metrics() -> str:
+    """Every registered metric in the Prometheus text exposition format (0.0.4)."""
+    lines = []
+    for metric in list(_registry):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Chat path
+CHAT_REQUEST_SECONDS = Histogram(
+    "koolboks_chat_request_seconds", "Chat handling time, through the last streamed token.", ["endpoint", "cached"]
+)
+QUERY_EMBEDDING_SECONDS = Histogram(
+    "koolboks_query_embedding_seconds", "Time to embed a chat query (including micro-batch wait)."
+)
+VECTOR_SEARCH_SECONDS = Histogram(
+    "koolboks_vector_search_seconds", "Vector candidate search time.", ["engine"]
+)
+LEXICAL_SEARCH_SECONDS = Histogram(
+    "koolboks_lexical_search_seconds", "BM25 candidate search time."
+)
+RERANK_SECONDS = Histogram(
+    "koolboks_rerank_seconds", "Cross-encoder rerank time, including budget fallbacks."
+)
+LLM_CALL_SECONDS = Histogram(
+    "koolboks_llm_call_seconds", "LLM call time, to the last token when streaming.", ["mode"]
+)
+LLM_TIME_TO_FIRST_TOKEN_SECONDS = Histogram(
+    "koolboks_llm_time_to_first_token_seconds", "Time from sending a streamed LLM call to its first token."
+)
+LLM_ERRORS = Counter("koolboks_llm_errors", "LLM calls that fell back to the error reply.", ["mode"])
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "koolboks_http_requests_in_flight", "HTTP requests being handled, streams included."
+)
+
+# Ingestion path
+INGESTION_STAGE_SECONDS = Histogram(
+    "koolboks_ingestion_stage_seconds",
+    "Ingestion time per unit of work: extract/ocr/chunk per page, embed/store per batch.",
+    ["stage"],
+)
+INGESTION_JOBS = Counter("koolboks_ingestion_jobs", "Finished ingestion jobs.", ["status"])
@@ -0,0 +1,337 @@
+"""Durable outbox for CRM deliveries.
+
+``capture_lead`` only appends the lead to a local SQLite table (WAL mode, so
+the append is a sub-millisecond local write that survives worker restarts).
+An ``OutboxDispatcher`` task in every worker claims due messages, delivers
+them with bounded concurrency, retries failures with exponential backoff and
+jitter, and dead-letters messages that keep failing. Dead letters can be
+replayed once the CRM is fixed.
+
+Claims are leases: a message claimed by a worker that dies is picked up again
+by any worker once ``OUTBOX_LEASE_SECONDS`` pass, so delivery is at least once.
+
+With a ``deliver_batch`` callable the dispatcher claims up to ``batch_size``
+messages per free slot and hands each topic's messages over together, so a
+spike of leads becomes a few multi-record CRM calls. Results come back per
+message, and only the failed ones are retried.
+"""
+
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+OUTBOX_DB_PATH = os.getenv("OUTBOX_DB_PATH", "lead_outbox.db")
+OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", "4"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BACKOFF_BASE_SECONDS = float(os.getenv("OUTBOX_BACKOFF_BASE_SECONDS", "2"))
+OUTBOX_BACKOFF_MAX_SECONDS = float(os.getenv("OUTBOX_BACKOFF_MAX_SECONDS", "600"))
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "60"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "1"))
+
+
+def backoff_seconds(attempts: int, base: float = OUTBOX_BACKOFF_BASE_SECONDS,
+                    cap: float = OUTBOX_BACKOFF_MAX_SECONDS) -> float:
+    """Delay before retry number ``attempts``: exponential, capped, with full jitter."""
+    return random.uniform(0, min(cap, base * 2 ** (attempts - 1)))
+
+
+class Outbox:
+    """SQLite-backed queue of ``(topic, payload)`` messages awaiting delivery."""
+
+    def __init__(
+        self,
+        path: str = OUTBOX_DB_PATH,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+        backoff_base_seconds: float = OUTBOX_BACKOFF_BASE_SECONDS,
+        backoff_max_seconds: float = OUTBOX_BACKOFF_MAX_SECONDS,
+    ):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self._lock = threading.Lock()
+        self._connection = None
+        # Same fork rule as the session store: never share a connection with the parent
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                topic TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                lease_until REAL,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+            """
+        )
+
+    def _reset_after_fork(self) -> None:
+        self._lock = threading.Lock()
+        self._connection = None
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(
+                self.path, check_same_thread=False, timeout=30, isolation_level=None
+            )
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+        return self._connection
+
+    def append(self, topic: str, payload: Dict[str, Any]) -> int:
+        """Durably queue one message and return its id."""
+        now = time.time()
+        with self._lock:
+            return self._conn.execute(
+                "INSERT INTO outbox (topic, payload, next_attempt_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (topic, json.dumps(payload), now, now, now),
+            ).lastrowid
+
+    def claim(self, limit: int, lease_seconds: float = OUTBOX_LEASE_SECONDS) -> List[Dict[str, Any]]:
+        """Lease up to ``limit`` due messages (including ones whose lease expired)."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, topic, payload, attempts FROM outbox "
+                    "WHERE (status = 'pending' AND next_attempt_at <= ?) "
+                    "OR (status = 'inflight' AND lease_until <= ?) "
+                    "ORDER BY id LIMIT ?",
+                    (now, now, limit),
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE outbox SET status = 'inflight', lease_until = ?, updated_at = ? WHERE id = ?",
+                    [(now + lease_seconds, now, row[0]) for row in rows],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [
+            {"id": row[0], "topic": row[1], "payload": json.loads(row[2]), "attempts": row[3]}
+            for row in rows
+        ]
+
+    def mark_delivered(self, message_id: int) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM outbox WHERE id = ?", (message_id,))
+
+    def mark_failed(self, message_id: int, attempts: int, error: str) -> str:
+        """Schedule a retry with backoff, or dead-letter after ``max_attempts``; returns the new status."""
+        now = time.time()
+        status = "dead" if attempts >= self.max_attempts else "pending"
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, lease_until = NULL, "
+                "last_error = ?, updated_at = ? WHERE id = ?",
+                (
+                    status,
+                    attempts,
+                    now + backoff_seconds(attempts, self.backoff_base_seconds, self.backoff_max_seconds),
+                    error[:1000],
+                    now,
+                    message_id,
+                ),
+            )
+        return status
+
+    def next_due_in(self) -> Optional[float]:
+        """Seconds until the next pending message is due (None if there is none)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'"
+            ).fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def dead_letters(self, limit: int = 100) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, topic, payload, attempts, last_error, created_at, updated_at FROM outbox "
+                "WHERE status = 'dead' ORDER BY id LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [
+            {
+                "id": row[0], "topic": row[1], "payload": json.loads(row[2]), "attempts": row[3],
+                "last_error": row[4], "created_at": row[5], "dead_at": row[6],
+            }
+            for row in rows
+        ]
+
+    def replay(self, ids: Optional[List[int]] = None) -> int:
+        """Requeue dead letters (all, or just ``ids``) with a fresh attempt budget."""
+        now = time.time()
+        sql = ("UPDATE outbox SET status = 'pending', attempts = 0, next_attempt_at = ?, "
+               "last_error = NULL, updated_at = ? WHERE status = 'dead'")
+        params: List[Any] = [now, now]
+        if ids is not None:
+            if not ids:
+                return 0
+            sql += f" AND id IN ({','.join('?' * len(ids))})"
+            params.extend(ids)
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        counts = {"pending": 0, "inflight": 0, "dead": 0}
+        counts.update(dict(rows))
+        return counts
+
+
+class OutboxDispatcher:
+    """Drain an ``Outbox`` by calling ``deliver(topic, payload)`` on worker threads.
+
+    ``deliver`` returns True on success; False or an exception counts as a
+    failed attempt. ``deliver_batch(topic, payloads)``, when given, returns
+    one error per payload (None on success).
+    """
+
+    def __init__(
+        self,
+        outbox: Outbox,
+        deliver: Callable[[str, Dict[str, Any]], bool],
+        concurrency: int = OUTBOX_CONCURRENCY,
+        poll_seconds: float = OUTBOX_POLL_SECONDS,
+        deliver_batch: Optional[Callable[[str, List[Dict[str, Any]]], List[Optional[str]]]] = None,
+        batch_size: int = 1,
+    ):
+        self.outbox = outbox
+        self.deliver = deliver
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        self.deliver_batch = deliver_batch
+        self.batch_size = batch_size if deliver_batch is not None else 1
+        self.batches = 0
+        self.delivered = 0
+        self.retried = 0
+        self.dead_lettered = 0
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="outbox")
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> asyncio.Task:
+        """Start the dispatch loop on the running event loop."""
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self._task
+
+    def notify(self) -> None:
+        """Wake the dispatcher after an append instead of waiting for the next poll."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _deliver_one(self, message: Dict[str, Any]) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            ok = await loop.run_in_executor(self._executor, self.deliver, message["topic"], message["payload"])
+            error = None if ok else "delivery returned False"
+        except Exception as e:
+            error = str(e)
+        await asyncio.to_thread(self._record_results, [message], [error])
+
+    async def _deliver_many(self, messages: List[Dict[str, Any]]) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            errors = await loop.run_in_executor(
+                self._executor, self.deliver_batch, messages[0]["topic"], [message["payload"] for message in messages]
+            )
+            if len(errors) != len(messages):
+                raise ValueError(f"deliver_batch returned {len(errors)} results for {len(messages)} messages")
+        except Exception as e:
+            errors = [str(e)] * len(messages)
+        self.batches += 1
+        await asyncio.to_thread(self._record_results, messages, errors)
+
+    def _record_results(self, messages: List[Dict[str, Any]], errors: List[Optional[str]]) -> None:
+        for message, error in zip(messages, errors):
+            if error is None:
+                self.outbox.mark_delivered(message["id"])
+                self.delivered += 1
+                continue
+            status = self.outbox.mark_failed(message["id"], message["attempts"] + 1, error)
+            if status == "dead":
+                self.dead_lettered += 1
+                print(f"☠️ Outbox message {message['id']} dead-lettered after {message['attempts'] + 1} attempts: {error}")
+            else:
+                self.retried += 1
+
+    def _batches(self, messages: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Group claimed messages by topic into batches of at most ``batch_size``."""
+        by_topic: Dict[str, List[Dict[str, Any]]] = {}
+        for message in messages:
+            by_topic.setdefault(message["topic"], []).append(message)
+        return [
+            topic_messages[start:start + self.batch_size]
+            for topic_messages in by_topic.values()
+            for start in range(0, len(topic_messages), self.batch_size)
+        ]
+
+    async def _run(self) -> None:
+        in_flight = set()
+        while True:
+            try:
+                free = self.concurrency - len(in_flight)
+                messages = await asyncio.to_thread(self.outbox.claim, free * self.batch_size) if free else []
+                for batch in self._batches(messages):
+                    if self.deliver_batch is None:
+                        task = asyncio.ensure_future(self._deliver_one(batch[0]))
+                    else:
+                        task = asyncio.ensure_future(self._deliver_many(batch))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+
+                # Sleep until a slot frees up, a new message arrives, a retry is due or the poll interval passes
+                self._wakeup.clear()
+                waiters = [asyncio.ensure_future(self._wakeup.wait())]
+                if len(in_flight) >= self.concurrency:
+                    waiters.extend(in_flight)
+                    timeout = None
+                else:
+                    next_due = await asyncio.to_thread(self.outbox.next_due_in)
+                    timeout = self.poll_seconds if next_due is None else min(self.poll_seconds, next_due)
+                await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                waiters[0].cancel()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Outbox dispatcher error: {str(e)}")
+                await asyncio.sleep(self.poll_seconds)
+
+    async def drain(self, timeout: Optional[float] = None) -> None:
+        """Wait until nothing is pending or in flight (used by the benchmark)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            counts = await asyncio.to_thread(self.outbox.counts)
+            if not counts["pending"] and not counts["inflight"]:
+                return
+            if deadline is not None and time.monotonic() > deadline:
+                return
+            await asyncio.sleep(0.01)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue": self.outbox.counts(),
+            "delivered": self.delivered,
+            "retried": self.retried,
+            "dead_lettered": self.dead_lettered,
+            "batches": self.batches,
+            "concurrency": self.concurrency,
+            "batch_size": self.batch_size,
+        }
@@ -1,54 +1,208 @@
 import fitz
 import numpy as np
-from paddleocr import PaddleOCR
 from PIL import Image
 import io
 from io import BytesIO
+import hashlib
+import multiprocessing
 import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from lazy_resource import LazyResource
+from metrics import INGESTION_STAGE_SECONDS
+from tracing import add_span, span
+
+# Number of OCR worker processes; 1 keeps OCR serial in the calling process
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "1"))
+
+# Images whose width or height is below this many pixels are never OCR'd
+OCR_MIN_IMAGE_SIDE = int(os.getenv("OCR_MIN_IMAGE_SIDE", "64"))
+
+# Skip OCR on pages whose text layer already has this many characters (0 disables)
+OCR_DENSE_TEXT_CHARS = int(os.getenv("OCR_DENSE_TEXT_CHARS", "0"))
+
+def _create_ocr():
+    from paddleocr import PaddleOCR
+    return PaddleOCR(use_angle_cls=True, lang="en")  # Initialize OCR
+
+# OCR weights are only loaded in processes that actually OCR something
+_ocr = LazyResource("paddle_ocr", _create_ocr)
+
+def get_ocr():
+    """Return this process's PaddleOCR instance, creating it on first use."""
+    return _ocr.get()
+
+def __getattr__(name):
+    # Keep ``pdf_extractor.ocr`` working, lazily
+    if name == "ocr":
+        return get_ocr()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def warm_up():
+    """Load PaddleOCR ahead of the first ingestion."""
+    get_ocr()
+
+# Process pools keyed by worker count; each worker process lazily creates its
+# own PaddleOCR instance on its first image
+_ocr_pools = {}
+_ocr_pools_lock = threading.Lock()
+
+def _get_ocr_pool(workers):
+    """Return a reusable OCR process pool with ``workers`` processes."""
+    with _ocr_pools_lock:
+        pool = _ocr_pools.get(workers)
+        if pool is None:
+            # Spawn rather than fork so workers do not inherit model/thread state
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            _ocr_pools[workers] = pool
+        return pool
+
+def _ocr_image(img_data):
+    """OCR raw image bytes and return the detected text, or None if nothing was found."""
+    # Convert image to PIL format
+    image = Image.open(io.BytesIO(img_data))
+    result = get_ocr().ocr(np.array(image), cls=True)
+
+    # ✅ Fix: Skip None results
+    if result is None or not isinstance(result, list) or len(result) == 0:
+        return None
+
+    return " ".join([word[1][0] for res in result if res is not None for word in res if word is not None])
+
+class OcrPlanner:
+    """Decide which embedded images are worth OCR'ing across a whole document.
+
+    Skips images that are too small, images already seen (by xref or content
+    hash, e.g. a logo repeated on every page) and, optionally, pages whose text
+    layer is already dense. ``stats`` counts what was OCR'd and skipped.
+    """
+
+    def __init__(self, min_image_side=None, dense_text_chars=None):
+        self.min_image_side = OCR_MIN_IMAGE_SIDE if min_image_side is None else min_image_side
+        self.dense_text_chars = OCR_DENSE_TEXT_CHARS if dense_text_chars is None else dense_text_chars
+        self.seen_xrefs = set()
+        self.seen_hashes = set()
+        self.stats = {
+            "images_total": 0,
+            "ocr_calls": 0,
+            "skipped_small": 0,
+            "skipped_duplicate": 0,
+            "skipped_text_layer": 0,
+        }
+
+    def plan_page(self, pdf_doc, page_num, page_text=None):
+        """Return the raw bytes of the images on a page that still need OCR."""
+        page = pdf_doc[page_num]
+        images = page.get_images(full=True)
+        print(f"📸 Page {page_num + 1}: {len(images)} images found")
+
+        if not images:
+            print(f"⚠️ No images found on page {page_num + 1}")
+            return []
+
+        self.stats["images_total"] += len(images)
+        if page_text is None and self.dense_text_chars:
+            page_text = page.get_text("text")
+        if self.dense_text_chars and len(page_text.strip()) >= self.dense_text_chars:
+            self.stats["skipped_text_layer"] += len(images)
+            return []
+
+        to_ocr = []
+        for img in images:
+            xref, width, height = img[0], img[2], img[3]
+            if width < self.min_image_side or height < self.min_image_side:
+                self.stats["skipped_small"] += 1
+                continue
+            if xref in self.seen_xrefs:
+                self.stats["skipped_duplicate"] += 1
+                continue
+            self.seen_xrefs.add(xref)
+
+            img_data = pdf_doc.extract_image(xref)["image"]
+            digest = hashlib.blake2b(img_data, digest_size=16).digest()
+            if digest in self.seen_hashes:
+                self.stats["skipped_duplicate"] += 1
+                continue
+            self.seen_hashes.add(digest)
+
+            self.stats["ocr_calls"] += 1
+            to_ocr.append(img_data)
+
+        return to_ocr
 
-ocr = PaddleOCR(use_angle_cls=True, lang="en")  # Initialize OCR
-  
 def extract_text_from_pdf(pdf_bytes):
     """Extract text from a PDF file."""
     doc = fitz.open("pdf", pdf_bytes)
     text = "\n".join([page.get_text("text") for page in doc])
     return text
 
-def extract_images_from_pdf(pdf_bytes):
-    """Extract text from images in a PDF using PaddleOCR."""
-    image_texts = []
-    
-    with fitz.open(stream=pdf_bytes, filetype="pdf") as pdf_doc:
-        for page_num in range(len(pdf_doc)):
-            images = pdf_doc[page_num].get_images(full=True)
-            print(f"📸 Page {page_num + 1}: {len(images)} images found")
+def iter_pdf_pages(pdf_bytes, progress_callback=None, workers=None, stats=None):
+    """Open a PDF once and yield one record per page as soon as it is ready.
 
-            if not images:
-                print(f"⚠️ No images found on page {page_num + 1}")
-                continue  # Skip if no images exist
+    Each record is ``{"page_number", "text", "ocr_texts"}``. With ``workers`` > 1
+    (default ``OCR_WORKERS``) images are OCR'd in parallel across a process pool
+    while only a small window of pages is kept in flight; records are always
+    yielded in page order. ``progress_callback(pages_done, pages_total)`` is
+    called after each page. If ``stats`` is a dict it is updated with the
+    OcrPlanner counters once the document is exhausted.
+    """
+    workers = OCR_WORKERS if workers is None else workers
+    planner = OcrPlanner()
+    pool = _get_ocr_pool(workers) if workers > 1 else None
+    max_in_flight = workers * 2 if pool else 0
+    in_flight = deque()
 
-            for img_index, img in enumerate(images):
-                xref = img[0]
-                base_image = pdf_doc.extract_image(xref)
-                img_data = base_image["image"]
+    def _finish_page(page_num, page_text, items):
+        ocr_texts = []
+        ocr_started = time.perf_counter()
+        for img_index, item in enumerate(items):
+            extracted_text = item.result() if pool else _ocr_image(item)
+            if extracted_text is None:
+                print(f"⚠️ No text detected on page {page_num + 1}, image {img_index + 1}")
+                continue  # Skip processing if no text is found
+            ocr_texts.append(extracted_text)
+        if items:
+            # With a pool this is the wait for the page's images, not their CPU time
+            INGESTION_STAGE_SECONDS.labels("ocr").observe(time.perf_counter() - ocr_started)
+            add_span("ocr", ocr_started, page=page_num + 1, images=len(items))
 
-                # Convert image to PIL format
-                image = Image.open(io.BytesIO(img_data))
+        if progress_callback:
+            progress_callback(page_num + 1, page_count)
+        return {"page_number": page_num + 1, "text": page_text, "ocr_texts": ocr_texts}
 
-                # ✅ Debug: Print OCR raw output before processing
-                result = ocr.ocr(np.array(image), cls=True)
-                print(f"🔍 OCR Raw Output (Page {page_num + 1}, Image {img_index + 1}):", result)
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as pdf_doc:
+        page_count = len(pdf_doc)
+        for page_num in range(page_count):
+            with span("extract", page=page_num + 1), INGESTION_STAGE_SECONDS.labels("extract").time():
+                page_text = pdf_doc[page_num].get_text("text")
+                images = planner.plan_page(pdf_doc, page_num, page_text=page_text)
+            items = [pool.submit(_ocr_image, img_data) for img_data in images] if pool else images
+            in_flight.append((page_num, page_text, items))
 
-                # ✅ Fix: Skip None results
-                if result is None or not isinstance(result, list) or len(result) == 0:
-                    print(f"⚠️ No text detected on page {page_num + 1}, image {img_index + 1}")
-                    continue  # Skip processing if no text is found
+            while len(in_flight) > max_in_flight:
+                yield _finish_page(*in_flight.popleft())
 
-                extracted_text = " ".join([word[1][0] for res in result if res is not None for word in res if word is not None])
-                image_texts.append(extracted_text)
+        while in_flight:
+            yield _finish_page(*in_flight.popleft())
 
-    return image_texts
+    print(f"🧮 OCR plan: {planner.stats}")
+    if stats is not None:
+        stats.update(planner.stats)
 
+def extract_images_from_pdf(pdf_bytes, progress_callback=None, workers=None, stats=None):
+    """Extract text from images in a PDF using PaddleOCR.
+
+    Thin wrapper over ``iter_pdf_pages`` that returns only the OCR texts.
+    """
+    image_texts = []
+    for page in iter_pdf_pages(pdf_bytes, progress_callback=progress_callback, workers=workers, stats=stats):
+        image_texts.extend(page["ocr_texts"])
+    return image_texts
 
 if __name__ == "__main__":
     with open("/Users/durotoyejoshua/Desktop/DS-Lab/RAG_System/uploads/insight-why-were-not-as-self-aware-as-we-think-and-how-seeing-ourselves-clearly-helps-us-succeed-at-work-and-in-life-pdfdrive-.pdf", "rb") as f:
@@ -1,25 +1,62 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterator, AsyncIterator
 import os
+import time
 from dotenv import load_dotenv
-from openai import OpenAI
+from lazy_resource import LazyResource
+from metrics import LLM_CALL_SECONDS, LLM_ERRORS, LLM_TIME_TO_FIRST_TOKEN_SECONDS
+from tracing import add_span, span
 
 # Load environment variables once the module is imported
 load_dotenv()
 
-# Instantiate a reusable OpenAI client
-_openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Connection pool for the async client; one worker can hold this many LLM calls in flight
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "500"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "100"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "60"))
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "60"))
 
-def generate_chat_response(
+# Fallback replies start with this so callers can tell them from real answers
+LLM_ERROR_PREFIX = "I apologize, but I encountered an error"
+
+class LLMStreamError(Exception):
+    """A streamed LLM call failed; any tokens already yielded are an incomplete answer."""
+
+def _create_client():
+    from openai import OpenAI
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+def _create_async_client():
+    import httpx
+    from openai import AsyncOpenAI
+
+    # Async client sharing one keep-alive pool across all in-flight requests
+    return AsyncOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        http_client=httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+                keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(OPENAI_TIMEOUT_SECONDS, connect=5.0),
+        ),
+    )
+
+# Reusable OpenAI clients, created on first use
+_openai_client = LazyResource("openai_client", _create_client)
+_async_openai_client = LazyResource("async_openai_client", _create_async_client)
+
+def warm_up():
+    """Create the OpenAI clients ahead of the first chat."""
+    _openai_client.get()
+    _async_openai_client.get()
+
+def _build_messages(
     query: str,
     context: List[str],
     chat_history: Optional[List[Dict[str, str]]] = None,
-    *,
-    temperature: float = 0.7,
-    max_tokens: int = 500,
-    top_p: float = 0.95,
-    model: str = "gpt-4o-mini",
-) -> str:
-    """Generate a chat response using the OpenAI API."""
+) -> List[Dict[str, str]]:
+    """Assemble the system prompt, document context, history and query."""
 
     # Format context (optional - chatbot works fine without uploaded documents)
     if context and len(context) > 0 and context[0] != "No relevant information found in the document.":
@@ -76,10 +113,24 @@ CONTACT: For details not in knowledge base, share +2348116402869 or WhatsApp lin
 
     # Add the current query
     messages.append({"role": "user", "content": query})
+    return messages
+
+def generate_chat_response(
+    query: str,
+    context: List[str],
+    chat_history: Optional[List[Dict[str, str]]] = None,
+    *,
+    temperature: float = 0.7,
+    max_tokens: int = 500,
+    top_p: float = 0.95,
+    model: str = "gpt-4o-mini",
+) -> str:
+    """Generate a chat response using the OpenAI API."""
+    messages = _build_messages(query, context, chat_history)
 
     try:
         # Generate response using the updated Chat Completions API
-        response = _openai_client.chat.completions.create(
+        response = _openai_client.get().chat.completions.create(
             model = model,
             messages=messages,
             temperature=temperature,
@@ -90,7 +141,118 @@ CONTACT: For details not in knowledge base, share +2348116402869 or WhatsApp lin
         return response.choices[0].message.content.strip()
         
     except Exception as e:
-        return f"I apologize, but I encountered an error: {str(e)}"
+        return f"{LLM_ERROR_PREFIX}: {str(e)}"
+
+def stream_chat_response(
+    query: str,
+    context: List[str],
+    chat_history: Optional[List[Dict[str, str]]] = None,
+    *,
+    temperature: float = 0.7,
+    max_tokens: int = 500,
+    top_p: float = 0.95,
+    model: str = "gpt-4o-mini",
+) -> Iterator[str]:
+    """Yield response tokens from the OpenAI API as they are generated."""
+    messages = _build_messages(query, context, chat_history)
+
+    try:
+        stream = _openai_client.get().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            top_p=top_p,
+            stream=True,
+        )
+
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            token = chunk.choices[0].delta.content
+            if token:
+                yield token
+
+    except Exception as e:
+        yield f"{LLM_ERROR_PREFIX}: {str(e)}"
+
+async def agenerate_chat_response(
+    query: str,
+    context: List[str],
+    chat_history: Optional[List[Dict[str, str]]] = None,
+    *,
+    temperature: float = 0.7,
+    max_tokens: int = 500,
+    top_p: float = 0.95,
+    model: str = "gpt-4o-mini",
+) -> str:
+    """Async variant of ``generate_chat_response`` using the pooled async client."""
+    with span("prompt_build"):
+        messages = _build_messages(query, context, chat_history)
+
+    try:
+        with span("llm", model=model), LLM_CALL_SECONDS.labels("complete").time():
+            response = await _async_openai_client.get().chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                top_p=top_p,
+            )
+
+        return response.choices[0].message.content.strip()
+
+    except Exception as e:
+        LLM_ERRORS.labels("complete").inc()
+        return f"{LLM_ERROR_PREFIX}: {str(e)}"
+
+async def astream_chat_response(
+    query: str,
+    context: List[str],
+    chat_history: Optional[List[Dict[str, str]]] = None,
+    *,
+    temperature: float = 0.7,
+    max_tokens: int = 500,
+    top_p: float = 0.95,
+    model: str = "gpt-4o-mini",
+) -> AsyncIterator[str]:
+    """Async variant of ``stream_chat_response`` using the pooled async client.
+
+    Unlike the sync variant, a failure raises ``LLMStreamError`` (carrying the
+    error reply) instead of yielding it, so callers can tell a partial answer
+    from a complete one.
+    """
+    with span("prompt_build"):
+        messages = _build_messages(query, context, chat_history)
+    started = time.perf_counter()
+    time_to_first_token = None
+
+    try:
+        stream = await _async_openai_client.get().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            top_p=top_p,
+            stream=True,
+        )
+
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            token = chunk.choices[0].delta.content
+            if token:
+                if time_to_first_token is None:
+                    time_to_first_token = time.perf_counter() - started
+                    LLM_TIME_TO_FIRST_TOKEN_SECONDS.observe(time_to_first_token)
+                yield token
+        LLM_CALL_SECONDS.labels("stream").observe(time.perf_counter() - started)
+        add_span("llm", started, model=model, time_to_first_token_ms=round((time_to_first_token or 0) * 1000, 1))
+
+    except Exception as e:
+        LLM_ERRORS.labels("stream").inc()
+        add_span("llm", started, model=model, error=type(e).__name__)
+        raise LLMStreamError(f"{LLM_ERROR_PREFIX}: {str(e)}") from e
 
 if __name__ == "__main__":
     # Test the function
@@ -0,0 +1,107 @@
+"""Optional cross-encoder rerank stage with a latency budget.
+
+The fused retrieval candidates are scored against the query in one batched
+cross-encoder call. Scores are cached per ``(query, chunk id)``; chunk ids are
+content-addressed, so cached scores stay valid across re-ingestion. If the
+call does not finish within ``RERANK_BUDGET_MS`` (the model is still loading,
+or the reranker is busy with other chats) the caller keeps the retrieval
+order; the late scores are still cached for the next time the query is asked.
+
+Enable with ``RERANK_ENABLED=1``.
+"""
+
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Sequence, Tuple
+
+from lazy_resource import LazyResource
+from ttl_cache import TTLCache
+
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "0") == "1"
+RERANK_MODEL_NAME = os.getenv("RERANK_MODEL_NAME", "BAAI/bge-reranker-base")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "150"))
+RERANK_CACHE_ENTRIES = int(os.getenv("RERANK_CACHE_ENTRIES", "20000"))
+RERANK_CACHE_TTL_SECONDS = float(os.getenv("RERANK_CACHE_TTL_SECONDS", "86400"))
+
+
+def _load_reranker():
+    from FlagEmbedding import FlagReranker
+    return FlagReranker(RERANK_MODEL_NAME, use_fp16=False)
+
+
+def _query_key(query: str) -> str:
+    return re.sub(r"\s+", " ", query.strip().lower())
+
+
+class Reranker:
+    """Reorder ``(chunk id, text)`` candidates by cross-encoder relevance to the query."""
+
+    def __init__(self, budget_ms: float = RERANK_BUDGET_MS, cache_entries: int = RERANK_CACHE_ENTRIES):
+        self.budget_seconds = budget_ms / 1000
+        self.scores = TTLCache(max_entries=cache_entries, ttl_seconds=RERANK_CACHE_TTL_SECONDS)
+        self.reranked = 0
+        self.fallbacks = 0
+        self._model = LazyResource("reranker", _load_reranker)
+        # One scoring call at a time; chats queued behind it fall back on their own budget
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+
+    def warm_up(self) -> None:
+        self._model.get().compute_score([["warm up", "warm up"]])
+
+    def _score(self, query: str, query_key: str, pairs: List[Tuple[str, str]]) -> Dict[str, float]:
+        """Score ``(chunk id, text)`` pairs in one batch and cache the results."""
+        scores = self._model.get().compute_score([[query, text] for _, text in pairs])
+        if not isinstance(scores, list):
+            scores = [scores]  # compute_score returns a bare float for a single pair
+        scored = {}
+        for (chunk_id, _), score in zip(pairs, scores):
+            scored[chunk_id] = float(score)
+            self.scores.set((query_key, chunk_id), float(score))
+        return scored
+
+    def rerank(self, query: str, candidates: Sequence[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """Return the candidates best first, or unchanged if the budget is exceeded."""
+        if len(candidates) < 2:
+            return list(candidates)
+
+        start = time.perf_counter()
+        query_key = _query_key(query)
+        scored = {}
+        missing = []
+        for chunk_id, text in candidates:
+            score = self.scores.get((query_key, chunk_id))
+            if score is None:
+                missing.append((chunk_id, text))
+            else:
+                scored[chunk_id] = score
+
+        if missing:
+            future = self._executor.submit(self._score, query, query_key, missing)
+            try:
+                scored.update(future.result(timeout=self.budget_seconds))
+            except FutureTimeoutError:
+                future.cancel()  # Drop it if still queued; a running call finishes and fills the cache
+                self.fallbacks += 1
+                print(f"⚠️ Rerank exceeded {self.budget_seconds * 1000:.0f}ms budget; keeping retrieval order")
+                return list(candidates)
+            except Exception as e:
+                self.fallbacks += 1
+                print(f"⚠️ Rerank failed ({e}); keeping retrieval order")
+                return list(candidates)
+
+        self.reranked += 1
+        ranked = sorted(candidates, key=lambda candidate: scored[candidate[0]], reverse=True)
+        print(f"🔀 Reranked {len(candidates)} candidates in {(time.perf_counter() - start) * 1000:.0f}ms "
+              f"({len(candidates) - len(missing)} cached)")
+        return ranked
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model_loaded": self._model.loaded,
+            "reranked": self.reranked,
+            "fallbacks": self.fallbacks,
+            "score_cache": self.scores.stats(),
+        }
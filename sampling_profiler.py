@@ -0,0 +1,69 @@
+"""Sampling profiler for a live worker, with output ready for flamegraphs.
+
+A background thread snapshots every thread's Python stack with
+``sys._current_frames()`` every ``interval`` seconds and counts identical
+stacks. ``collapsed_stacks`` renders the counts in the collapsed format
+(``thread;outer (file:line);inner (file:line) count``) read by flamegraph.pl,
+speedscope and similar tools. Frames are named by function and the line it
+starts on, so samples from anywhere in a function add up.
+
+Sampling only reads frames (no tracing hooks), so the profiled worker keeps
+serving at near full speed. Coroutines suspended in ``await`` are not on any
+thread's stack and do not show up; work moved to threads does.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict
+
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "60"))
+
+# One profile at a time per worker
+_profile_lock = threading.Lock()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds: float, interval: float = 0.005) -> Dict[str, int]:
+    """Sample all threads except the caller for ``seconds``; returns ``{collapsed stack: samples}``."""
+    own_thread = threading.get_ident()
+    names = {}
+    counts: Counter = Counter()
+    deadline = time.monotonic() + min(seconds, PROFILER_MAX_SECONDS)
+    while time.monotonic() < deadline:
+        frames = sys._current_frames()
+        if len(names) != threading.active_count():
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in frames.items():
+            if thread_id == own_thread:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, f"thread-{thread_id}"))
+            counts[";".join(reversed(stack))] += 1
+        del frames
+        time.sleep(interval)
+    return dict(counts)
+
+
+def collapsed_stacks(seconds: float, interval: float = 0.005) -> str:
+    """Profile for ``seconds`` and return collapsed stacks, most sampled first.
+
+    Raises RuntimeError if another profile is already running.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("A profile is already running in this worker")
+    try:
+        counts = sample_stacks(seconds, interval)
+    finally:
+        _profile_lock.release()
+    lines = [f"{stack} {count}" for stack, count in sorted(counts.items(), key=lambda item: -item[1])]
+    return "\n".join(lines) + "\n"
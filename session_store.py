@@ -0,0 +1,428 @@
+"""Pluggable storage for chat sessions, the retrieval context cache, ingestion
+job records and the knowledge-base version.
+
+``InProcessStore`` keeps everything in this worker's memory. ``SQLiteStore``
+keeps it in one SQLite file in WAL mode, so every gunicorn worker on the host
+sees the same sessions, cache and upload progress without an external
+service (so a job can be polled from any worker). Both expose a per-tenant
+knowledge-base version counter that ingestion bumps; workers compare it with
+the version they last saw to drop their own in-process caches for that
+tenant. Context cache keys start with ``<tenant>:`` so one tenant's entries
+can be dropped without touching anyone else's.
+
+Select the backend with ``SESSION_BACKEND`` (``memory`` or ``sqlite``).
+Backends with ``blocking = True`` do file I/O and may wait on other workers'
+locks, so the app calls them off the event loop. Backends with ``shared =
+True`` also hold the semantic answer cache's entries (see ``answer_cache``),
+so an answer generated by one worker is served by all of them.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from ttl_cache import TTLCache, approx_size
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "session_store.db")
+# How long a statement waits for another worker's write lock before failing
+SESSION_DB_BUSY_TIMEOUT_SECONDS = float(os.getenv("SESSION_DB_BUSY_TIMEOUT_SECONDS", "5"))
+# Finished ingestion job records are kept this long for polling clients
+JOB_RECORD_TTL_SECONDS = float(os.getenv("JOB_RECORD_TTL_SECONDS", "86400"))
+MAX_TRACKED_JOBS = int(os.getenv("MAX_TRACKED_JOBS", "100"))
+
+
+class InProcessStore:
+    """Per-process sessions and context cache.
+
+    Sessions are kept in last-access order (every touch moves a session to the
+    end), so expiry and the session cap only ever pop from the front.
+    """
+
+    blocking = False
+    shared = False
+
+    def __init__(
+        self,
+        cache_max_entries: int,
+        cache_ttl_seconds: float,
+        cache_max_bytes: Optional[int] = None,
+        max_sessions: Optional[int] = None,
+    ):
+        self.max_sessions = max_sessions
+        self.sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.context_cache = TTLCache(
+            max_entries=cache_max_entries,
+            ttl_seconds=cache_ttl_seconds,
+            max_bytes=cache_max_bytes,
+        )
+        self.jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._kb_versions: Dict[str, int] = {}
+
+    # Sessions
+
+    def _enforce_session_cap(self) -> None:
+        if self.max_sessions is not None:
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+
+    def touch_session(self, session_id: str, now: float) -> None:
+        state = self.sessions.get(session_id)
+        if state is None:
+            self.sessions[session_id] = {"history": [], "last_access": now}
+            self._enforce_session_cap()
+        else:
+            state["last_access"] = now
+            self.sessions.move_to_end(session_id)
+
+    def save_session_history(self, session_id: str, history: List[Dict], now: float) -> None:
+        self.sessions[session_id] = {"history": history, "last_access": now}
+        self.sessions.move_to_end(session_id)
+        self._enforce_session_cap()
+
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        return self.sessions.get(session_id)
+
+    def delete_session(self, session_id: str) -> None:
+        self.sessions.pop(session_id, None)
+
+    def expire_sessions(self, max_age_seconds: float) -> int:
+        """Drop sessions idle for longer than ``max_age_seconds``; cost is the number dropped."""
+        cutoff = time.time() - max_age_seconds
+        expired = 0
+        while self.sessions:
+            session_id, state = next(iter(self.sessions.items()))
+            if state["last_access"] >= cutoff:
+                break
+            del self.sessions[session_id]
+            expired += 1
+        return expired
+
+    def session_count(self) -> int:
+        return len(self.sessions)
+
+    # Context cache
+
+    def get_context(self, key: str) -> Optional[List[str]]:
+        return self.context_cache.get(key)
+
+    def set_context(self, key: str, context: List[str]) -> None:
+        self.context_cache.set(key, context)
+
+    def context_stats(self) -> Dict[str, Any]:
+        return self.context_cache.stats()
+
+    # Ingestion jobs
+
+    def save_job(self, job: Dict[str, Any]) -> None:
+        self.jobs[job["job_id"]] = job
+        # Forget the oldest finished jobs once we track too many
+        while len(self.jobs) > MAX_TRACKED_JOBS:
+            oldest_id, oldest = next(iter(self.jobs.items()))
+            if oldest["status"] in ("queued", "running"):
+                break
+            self.jobs.pop(oldest_id)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.jobs.get(job_id)
+
+    # Knowledge base
+
+    def kb_version(self, tenant: str) -> int:
+        return self._kb_versions.get(tenant, 0)
+
+    def invalidate_knowledge_base(self, tenant: str) -> int:
+        """Drop the tenant's cached context and bump its knowledge-base version."""
+        self.context_cache.remove_prefix(f"{tenant}:")
+        self._kb_versions[tenant] = self._kb_versions.get(tenant, 0) + 1
+        return self._kb_versions[tenant]
+
+
+class SQLiteStore:
+    """Sessions and context cache shared by every worker through one SQLite file."""
+
+    blocking = True
+    shared = True
+
+    def __init__(
+        self,
+        cache_max_entries: int,
+        cache_ttl_seconds: float,
+        cache_max_bytes: Optional[int] = None,
+        max_sessions: Optional[int] = None,
+        path: str = SESSION_DB_PATH,
+    ):
+        self.max_sessions = max_sessions
+        self.cache_max_entries = cache_max_entries
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.cache_max_bytes = cache_max_bytes
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = None
+        # SQLite connections must not cross fork() (e.g. gunicorn --preload),
+        # so a forked child drops the parent's and opens its own on first use
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                history TEXT NOT NULL DEFAULT '[]',
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions (last_access);
+            CREATE TABLE IF NOT EXISTS context_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS context_cache_last_used ON context_cache (last_used);
+            CREATE INDEX IF NOT EXISTS context_cache_expires_at ON context_cache (expires_at);
+            CREATE TABLE IF NOT EXISTS ingestion_jobs (
+                job_id TEXT PRIMARY KEY,
+                record TEXT NOT NULL,
+                finished INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ingestion_jobs_updated_at ON ingestion_jobs (updated_at);
+            CREATE TABLE IF NOT EXISTS answer_cache (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                scope TEXT NOT NULL,
+                query TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                sources TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            """
+        )
+
+    def _reset_after_fork(self) -> None:
+        self._lock = threading.Lock()
+        self._connection = None
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(
+                self.path, check_same_thread=False, timeout=SESSION_DB_BUSY_TIMEOUT_SECONDS, isolation_level=None
+            )
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+        return self._connection
+
+    def _execute(self, sql: str, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    # Sessions
+
+    def touch_session(self, session_id: str, now: float) -> None:
+        self._execute(
+            "INSERT INTO sessions (session_id, last_access) VALUES (?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET last_access = excluded.last_access",
+            (session_id, now),
+        )
+
+    def save_session_history(self, session_id: str, history: List[Dict], now: float) -> None:
+        self._execute(
+            "INSERT INTO sessions (session_id, history, last_access) VALUES (?, ?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET history = excluded.history, last_access = excluded.last_access",
+            (session_id, json.dumps(history), now),
+        )
+
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._execute("SELECT history, last_access FROM sessions WHERE session_id = ?", (session_id,))
+        if not rows:
+            return None
+        history, last_access = rows[0]
+        return {"history": json.loads(history), "last_access": last_access}
+
+    def delete_session(self, session_id: str) -> None:
+        self._execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def expire_sessions(self, max_age_seconds: float) -> int:
+        """Drop idle sessions and, beyond ``max_sessions``, the least recently used ones."""
+        with self._lock:
+            expired = self._conn.execute(
+                "DELETE FROM sessions WHERE last_access < ?", (time.time() - max_age_seconds,)
+            ).rowcount
+            if self.max_sessions is not None:
+                expired += self._conn.execute(
+                    "DELETE FROM sessions WHERE session_id IN ("
+                    "SELECT session_id FROM sessions ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                    (self.max_sessions,),
+                ).rowcount
+            return expired
+
+    def session_count(self) -> int:
+        return self._execute("SELECT COUNT(*) FROM sessions")[0][0]
+
+    # Context cache
+
+    def get_context(self, key: str) -> Optional[List[str]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM context_cache WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE context_cache SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set_context(self, key: str, context: List[str]) -> None:
+        now = time.time()
+        value = json.dumps(context)
+        size = approx_size(context)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM context_cache WHERE expires_at <= ?", (now,))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO context_cache (key, value, size, expires_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, value, size, now + self.cache_ttl_seconds, now),
+                )
+                # Evict least recently used entries beyond the entry and byte budgets
+                count, total = self._conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM context_cache"
+                ).fetchone()
+                while count > self.cache_max_entries or (
+                    self.cache_max_bytes is not None and total > self.cache_max_bytes and count > 1
+                ):
+                    oldest_key, oldest_size = self._conn.execute(
+                        "SELECT key, size FROM context_cache ORDER BY last_used LIMIT 1"
+                    ).fetchone()
+                    self._conn.execute("DELETE FROM context_cache WHERE key = ?", (oldest_key,))
+                    count -= 1
+                    total -= oldest_size
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    # Ingestion jobs
+
+    def save_job(self, job: Dict[str, Any]) -> None:
+        now = time.time()
+        finished = job["status"] not in ("queued", "running")
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ingestion_jobs (job_id, record, finished, updated_at) VALUES (?, ?, ?, ?)",
+                (job["job_id"], json.dumps(job, default=str), int(finished), now),
+            )
+            if finished:
+                self._conn.execute(
+                    "DELETE FROM ingestion_jobs WHERE finished = 1 AND updated_at < ?",
+                    (now - JOB_RECORD_TTL_SECONDS,),
+                )
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._execute("SELECT record FROM ingestion_jobs WHERE job_id = ?", (job_id,))
+        return json.loads(rows[0][0]) if rows else None
+
+    # Semantic answer cache
+
+    def save_answer(self, entry: Dict[str, Any], embedding: bytes, max_entries: int, ttl_seconds: float) -> None:
+        """Append one answer, dropping expired ones and the oldest beyond ``max_entries``."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO answer_cache (scope, query, answer, sources, embedding, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (entry["scope"], entry["query"], entry["answer"], json.dumps(entry["sources"]),
+                     embedding, entry["timestamp"]),
+                )
+                self._conn.execute("DELETE FROM answer_cache WHERE created_at < ?", (time.time() - ttl_seconds,))
+                self._conn.execute(
+                    "DELETE FROM answer_cache WHERE id IN ("
+                    "SELECT id FROM answer_cache ORDER BY id DESC LIMIT -1 OFFSET ?)",
+                    (max_entries,),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def answers_since(self, last_id: int, ttl_seconds: float) -> List[Tuple[int, Dict[str, Any], bytes]]:
+        """Unexpired answers stored (by any worker) after ``last_id``, oldest first."""
+        rows = self._execute(
+            "SELECT id, scope, query, answer, sources, embedding, created_at FROM answer_cache "
+            "WHERE id > ? AND created_at >= ? ORDER BY id",
+            (last_id, time.time() - ttl_seconds),
+        )
+        return [
+            (
+                row_id,
+                {"query": query, "answer": answer, "sources": json.loads(sources), "scope": scope,
+                 "timestamp": created_at},
+                embedding,
+            )
+            for row_id, scope, query, answer, sources, embedding, created_at in rows
+        ]
+
+    def context_stats(self) -> Dict[str, Any]:
+        entries, total = self._execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM context_cache")[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": total,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    # Knowledge base
+
+    def kb_version(self, tenant: str) -> int:
+        rows = self._execute("SELECT value FROM meta WHERE key = ?", (f"kb_version:{tenant}",))
+        return rows[0][0] if rows else 0
+
+    def invalidate_knowledge_base(self, tenant: str) -> int:
+        """Drop the tenant's cached context and answers and bump the tenant version every worker watches."""
+        prefix = f"{tenant}:"
+        version_key = f"kb_version:{tenant}"
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # substr rather than LIKE: tenant ids may contain "_", a LIKE wildcard
+                self._conn.execute("DELETE FROM context_cache WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+                self._conn.execute("DELETE FROM answer_cache WHERE substr(scope, 1, ?) = ?", (len(prefix), prefix))
+                self._conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES (?, 0)", (version_key,))
+                self._conn.execute("UPDATE meta SET value = value + 1 WHERE key = ?", (version_key,))
+                version = self._conn.execute("SELECT value FROM meta WHERE key = ?", (version_key,)).fetchone()[0]
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return version
+
+
+def create_session_store(
+    cache_max_entries: int,
+    cache_ttl_seconds: float,
+    cache_max_bytes: Optional[int] = None,
+    max_sessions: Optional[int] = None,
+):
+    """Build the backend selected by ``SESSION_BACKEND``."""
+    if SESSION_BACKEND == "sqlite":
+        print(f"🗄️ Using shared SQLite session store at {SESSION_DB_PATH}")
+        return SQLiteStore(cache_max_entries, cache_ttl_seconds, cache_max_bytes, max_sessions)
+    if SESSION_BACKEND != "memory":
+        print(f"⚠️ Unknown SESSION_BACKEND '{SESSION_BACKEND}', using in-process store")
+    return InProcessStore(cache_max_entries, cache_ttl_seconds, cache_max_bytes, max_sessions)
@@ -0,0 +1,218 @@
+"""CRM batch sends: per-lead results, rate-limit pacing and the send budget."""
+
+import time
+
+import pytest
+
+import webhook_handler
+from webhook_handler import (
+    AdaptivePacer,
+    CRMDeadlineExceeded,
+    HubSpotWebhook,
+    WebhookHandler,
+    ZohoCRMWebhook,
+)
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self._body = body
+        self.headers = headers or {}
+        self.text = "" if body is None else str(body)
+
+    def json(self):
+        if self._body is None:
+            raise ValueError("no JSON body")
+        return self._body
+
+
+class FakeSession:
+    """Stands in for ``requests.Session``; ``respond(url, json)`` builds each reply."""
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.calls = []
+
+    def post(self, url, timeout=None, **kwargs):
+        self.calls.append({"url": url, "timeout": timeout, **kwargs})
+        return self.respond(url, kwargs.get("json"))
+
+
+def _leads(count):
+    return [
+        {"name": f"Ada Lead{n}", "email": f"lead{n}@example.com", "phone": f"080{n}", "message": "Need a freezer"}
+        for n in range(count)
+    ]
+
+
+def _handler(cls, respond, batch_size=100, secret="token"):
+    handler = cls()
+    handler.webhook_url = "https://crm.example.com/leads"
+    handler.webhook_secret = secret
+    handler.batch_size = batch_size
+    handler.pacer = AdaptivePacer(min_interval=0, max_interval=0.05)
+    handler.session = FakeSession(respond)
+    return handler
+
+
+# HubSpot
+
+def test_hubspot_maps_batch_errors_to_leads():
+    def respond(url, payload):
+        # Reject the second contact of the batch, identified by its trace id
+        return FakeResponse(207, {
+            "status": "COMPLETE",
+            "errors": [{"message": "Contact already exists", "context": {"objectWriteTraceId": ["1"]}}],
+        })
+
+    handler = _handler(HubSpotWebhook, respond)
+    results = handler.send_leads(_leads(3))
+
+    assert results == [None, "Contact already exists", None]
+    (call,) = handler.session.calls
+    assert call["url"] == handler.batch_url
+    assert call["headers"]["Authorization"] == "Bearer token"
+    assert [entry["objectWriteTraceId"] for entry in call["json"]["inputs"]] == ["0", "1", "2"]
+    assert call["json"]["inputs"][2]["properties"]["email"] == "lead2@example.com"
+
+
+def test_hubspot_chunks_keep_positions_per_chunk():
+    def respond(url, payload):
+        emails = [entry["properties"]["email"] for entry in payload["inputs"]]
+        errors = [
+            {"message": f"bad {email}", "context": {"objectWriteTraceId": [str(position)]}}
+            for position, email in enumerate(emails) if email == "lead2@example.com"
+        ]
+        return FakeResponse(201, {"errors": errors})
+
+    handler = _handler(HubSpotWebhook, respond, batch_size=2)
+    results = handler.send_leads(_leads(3))
+
+    assert results == [None, None, "bad lead2@example.com"]
+    assert [len(call["json"]["inputs"]) for call in handler.session.calls] == [2, 1]
+
+
+def test_hubspot_rejected_batch_falls_back_to_single_sends():
+    def respond(url, payload):
+        if "inputs" in payload:
+            return FakeResponse(400, {"message": "Property values were not valid"})
+        email = next(field["value"] for field in payload["fields"] if field["name"] == "email")
+        return FakeResponse(400 if email == "lead1@example.com" else 200, {})
+
+    handler = _handler(HubSpotWebhook, respond)
+    results = handler.send_leads(_leads(3))
+
+    assert results == [None, "delivery failed", None]
+    assert [call["url"] for call in handler.session.calls] == [handler.batch_url] + [handler.webhook_url] * 3
+
+
+def test_hubspot_server_error_fails_every_lead():
+    handler = _handler(HubSpotWebhook, lambda url, payload: FakeResponse(503, {}))
+    assert handler.send_leads(_leads(2)) == ["HTTP 503", "HTTP 503"]
+
+
+def test_hubspot_without_token_sends_form_posts():
+    handler = _handler(HubSpotWebhook, lambda url, payload: FakeResponse(200, {}), secret="")
+    assert handler.send_leads(_leads(2)) == [None, None]
+    assert all(call["url"] == handler.webhook_url for call in handler.session.calls)
+
+
+# Zoho
+
+def test_zoho_maps_per_record_results_in_order():
+    def respond(url, payload):
+        return FakeResponse(202, {"data": [
+            {"status": "success", "code": "SUCCESS"} if record["Email"] != "lead1@example.com"
+            else {"status": "error", "code": "INVALID_DATA", "message": "invalid email"}
+            for record in payload["data"]
+        ]})
+
+    handler = _handler(ZohoCRMWebhook, respond, batch_size=2)
+    results = handler.send_leads(_leads(5))
+
+    assert results == [None, "INVALID_DATA: invalid email", None, None, None]
+    assert [len(call["json"]["data"]) for call in handler.session.calls] == [2, 2, 1]
+    assert handler.session.calls[0]["headers"]["Authorization"] == "Zoho-oauthtoken token"
+    assert handler.session.calls[0]["json"]["data"][0]["First_Name"] == "Ada"
+
+
+def test_zoho_whole_batch_error_fails_every_record():
+    handler = _handler(ZohoCRMWebhook, lambda url, payload: FakeResponse(401, {"code": "INVALID_TOKEN"}))
+    results = handler.send_leads(_leads(2))
+    assert len(results) == 2
+    assert all(result.startswith("HTTP 401") for result in results)
+
+
+def test_zoho_rate_limited_batch_is_left_for_retry(monkeypatch):
+    monkeypatch.setattr(webhook_handler, "CRM_RATE_LIMIT_MAX_WAIT_SECONDS", 0.2)
+    handler = _handler(ZohoCRMWebhook, lambda url, payload: FakeResponse(429, headers={"Retry-After": "5"}))
+
+    started = time.monotonic()
+    results = handler.send_leads(_leads(2))
+
+    assert results == ["rate limited", "rate limited"]
+    # Retry-After is past the wait budget, so the call gives up instead of sleeping
+    assert time.monotonic() - started < 1
+    assert handler.pacer.rate_limited_count == 1
+
+
+# Pacing and the send budget
+
+def test_rate_limit_is_waited_out_within_budget():
+    replies = [FakeResponse(429, headers={"Retry-After": "0.05"}), FakeResponse(200, {})]
+    handler = _handler(WebhookHandler, lambda url, payload: replies.pop(0))
+
+    assert handler.send_leads(_leads(1)) == [None]
+    assert len(handler.session.calls) == 2
+    assert handler.pacer.stats()["rate_limited"] == 1
+
+
+def test_pacer_backs_off_and_recovers():
+    pacer = AdaptivePacer(min_interval=0.01, max_interval=1, recovery=0.5)
+
+    pacer.rate_limited()
+    assert pacer.interval == pytest.approx(0.05)
+    # A second 429 inside the same gap is the same event
+    pacer.rate_limited()
+    assert pacer.interval == pytest.approx(0.05)
+    assert pacer.rate_limited_count == 2
+
+    time.sleep(0.06)
+    pacer.rate_limited()
+    assert pacer.interval == pytest.approx(0.1)
+
+    for _ in range(10):
+        pacer.succeeded()
+    assert pacer.interval == pytest.approx(0.01)
+
+
+def test_pacer_honours_retry_after():
+    pacer = AdaptivePacer(min_interval=0, max_interval=1)
+    pacer.rate_limited(retry_after=0.5)
+    assert 0.4 < pacer.delay() <= 0.5
+
+
+def test_spent_budget_fails_remaining_leads():
+    handler = _handler(WebhookHandler, lambda url, payload: FakeResponse(200, {}))
+
+    results = handler.send_leads(_leads(2), deadline=time.monotonic() - 1)
+
+    assert results == ["send budget spent", "send budget spent"]
+    assert handler.session.calls == []
+
+
+def test_post_gives_up_when_no_attempt_fits_the_deadline():
+    handler = _handler(WebhookHandler, lambda url, payload: FakeResponse(200, {}))
+    handler.pacer.rate_limited(retry_after=5)
+
+    with pytest.raises(CRMDeadlineExceeded):
+        handler._post_paced(handler.webhook_url, deadline=time.monotonic() + 1, json={})
+    assert handler.session.calls == []
+
+
+def test_request_timeout_is_capped_by_the_deadline():
+    handler = _handler(ZohoCRMWebhook, lambda url, payload: FakeResponse(202, {"data": [{"status": "success"}]}))
+
+    assert handler.send_leads(_leads(1), deadline=time.monotonic() + 2) == [None]
+    assert handler.session.calls[0]["timeout"] <= 2
@@ -0,0 +1,64 @@
+"""Micro-batching of concurrent query embeddings."""
+
+import asyncio
+
+import numpy as np
+
+from embedding_batcher import MicroBatcher
+
+
+def _encode(calls):
+    def encode(texts):
+        calls.append(list(texts))
+        return np.array([[len(text), index] for index, text in enumerate(texts)], dtype=np.float32)
+    return encode
+
+
+def test_concurrent_calls_share_one_batch():
+    calls = []
+    batcher = MicroBatcher(_encode(calls), max_batch_size=32, max_wait_ms=20)
+
+    async def run():
+        return await asyncio.gather(*(batcher.embed(text) for text in ["a", "bb", "a", "ccc"]))
+
+    vectors = asyncio.run(run())
+
+    # Duplicates are encoded once and every caller gets its own text's vector
+    assert calls == [["a", "bb", "ccc"]]
+    assert [vector[0] for vector in vectors] == [1, 2, 1, 3]
+    assert batcher.stats() == {"requests": 4, "batches": 1, "mean_batch_size": 4.0}
+
+
+def test_batches_are_capped():
+    calls = []
+    batcher = MicroBatcher(_encode(calls), max_batch_size=3, max_wait_ms=20)
+
+    async def run():
+        return await asyncio.gather(*(batcher.embed(f"q{n}") for n in range(7)))
+
+    vectors = asyncio.run(run())
+
+    assert [len(batch) for batch in calls] == [3, 3, 1]
+    assert [vector[0] for vector in vectors] == [2] * 7
+
+
+def test_encode_error_reaches_every_caller_and_batcher_recovers():
+    calls = []
+    encode = _encode(calls)
+
+    def flaky(texts):
+        if not calls:
+            calls.append(None)
+            raise RuntimeError("model not loaded")
+        return encode(texts)
+
+    batcher = MicroBatcher(flaky, max_wait_ms=5)
+
+    async def run():
+        results = await asyncio.gather(batcher.embed("a"), batcher.embed("b"), return_exceptions=True)
+        return results, await batcher.embed("c")
+
+    results, vector = asyncio.run(run())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert vector[0] == 1
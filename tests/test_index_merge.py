@@ -0,0 +1,119 @@
+"""Merge-on-save of the BM25 and vector index files shared by worker processes."""
+
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from bm25_index import BM25Index
+from vector_index import NumpyVectorIndex
+
+
+def _vector(seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).random(8, dtype=np.float32)
+
+
+def _bm25_worker(path, barrier, worker):
+    index = BM25Index(path)
+    ids = [f"w{worker}-{n}" for n in range(20)]
+    index.add(ids, [f"chunk {chunk_id} sf-400 fridge" for chunk_id in ids], [{"doc_id": f"w{worker}"}] * len(ids))
+    index.remove([f"seed-{worker}"])
+    # Both workers hold their unsaved changes before either saves
+    barrier.wait()
+    index.save()
+
+
+def _vector_worker(prefix, barrier, worker):
+    index = NumpyVectorIndex(prefix)
+    ids = [f"w{worker}-{n}" for n in range(20)]
+    index.add(ids, np.stack([_vector(worker * 100 + n) for n in range(20)]))
+    index.remove([f"seed-{worker}"])
+    barrier.wait()
+    index.save()
+
+
+def _run_two_workers(target, path):
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(2)
+    processes = [context.Process(target=target, args=(path, barrier, worker)) for worker in (0, 1)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+    assert [process.exitcode for process in processes] == [0, 0]
+
+
+def test_bm25_saves_from_two_processes_merge(tmp_path):
+    path = str(tmp_path / "bm25.json")
+    seed = BM25Index(path)
+    seed.add(["seed-0", "seed-1", "seed-2"], ["first seed", "second seed", "third seed"])
+    seed.save()
+
+    _run_two_workers(_bm25_worker, path)
+
+    merged = BM25Index(path)
+    expected = {f"w{worker}-{n}" for worker in (0, 1) for n in range(20)} | {"seed-2"}
+    assert set(merged.metadatas()) == expected
+    assert merged.metadatas()["w1-0"] == {"doc_id": "w1"}
+    # The stale in-memory copy picks up the merged file on its next search
+    assert len(seed.search("sf400", top_k=100)) == 40
+    assert "seed-0" not in seed
+
+
+def test_vector_saves_from_two_processes_merge(tmp_path):
+    prefix = str(tmp_path / "vectors")
+    seed = NumpyVectorIndex(prefix)
+    seed.add(["seed-0", "seed-1", "seed-2"], np.stack([_vector(1000 + n) for n in range(3)]))
+    seed.save()
+
+    _run_two_workers(_vector_worker, prefix)
+
+    merged = NumpyVectorIndex(prefix)
+    expected = {f"w{worker}-{n}" for worker in (0, 1) for n in range(20)} | {"seed-2"}
+    assert set(merged._ids) == expected
+    assert merged.search(_vector(107), top_k=1)[0][0] == "w1-7"
+    assert seed.search(_vector(3), top_k=1)[0][0] == "w0-3"
+    # Superseded matrix files are cleaned up
+    assert len(list(tmp_path.glob("vectors-*.npy"))) == 1
+
+
+def test_bm25_unsaved_changes_survive_reload(tmp_path):
+    path = str(tmp_path / "bm25.json")
+    worker_a, worker_b = BM25Index(path), BM25Index(path)
+    worker_a.add(["a"], ["inverter battery"])
+    worker_a.save()
+    worker_b.add(["b"], ["solar freezer"])
+
+    # worker_b reloads worker_a's save but keeps its own unsaved chunk
+    assert [chunk_id for chunk_id, _ in worker_b.search("inverter freezer")] in (["a", "b"], ["b", "a"])
+    worker_b.save()
+    assert set(BM25Index(path).metadatas()) == {"a", "b"}
+
+
+def test_bm25_reset_replaces_instead_of_merging(tmp_path):
+    path = str(tmp_path / "bm25.json")
+    index = BM25Index(path)
+    index.add(["old"], ["stale chunk"])
+    index.save()
+
+    rebuilt = BM25Index(path)
+    rebuilt.reset(["new"], ["fresh chunk"])
+    rebuilt.save()
+
+    assert set(BM25Index(path).metadatas()) == {"new"}
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_vector_reset_replaces_instead_of_merging(tmp_path, dtype):
+    prefix = str(tmp_path / "vectors")
+    index = NumpyVectorIndex(prefix, dtype=dtype)
+    index.add(["old"], np.stack([_vector(1)]))
+    index.save()
+
+    rebuilt = NumpyVectorIndex(prefix, dtype=dtype)
+    rebuilt.reset(["new-0", "new-1"], np.stack([_vector(2), _vector(3)]))
+    rebuilt.save()
+
+    reloaded = NumpyVectorIndex(prefix, dtype=dtype)
+    assert reloaded._ids == ["new-0", "new-1"]
+    assert reloaded.search(_vector(3), top_k=1)[0][0] == "new-1"
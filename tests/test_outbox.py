@@ -0,0 +1,175 @@
+"""Outbox leases, retries, dead letters and batched dispatch."""
+
+import asyncio
+import time
+
+import pytest
+
+from outbox import Outbox, OutboxDispatcher
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    return Outbox(str(tmp_path / "outbox.db"), max_attempts=3, backoff_base_seconds=0, backoff_max_seconds=0)
+
+
+def test_claim_leases_messages(outbox):
+    first = outbox.append("lead", {"email": "a@example.com"})
+    second = outbox.append("lead", {"email": "b@example.com"})
+
+    claimed = outbox.claim(10, lease_seconds=60)
+
+    assert [message["id"] for message in claimed] == [first, second]
+    assert claimed[0]["payload"] == {"email": "a@example.com"}
+    assert claimed[0]["attempts"] == 0
+    # Leased messages are not handed to another claimer while the lease holds
+    assert outbox.claim(10, lease_seconds=60) == []
+    assert outbox.counts() == {"pending": 0, "inflight": 2, "dead": 0}
+
+
+def test_expired_lease_is_redelivered(outbox):
+    message_id = outbox.append("lead", {"email": "a@example.com"})
+    assert [message["id"] for message in outbox.claim(10, lease_seconds=0.05)] == [message_id]
+    assert outbox.claim(10) == []
+
+    # The claiming worker died without reporting back; once the lease expires another worker takes over
+    time.sleep(0.1)
+    reclaimed = outbox.claim(10, lease_seconds=60)
+
+    assert [message["id"] for message in reclaimed] == [message_id]
+    assert reclaimed[0]["attempts"] == 0
+    outbox.mark_delivered(message_id)
+    assert outbox.counts() == {"pending": 0, "inflight": 0, "dead": 0}
+
+
+def test_claims_from_two_connections_do_not_overlap(tmp_path):
+    path = str(tmp_path / "outbox.db")
+    worker_a, worker_b = Outbox(path), Outbox(path)
+    ids = [worker_a.append("lead", {"n": n}) for n in range(10)]
+
+    claimed_a = worker_a.claim(6)
+    claimed_b = worker_b.claim(6)
+
+    claimed = [message["id"] for message in claimed_a + claimed_b]
+    assert sorted(claimed) == ids
+    assert len(set(claimed)) == len(claimed)
+
+
+def test_failed_message_is_retried_then_dead_lettered(outbox):
+    message_id = outbox.append("lead", {"email": "a@example.com"})
+
+    for attempt in range(1, outbox.max_attempts):
+        message = outbox.claim(10)[0]
+        assert message["attempts"] == attempt - 1
+        assert outbox.mark_failed(message_id, attempt, "HTTP 503") == "pending"
+
+    outbox.claim(10)
+    assert outbox.mark_failed(message_id, outbox.max_attempts, "HTTP 503") == "dead"
+
+    assert outbox.claim(10) == []
+    assert outbox.next_due_in() is None
+    dead = outbox.dead_letters()
+    assert [(letter["id"], letter["attempts"], letter["last_error"]) for letter in dead] == [
+        (message_id, outbox.max_attempts, "HTTP 503")
+    ]
+
+
+def test_retry_waits_for_backoff(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.db"), backoff_base_seconds=60, backoff_max_seconds=60)
+    message_id = outbox.append("lead", {})
+    outbox.claim(10)
+    # Full jitter can draw zero, so retry until the backoff lands in the future
+    for _ in range(20):
+        outbox.mark_failed(message_id, 1, "timeout")
+        if outbox.next_due_in() > 0.5:
+            break
+    assert outbox.claim(10) == []
+
+
+def test_replay_requeues_selected_dead_letters(outbox):
+    ids = [outbox.append("lead", {"n": n}) for n in range(3)]
+    outbox.claim(10)
+    for message_id in ids:
+        outbox.mark_failed(message_id, outbox.max_attempts, "bad token")
+
+    assert outbox.replay([ids[0], ids[2]]) == 2
+    assert outbox.replay([]) == 0
+    assert [letter["id"] for letter in outbox.dead_letters()] == [ids[1]]
+
+    replayed = outbox.claim(10)
+    assert [message["id"] for message in replayed] == [ids[0], ids[2]]
+    assert all(message["attempts"] == 0 for message in replayed)
+
+    assert outbox.replay() == 1
+    assert outbox.counts() == {"pending": 1, "inflight": 2, "dead": 0}
+
+
+def _dispatch(outbox, **kwargs):
+    async def run():
+        dispatcher = OutboxDispatcher(outbox, poll_seconds=0.01, **kwargs)
+        task = dispatcher.start()
+        await dispatcher.drain(timeout=5)
+        task.cancel()
+        return dispatcher
+
+    return asyncio.run(run())
+
+
+def test_dispatcher_retries_until_delivered(outbox):
+    outbox.append("lead", {"email": "a@example.com"})
+    calls = []
+
+    def deliver(topic, payload):
+        calls.append(payload)
+        if len(calls) < 2:
+            raise ConnectionError("CRM down")
+        return True
+
+    dispatcher = _dispatch(outbox, deliver=deliver)
+
+    assert len(calls) == 2
+    assert (dispatcher.delivered, dispatcher.retried, dispatcher.dead_lettered) == (1, 1, 0)
+    assert outbox.counts() == {"pending": 0, "inflight": 0, "dead": 0}
+
+
+def test_dispatcher_dead_letters_after_max_attempts(outbox):
+    outbox.append("lead", {"email": "a@example.com"})
+
+    dispatcher = _dispatch(outbox, deliver=lambda topic, payload: False)
+
+    assert (dispatcher.delivered, dispatcher.retried, dispatcher.dead_lettered) == (0, 2, 1)
+    assert outbox.dead_letters()[0]["last_error"] == "delivery returned False"
+
+
+def test_dispatcher_maps_batch_results_to_messages(outbox):
+    for n in range(5):
+        outbox.append("lead", {"n": n})
+    batches = []
+
+    def deliver_batch(topic, payloads):
+        batches.append([payload["n"] for payload in payloads])
+        # Lead 3 is always rejected; the others go through on the first try
+        return ["invalid email" if payload["n"] == 3 else None for payload in payloads]
+
+    dispatcher = _dispatch(
+        outbox, deliver=lambda topic, payload: True, deliver_batch=deliver_batch, batch_size=10, concurrency=1
+    )
+
+    assert batches[0] == [0, 1, 2, 3, 4]
+    assert batches[1:] == [[3], [3]]
+    assert (dispatcher.delivered, dispatcher.dead_lettered) == (4, 1)
+    assert [letter["payload"] for letter in outbox.dead_letters()] == [{"n": 3}]
+
+
+def test_dispatcher_fails_whole_batch_on_wrong_result_count(outbox):
+    outbox.append("lead", {"n": 0})
+    outbox.append("lead", {"n": 1})
+
+    dispatcher = _dispatch(
+        outbox, deliver=lambda topic, payload: True, deliver_batch=lambda topic, payloads: [None],
+        batch_size=10, concurrency=1,
+    )
+
+    assert dispatcher.delivered == 0
+    assert len(outbox.dead_letters()) == 2
+    assert "returned 1 results for 2 messages" in outbox.dead_letters()[0]["last_error"]
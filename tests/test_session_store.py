@@ -0,0 +1,125 @@
+"""The SQLite session store shared by gunicorn workers."""
+
+import time
+
+import numpy as np
+import pytest
+
+from answer_cache import SemanticAnswerCache
+from session_store import InProcessStore, SQLiteStore
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "session_store.db")
+
+
+def _store(path, **kwargs):
+    options = {"cache_max_entries": 10, "cache_ttl_seconds": 60}
+    options.update(kwargs)
+    return SQLiteStore(path=path, **options)
+
+
+def test_sessions_are_shared_between_workers(db_path):
+    worker_a, worker_b = _store(db_path), _store(db_path)
+    history = [{"role": "user", "content": "How much is the SF-400?"}]
+
+    worker_a.save_session_history("s1", history, time.time())
+
+    assert worker_b.get_session("s1")["history"] == history
+    worker_b.delete_session("s1")
+    assert worker_a.get_session("s1") is None
+
+
+def test_expire_sessions_drops_idle_and_least_recent(db_path):
+    store = _store(db_path, max_sessions=2)
+    now = time.time()
+    store.touch_session("idle", now - 3600)
+    for n, session_id in enumerate(["s1", "s2", "s3"]):
+        store.touch_session(session_id, now + n)
+
+    assert store.expire_sessions(max_age_seconds=600) == 2
+    assert store.session_count() == 2
+    assert store.get_session("s1") is None
+    assert store.get_session("s3") is not None
+
+
+def test_context_cache_evicts_least_recently_used(db_path):
+    store = _store(db_path, cache_max_entries=2)
+    store.set_context("t:a", ["chunk a"])
+    time.sleep(0.01)
+    store.set_context("t:b", ["chunk b"])
+    time.sleep(0.01)
+    assert store.get_context("t:a") == ["chunk a"]
+    time.sleep(0.01)
+    store.set_context("t:c", ["chunk c"])
+
+    assert store.get_context("t:b") is None
+    assert store.get_context("t:a") == ["chunk a"]
+    assert store.context_stats()["entries"] == 2
+
+
+def test_context_cache_expires(db_path):
+    store = _store(db_path, cache_ttl_seconds=0.05)
+    store.set_context("t:a", ["chunk a"])
+    time.sleep(0.1)
+    assert store.get_context("t:a") is None
+
+
+@pytest.mark.parametrize("make_store", ["memory", "sqlite"])
+def test_invalidation_is_per_tenant(db_path, make_store):
+    if make_store == "memory":
+        store = InProcessStore(cache_max_entries=10, cache_ttl_seconds=60)
+        other = store
+    else:
+        store, other = _store(db_path), _store(db_path)
+    store.set_context("a:q", ["a"])
+    # "_" is a LIKE wildcard; tenant "a_b" must survive invalidating "a"
+    store.set_context("a_b:q", ["a_b"])
+    store.set_context("ab:q", ["ab"])
+
+    assert store.invalidate_knowledge_base("a") == 1
+
+    assert other.kb_version("a") == 1
+    assert other.kb_version("a_b") == 0
+    assert other.get_context("a:q") is None
+    assert other.get_context("a_b:q") == ["a_b"]
+    assert other.get_context("ab:q") == ["ab"]
+    assert store.invalidate_knowledge_base("a") == 2
+
+
+def test_job_records_are_shared(db_path):
+    worker_a, worker_b = _store(db_path), _store(db_path)
+    worker_a.save_job({"job_id": "j1", "status": "running", "stage": "ocr"})
+    assert worker_b.get_job("j1")["stage"] == "ocr"
+    worker_a.save_job({"job_id": "j1", "status": "completed", "stage": "done"})
+    assert worker_b.get_job("j1")["status"] == "completed"
+    assert worker_b.get_job("missing") is None
+
+
+def test_answer_cache_is_shared_through_the_store(db_path):
+    worker_a = SemanticAnswerCache(threshold=0.9, store=_store(db_path))
+    worker_b = SemanticAnswerCache(threshold=0.9, store=_store(db_path))
+    embedding = np.array([1.0, 0.0, 0.0])
+
+    worker_a.store("price of sf-400?", embedding, "It costs N1,324,000.", ["catalog.pdf"], scope="a:")
+
+    hit = worker_b.lookup(np.array([0.99, 0.05, 0.0]), scope="a:")
+    assert hit["answer"] == "It costs N1,324,000."
+    assert hit["sources"] == ["catalog.pdf"]
+    assert worker_b.lookup(embedding, scope="other:") is None
+    assert worker_b.lookup(np.array([0.0, 1.0, 0.0]), scope="a:") is None
+
+
+def test_invalidation_drops_shared_answers(db_path):
+    store = _store(db_path)
+    cache = SemanticAnswerCache(store=store)
+    cache.store("q", np.array([1.0, 0.0]), "old answer", [], scope="a:")
+    cache.store("q", np.array([1.0, 0.0]), "other tenant", [], scope="a_b:")
+
+    store.invalidate_knowledge_base("a")
+
+    # A worker that has not pulled the rows yet never sees the stale answer
+    fresh = SemanticAnswerCache(store=_store(db_path))
+    assert fresh.lookup(np.array([1.0, 0.0]), scope="a:") is None
+    assert fresh.lookup(np.array([1.0, 0.0]), scope="a_b:")["answer"] == "other tenant"
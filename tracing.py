@@ -0,0 +1,256 @@
+"""Opt-in per-request tracing with nested spans.
+
+With ``TRACING_ENABLED=1`` a request sending ``X-Debug-Trace: 1`` is traced
+and answered with its spans in a ``Server-Timing`` header (spans with the
+same path are summed, so the header stays small) plus an ``X-Trace-Id``. With
+``TRACE_FILE`` set, every traced request, plus a ``TRACE_SAMPLE_RATE`` share
+of all other requests, is also appended to that JSONL file as a full span tree.
+
+Spans live in a ``ContextVar``, so they follow the request into
+``asyncio.to_thread`` calls and into concurrent ``gather`` branches. Outside
+a trace ``span()`` costs one ``ContextVar.get``.
+"""
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "0") == "1"
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "1000"))
+TRACE_REQUEST_HEADER = b"x-debug-trace"
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+_file_lock = threading.Lock()
+
+
+class Span:
+    """One timed operation; ``children`` are the spans started inside it."""
+
+    __slots__ = ("trace", "name", "attrs", "start", "duration", "children")
+
+    def __init__(self, trace: "Trace", name: str, attrs: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.children: List["Span"] = []
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        record = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": None if self.duration is None else round(self.duration * 1000, 3),
+        }
+        if self.attrs:
+            record["attrs"] = self.attrs
+        if self.children:
+            record["children"] = [child.to_dict(origin) for child in list(self.children)]
+        return record
+
+
+class Trace:
+    """Root of a span tree for one request or background job."""
+
+    def __init__(self, name: str, **attrs: Any):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.started_at = time.time()
+        self.span_count = 1
+        self.dropped_spans = 0
+        self._lock = threading.Lock()
+        self.root = Span(self, name, attrs)
+
+    def _attach(self, parent: Span, child: Span) -> bool:
+        with self._lock:
+            if self.span_count >= TRACE_MAX_SPANS:
+                self.dropped_spans += 1
+                return False
+            self.span_count += 1
+            parent.children.append(child)
+            return True
+
+    def finish(self) -> None:
+        if self.root.duration is None:
+            self.root.duration = time.perf_counter() - self.root.start
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "started_at": self.started_at,
+            "dropped_spans": self.dropped_spans,
+            **self.root.to_dict(self.root.start),
+        }
+
+    def server_timing(self, max_entries: int = 40) -> str:
+        """Finished spans summed by path (``retrieval.vector_search``) as a Server-Timing value."""
+        totals: Dict[str, List[float]] = {}
+
+        def _walk(node: Span, path: str) -> None:
+            for child in list(node.children):
+                child_path = f"{path}.{child.name}" if path else child.name
+                if child.duration is not None:
+                    entry = totals.setdefault(child_path, [0.0, 0])
+                    entry[0] += child.duration
+                    entry[1] += 1
+                _walk(child, child_path)
+
+        _walk(self.root, "")
+        entries = [f"total;dur={(time.perf_counter() - self.root.start) * 1000:.1f}"]
+        for path, (duration, count) in list(totals.items())[:max_entries]:
+            token = "".join(c if c.isalnum() or c in "._-" else "_" for c in path)
+            entry = f"{token};dur={duration * 1000:.1f}"
+            entries.append(entry if count == 1 else f'{entry};desc="x{count}"')
+        return ", ".join(entries)
+
+
+class _SpanContext:
+    __slots__ = ("_parent", "_name", "_attrs", "_span", "_token")
+
+    def __init__(self, parent: Span, name: str, attrs: Dict[str, Any]):
+        self._parent = parent
+        self._name = name
+        self._attrs = attrs
+
+    def __enter__(self) -> Span:
+        self._span = Span(self._parent.trace, self._name, self._attrs)
+        if self._parent.trace._attach(self._parent, self._span):
+            self._token = _current_span.set(self._span)
+        else:
+            self._token = None  # Over TRACE_MAX_SPANS: timed but not recorded
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self._span.duration = time.perf_counter() - self._span.start
+        if exc_type is not None:
+            self._span.attrs["error"] = exc_type.__name__
+        if self._token is not None:
+            _current_span.reset(self._token)
+        return False
+
+
+class _NoopSpan:
+    """Returned by ``span()`` outside a trace."""
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        return False
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str, **attrs: Any):
+    """``with span("retrieval") as s: ... s.set(cache="hit")``; a no-op when not tracing."""
+    parent = _current_span.get()
+    if parent is None:
+        return _NOOP_SPAN
+    return _SpanContext(parent, name, attrs)
+
+
+def add_span(name: str, started: float, **attrs: Any) -> None:
+    """Record a finished span that began at ``started`` (``time.perf_counter()``).
+
+    For work spread over an async generator's yields, where a ``with span()``
+    block would leak its context to the consumer.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return
+    finished = Span(parent.trace, name, attrs)
+    finished.start = started
+    finished.duration = time.perf_counter() - started
+    parent.trace._attach(parent, finished)
+
+
+def is_tracing() -> bool:
+    return _current_span.get() is not None
+
+
+def write_trace(finished: Trace) -> None:
+    """Append the span tree to ``TRACE_FILE`` (if set) as one JSON line."""
+    if not TRACE_FILE:
+        return
+    line = json.dumps(finished.to_dict(), default=str)
+    with _file_lock:
+        with open(TRACE_FILE, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+@contextmanager
+def trace(name: str, enabled: bool = True, **attrs: Any) -> Iterator[Optional[Trace]]:
+    """Run the block as the root of a new trace, written to ``TRACE_FILE`` when it ends.
+
+    Yields None (and records nothing) unless tracing is enabled and ``enabled``.
+    """
+    if not (TRACING_ENABLED and enabled):
+        yield None
+        return
+    current = Trace(name, **attrs)
+    token = _current_span.set(current.root)
+    try:
+        yield current
+    finally:
+        _current_span.reset(token)
+        current.finish()
+        try:
+            write_trace(current)
+        except OSError as e:
+            print(f"⚠️ Could not write trace {current.trace_id}: {e}")
+
+
+class TracingMiddleware:
+    """Trace requests that ask for it (``X-Debug-Trace: 1``) or are sampled for ``TRACE_FILE``.
+
+    Plain ASGI, so streamed responses are traced until their last event; the
+    Server-Timing header only covers spans finished before the response started.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not TRACING_ENABLED:
+            return await self.app(scope, receive, send)
+        requested = dict(scope.get("headers") or []).get(TRACE_REQUEST_HEADER) == b"1"
+        sampled = bool(TRACE_FILE) and TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE
+        if not (requested or sampled):
+            return await self.app(scope, receive, send)
+
+        request_trace = Trace(f"{scope['method']} {scope['path']}")
+        token = _current_span.set(request_trace.root)
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start" and requested:
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-trace-id", request_trace.trace_id.encode()),
+                    (b"server-timing", request_trace.server_timing().encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            _current_span.reset(token)
+            request_trace.finish()
+            if TRACE_FILE:
+                try:
+                    await asyncio.to_thread(write_trace, request_trace)
+                except OSError as e:
+                    print(f"⚠️ Could not write trace {request_trace.trace_id}: {e}")
@@ -0,0 +1,142 @@
+"""O(1) LRU cache with TTL expiry, byte budget and hit/miss/eviction stats."""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+_MISSING = object()
+
+
+def approx_size(value: Any) -> int:
+    """Rough in-memory size of strings, bytes and nested lists/tuples/dicts."""
+    if isinstance(value, (str, bytes)):
+        return sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(approx_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+class TTLCache:
+    """Least-recently-used cache whose entries also expire ``ttl_seconds`` after being set.
+
+    Two ordered dicts keep every operation O(1) amortised: ``_lru`` holds
+    values in recency order for eviction, ``_expiry`` holds deadlines in write
+    order. Because the TTL is fixed, write order is expiry order, so expired
+    entries are always at the front of ``_expiry`` and are purged on every
+    access rather than lingering until their key is read again.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 100,
+        ttl_seconds: float = 600,
+        max_bytes: Optional[int] = None,
+        size_fn: Callable[[Any], int] = approx_size,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.size_fn = size_fn
+        self._lru: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._expiry: "OrderedDict[Hashable, float]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._lru)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def _remove(self, key: Hashable) -> None:
+        self._lru.pop(key, None)
+        self._expiry.pop(key, None)
+        self._bytes -= self._sizes.pop(key, 0)
+
+    def _purge_expired(self, now: float) -> None:
+        while self._expiry:
+            key, deadline = next(iter(self._expiry.items()))
+            if deadline > now:
+                break
+            self._remove(key)
+            self.expirations += 1
+
+    def get(self, key: Hashable, default: Any = None, count: bool = True) -> Any:
+        """Return the cached value and mark it most recently used."""
+        with self._lock:
+            self._purge_expired(time.monotonic())
+            value = self._lru.get(key, _MISSING)
+            if value is _MISSING:
+                if count:
+                    self.misses += 1
+                return default
+
+            self._lru.move_to_end(key)
+            if count:
+                self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Insert or replace ``key``, evicting least recently used entries to fit."""
+        size = self.size_fn(value) if self.max_bytes is not None else 0
+        with self._lock:
+            now = time.monotonic()
+            self._purge_expired(now)
+            self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return  # Larger than the whole budget; never cacheable
+
+            while self._lru and (
+                len(self._lru) >= self.max_entries
+                or (self.max_bytes is not None and self._bytes + size > self.max_bytes)
+            ):
+                oldest_key = next(iter(self._lru))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+            self._lru[key] = value
+            self._expiry[key] = now + self.ttl_seconds
+            self._sizes[key] = size
+            self._bytes += size
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            value = self._lru.get(key, default)
+            self._remove(key)
+            return value
+
+    def remove_prefix(self, prefix: str) -> int:
+        """Drop every string key starting with ``prefix`` (a scan; for rare invalidations)."""
+        with self._lock:
+            keys = [key for key in self._lru if isinstance(key, str) and key.startswith(prefix)]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._lru.clear()
+            self._expiry.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._lru),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
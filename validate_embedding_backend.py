@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Compare an embedding backend against the reference torch model on our corpus.
+
+Reports cosine agreement between candidate and reference vectors for every
+stored chunk (or a sample), top-k retrieval overlap for a set of queries, and
+per-query encode latency of both backends.
+
+Usage: python validate_embedding_backend.py [backend] [max_chunks]
+    backend: onnx or torch-int8 (default onnx)
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from embedder import collection, load_embedding_model
+
+SAMPLE_QUERIES = [
+    "How much is the solar freezer?",
+    "What BNPL payment options do you offer?",
+    "How long does the ice battery keep things cold without sunlight?",
+    "Do you deliver outside Lagos?",
+    "What is the PowerFoot Pedestal?",
+]
+
+
+def cosine_rows(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return np.sum(a * b, axis=1)
+
+
+def query_latency_ms(model, queries, repeats=5):
+    model.encode(queries[:1])
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for query in queries:
+            model.encode([query])
+    return (time.perf_counter() - start) / (repeats * len(queries)) * 1000
+
+
+def main():
+    backend = sys.argv[1] if len(sys.argv) > 1 else "onnx"
+    max_chunks = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    documents = collection.get(include=["documents"], limit=max_chunks).get("documents") or []
+    if not documents:
+        print("⚠️ No stored chunks found; upload a document first.")
+        return 1
+
+    print(f"🔍 Validating '{backend}' against 'torch' on {len(documents)} chunks\n")
+    reference = load_embedding_model("torch")
+    candidate = load_embedding_model(backend)
+
+    ref_docs = reference.encode(documents, batch_size=32, show_progress_bar=False)
+    cand_docs = candidate.encode(documents, batch_size=32, show_progress_bar=False)
+    cosines = cosine_rows(ref_docs, cand_docs)
+    print(f"   Chunk cosine  mean {cosines.mean():.5f}  min {cosines.min():.5f}  "
+          f"p1 {np.percentile(cosines, 1):.5f}")
+
+    ref_queries = reference.encode(SAMPLE_QUERIES)
+    cand_queries = candidate.encode(SAMPLE_QUERIES)
+    print(f"   Query cosine  mean {cosine_rows(ref_queries, cand_queries).mean():.5f}")
+
+    # Does a candidate-encoded query find the same chunks in the reference index?
+    k = min(5, len(documents))
+    overlaps = []
+    for ref_q, cand_q in zip(ref_queries, cand_queries):
+        ref_top = set(np.argsort(-(ref_docs @ ref_q))[:k])
+        cand_top = set(np.argsort(-(ref_docs @ cand_q))[:k])
+        overlaps.append(len(ref_top & cand_top) / k)
+    print(f"   Top-{k} overlap vs reference index: {np.mean(overlaps):.2%}")
+
+    print(f"   Query latency torch {query_latency_ms(reference, SAMPLE_QUERIES):.1f} ms | "
+          f"{backend} {query_latency_ms(candidate, SAMPLE_QUERIES):.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
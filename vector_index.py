@@ -0,0 +1,226 @@
+"""Exact in-memory vector search over a memory-mapped embedding matrix.
+
+For a knowledge base of a few thousand chunks, a brute-force dot product over
+one contiguous array beats a round trip through the Chroma client and its
+persistent HNSW index. The matrix is saved as ``.npy`` next to ``chroma_db``
+and memory-mapped, so every worker on the host shares the same page-cache
+copy. Distances follow the Chroma collection's space (``l2``, ``ip`` or
+``cosine``) so both engines rank chunks the same way.
+
+Files: ``<prefix>.json`` names the ids and the current matrix file
+(``<prefix>-<stamp>.npy``). A save writes a new matrix file and then swaps
+the JSON atomically, so readers never see ids and rows out of step. As with
+the BM25 index, unsaved rows are replayed over every reload and saves merge
+under a cross-process lock, so concurrent workers keep each other's rows.
+"""
+
+import glob
+import json
+import os
+import threading
+import time
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from file_lock import file_lock, file_version
+
+# Rows converted per step when scoring a float16 matrix. numpy has no fp16
+# BLAS, so every search pays an upcast: float16 halves memory at the cost of
+# latency, which batched queries amortise.
+_BLOCK_ROWS = 2048
+
+
+class NumpyVectorIndex:
+    """Exact top-k search over ``chunk id -> embedding`` rows."""
+
+    def __init__(self, path_prefix: Optional[str] = None, dtype: str = "float32", space: str = "l2"):
+        self.path_prefix = path_prefix
+        self.dtype = np.dtype(dtype)
+        self.space = space
+        self._lock = threading.RLock()
+        self._ids: List[str] = []
+        self._row_of = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._sq_norms: Optional[np.ndarray] = None
+        self._loaded_version = None
+        # Unsaved changes: chunk id -> vector, or None once removed
+        self._unsaved = {}
+        # Set by reset(): the next save replaces the files instead of merging
+        self._replaced = False
+        if path_prefix and os.path.exists(self._meta_path):
+            with file_lock(self._meta_path, shared=True):
+                self._load()
+
+    @property
+    def _meta_path(self) -> str:
+        return f"{self.path_prefix}.json"
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._row_of
+
+    def _set_matrix(self, ids: List[str], matrix: np.ndarray) -> None:
+        self._ids = ids
+        self._row_of = {chunk_id: row for row, chunk_id in enumerate(ids)}
+        self._matrix = matrix
+        self._sq_norms = None
+        if self.space in ("l2", "cosine") and len(ids):
+            self._sq_norms = np.einsum("ij,ij->i", matrix, matrix, dtype=np.float32)
+
+    def reset(self, ids: Sequence[str], vectors) -> None:
+        """Replace every row, e.g. when rebuilding from the Chroma collection."""
+        with self._lock:
+            self._set_matrix(list(ids), np.ascontiguousarray(np.asarray(vectors, dtype=self.dtype)))
+            self._unsaved.clear()
+            self._replaced = True
+
+    def add(self, ids: Sequence[str], vectors) -> None:
+        """Append (or replace) rows; ``vectors`` is an ``(n, dim)`` array."""
+        vectors = np.asarray(vectors, dtype=self.dtype)
+        if not len(ids):
+            return
+        with self._lock:
+            self._add_rows(list(ids), vectors)
+            if self.path_prefix and not self._replaced:
+                self._unsaved.update(zip(ids, vectors))
+
+    def remove(self, ids: Iterable[str]) -> None:
+        with self._lock:
+            ids = list(ids)
+            self._remove_rows(ids)
+            if self.path_prefix and not self._replaced:
+                self._unsaved.update((chunk_id, None) for chunk_id in ids)
+
+    def _add_rows(self, ids: List[str], vectors: np.ndarray) -> None:
+        self._remove_rows([chunk_id for chunk_id in ids if chunk_id in self._row_of])
+        matrix = vectors if self._matrix is None or not len(self._ids) else np.concatenate([self._matrix, vectors])
+        self._set_matrix(self._ids + ids, np.ascontiguousarray(matrix))
+
+    def _remove_rows(self, ids: Iterable[str]) -> None:
+        rows = [self._row_of[chunk_id] for chunk_id in ids if chunk_id in self._row_of]
+        if not rows:
+            return
+        keep = np.ones(len(self._ids), dtype=bool)
+        keep[rows] = False
+        self._set_matrix(
+            [chunk_id for chunk_id, kept in zip(self._ids, keep) if kept],
+            np.ascontiguousarray(self._matrix[keep]),
+        )
+
+    def _scores(self, queries: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """``(rows, queries)`` similarity, higher is closer."""
+        matrix = self._matrix if rows is None else self._matrix[rows]
+        sq_norms = self._sq_norms if rows is None or self._sq_norms is None else self._sq_norms[rows]
+        if self.dtype == np.float32:
+            dots = matrix @ queries.T
+        else:
+            dots = np.empty((len(matrix), len(queries)), dtype=np.float32)
+            buffer = np.empty((_BLOCK_ROWS, matrix.shape[1]), dtype=np.float32)
+            for start in range(0, len(matrix), _BLOCK_ROWS):
+                block = buffer[:min(_BLOCK_ROWS, len(matrix) - start)]
+                block[...] = matrix[start:start + _BLOCK_ROWS]
+                dots[start:start + len(block)] = block @ queries.T
+        if self.space == "l2":
+            # ||x - q||^2 = ||x||^2 - 2 x.q + ||q||^2; the ||q||^2 term does not change the order
+            return 2 * dots - sq_norms[:, None]
+        if self.space == "cosine":
+            return dots / np.sqrt(np.maximum(sq_norms, 1e-12))[:, None]
+        return dots
+
+    def search_batch(
+        self, query_vectors, top_k: int = 10, allowed_ids: Optional[Iterable[str]] = None
+    ) -> List[List[Tuple[str, float]]]:
+        """Top ``top_k`` ``(chunk id, score)`` pairs for each query row, best first.
+
+        With ``allowed_ids`` only those rows are scored.
+        """
+        self.reload_if_changed()
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        with self._lock:
+            rows = None
+            if allowed_ids is not None:
+                rows = np.array(
+                    sorted(self._row_of[chunk_id] for chunk_id in allowed_ids if chunk_id in self._row_of),
+                    dtype=np.intp,
+                )
+            candidate_count = len(self._ids) if rows is None else len(rows)
+            if not candidate_count:
+                return [[] for _ in queries]
+            scores = self._scores(queries, rows)
+            k = min(top_k, candidate_count)
+            top_rows = np.argpartition(-scores, k - 1, axis=0)[:k]
+            results = []
+            for column in range(len(queries)):
+                best = top_rows[:, column]
+                best = best[np.argsort(-scores[best, column])]
+                row_ids = best if rows is None else rows[best]
+                results.append([
+                    (self._ids[row], float(score)) for row, score in zip(row_ids, scores[best, column])
+                ])
+            return results
+
+    def search(self, query_vector, top_k: int = 10, allowed_ids: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        return self.search_batch(query_vector, top_k, allowed_ids)[0]
+
+    # Persistence
+
+    def save(self) -> None:
+        """Merge with the saved rows, write a new matrix file, then atomically point the metadata at it."""
+        if not self.path_prefix:
+            return
+        with self._lock, file_lock(self._meta_path):
+            if not self._replaced:
+                # Pick up rows other workers saved since our last load
+                self._reload_locked()
+            os.makedirs(os.path.dirname(self.path_prefix) or ".", exist_ok=True)
+            matrix_path = f"{self.path_prefix}-{time.time_ns()}.npy"
+            matrix = self._matrix if self._matrix is not None else np.zeros((0, 0), dtype=self.dtype)
+            np.save(matrix_path, matrix)
+            tmp_path = f"{self._meta_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"ids": self._ids, "matrix": os.path.basename(matrix_path), "space": self.space}, f)
+            os.replace(tmp_path, self._meta_path)
+            self._loaded_version = file_version(self._meta_path)
+            self._unsaved.clear()
+            self._replaced = False
+            # Workers still mapping an old file keep reading it until they reload
+            for old_path in glob.glob(f"{glob.escape(self.path_prefix)}-*.npy"):
+                stamp = old_path[len(self.path_prefix) + 1:-len(".npy")]
+                if old_path != matrix_path and stamp.isdigit():
+                    os.remove(old_path)
+            self._set_matrix(self._ids, np.load(matrix_path, mmap_mode="r"))
+
+    def _load(self) -> None:
+        """Map the saved matrix, then replay rows this process has not saved yet."""
+        version = file_version(self._meta_path)
+        with open(self._meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        matrix_path = os.path.join(os.path.dirname(self.path_prefix), meta["matrix"])
+        matrix = np.load(matrix_path, mmap_mode="r")
+        with self._lock:
+            if matrix.dtype != self.dtype:
+                matrix = matrix.astype(self.dtype)
+            self.space = meta.get("space", self.space)
+            self._set_matrix(meta["ids"], matrix)
+            if self._unsaved:
+                self._remove_rows(list(self._unsaved))
+                added = [(chunk_id, vector) for chunk_id, vector in self._unsaved.items() if vector is not None]
+                if added:
+                    self._add_rows([chunk_id for chunk_id, _ in added], np.stack([vector for _, vector in added]))
+            self._loaded_version = version
+
+    def _reload_locked(self) -> None:
+        if not self._replaced and file_version(self._meta_path) not in (None, self._loaded_version):
+            self._load()
+
+    def reload_if_changed(self) -> None:
+        """Pick up a matrix saved by another worker."""
+        if not self.path_prefix or self._replaced:
+            return
+        if file_version(self._meta_path) in (None, self._loaded_version):
+            return
+        with self._lock, file_lock(self._meta_path, shared=True):
+            self._reload_locked()
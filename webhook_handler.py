@@ -1,18 +1,179 @@
 import requests
+import gzip
 import json
+import threading
+import time
+from requests.adapters import HTTPAdapter
 from typing import Dict, Optional, List
 from datetime import datetime
+from email.utils import parsedate_to_datetime
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Keep-alive connections kept per host by the shared HTTP session
+WEBHOOK_POOL_SIZE = int(os.getenv("WEBHOOK_POOL_SIZE", "16"))
+
+# Which handler main.py uses: "webhook" (generic JSON), "hubspot" or "zoho"
+CRM_PROVIDER = os.getenv("CRM_PROVIDER", "webhook").lower()
+
+# Batching mode: the outbox hands pending leads to send_leads() in groups of up
+# to CRM_BATCH_SIZE (capped by the CRM's per-call record limit)
+CRM_BATCH_ENABLED = os.getenv("CRM_BATCH_ENABLED", "0") == "1"
+CRM_BATCH_SIZE = int(os.getenv("CRM_BATCH_SIZE", "100"))
+
+# Rate-limit pacing: after a 429 calls are spaced out (honouring Retry-After)
+# and the spacing shrinks again as calls succeed. A call gives up waiting after
+# CRM_RATE_LIMIT_MAX_WAIT_SECONDS and the outbox retries. Pacing is per
+# process: with N gunicorn workers the CRM sees up to N times the rate one
+# worker allows, so set CRM_MIN_INTERVAL_SECONDS to N times the gap you need.
+CRM_MIN_INTERVAL_SECONDS = float(os.getenv("CRM_MIN_INTERVAL_SECONDS", "0"))
+CRM_MAX_INTERVAL_SECONDS = float(os.getenv("CRM_MAX_INTERVAL_SECONDS", "10"))
+CRM_RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv("CRM_RATE_LIMIT_MAX_WAIT_SECONDS", "30"))
+
+# Whole-batch budget for send_leads(), waits and request timeouts included.
+# Keep it below OUTBOX_LEASE_SECONDS, or another worker reclaims the batch
+# mid-send and the CRM gets duplicates; leads not sent in time are retried.
+CRM_SEND_BUDGET_SECONDS = float(os.getenv("CRM_SEND_BUDGET_SECONDS", "45"))
+CRM_REQUEST_TIMEOUT_SECONDS = 10
+
+
+class CRMDeadlineExceeded(Exception):
+    """The batch's send budget ran out before the CRM call could start."""
+
+
+def _retry_after_seconds(response: requests.Response) -> Optional[float]:
+    """Parse a Retry-After header given in seconds or as an HTTP date."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptivePacer:
+    """Space out calls to a rate-limited API, shared by every sending thread of one process.
+
+    A 429 doubles the gap between calls (and pauses for Retry-After when
+    given); each success shrinks it by ``recovery`` back toward the minimum.
+    429s arriving within one gap of the last slowdown count as the same
+    event, so concurrent senders do not compound it.
+    """
+
+    def __init__(
+        self,
+        min_interval: float = CRM_MIN_INTERVAL_SECONDS,
+        max_interval: float = CRM_MAX_INTERVAL_SECONDS,
+        recovery: float = 0.8,
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.recovery = recovery
+        self.interval = min_interval
+        self.rate_limited_count = 0
+        self._next_at = 0.0
+        self._backed_off_at = 0.0
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        """Seconds until the next call may start."""
+        return max(0.0, self._next_at - time.monotonic())
+
+    def wait(self) -> None:
+        """Block until this caller's turn, reserving the slot after it."""
+        with self._lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_at)
+            self._next_at = start_at + self.interval
+        if start_at > now:
+            time.sleep(start_at - now)
+
+    def succeeded(self) -> None:
+        with self._lock:
+            self.interval = max(self.min_interval, self.interval * self.recovery)
+            if self.interval < 0.001:
+                self.interval = self.min_interval
+
+    def rate_limited(self, retry_after: Optional[float] = None) -> None:
+        with self._lock:
+            self.rate_limited_count += 1
+            now = time.monotonic()
+            if now - self._backed_off_at >= self.interval:
+                self.interval = min(self.max_interval, max(self.interval * 2, 0.05))
+                self._backed_off_at = now
+            pause = self.interval if retry_after is None else retry_after
+            self._next_at = max(self._next_at, now + pause)
+
+    def stats(self) -> Dict:
+        return {"interval_seconds": round(self.interval, 4), "rate_limited": self.rate_limited_count}
+
 class WebhookHandler:
     """Handle webhook integrations for CRM and lead management."""
     
+    # Records the CRM accepts per call; the generic webhook takes one lead per post
+    MAX_BATCH_RECORDS = 1
+    
     def __init__(self):
         self.webhook_url = os.getenv("CRM_WEBHOOK_URL", "")
         self.webhook_secret = os.getenv("WEBHOOK_SECRET", "")
+        # One pooled keep-alive session instead of a new connection per post
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=WEBHOOK_POOL_SIZE)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.pacer = AdaptivePacer()
+        self.batch_size = min(CRM_BATCH_SIZE, self.MAX_BATCH_RECORDS) if CRM_BATCH_ENABLED else 1
+    
+    def _post_paced(self, url: str, deadline: Optional[float] = None, **kwargs) -> requests.Response:
+        """POST through the pacer, waiting out 429s until the wait budget is spent.
+        
+        ``deadline`` (``time.monotonic()``) caps the whole call, request
+        timeout included. Returns the last response, which is still a 429 if
+        the budget ran out; raises ``CRMDeadlineExceeded`` if no attempt fits.
+        """
+        wait_deadline = time.monotonic() + CRM_RATE_LIMIT_MAX_WAIT_SECONDS
+        if deadline is not None:
+            wait_deadline = min(wait_deadline, deadline)
+        response = None
+        while True:
+            timeout = CRM_REQUEST_TIMEOUT_SECONDS
+            if deadline is not None:
+                timeout = min(timeout, deadline - time.monotonic() - self.pacer.delay())
+                if timeout <= 0:
+                    if response is not None:
+                        return response
+                    raise CRMDeadlineExceeded("send budget spent before the CRM call could start")
+            self.pacer.wait()
+            response = self.session.post(url, timeout=timeout, **kwargs)
+            if response.status_code != 429:
+                self.pacer.succeeded()
+                return response
+            self.pacer.rate_limited(_retry_after_seconds(response))
+            if time.monotonic() + self.pacer.delay() > wait_deadline:
+                return response
+    
+    def send_leads(self, leads: List[Dict], deadline: Optional[float] = None) -> List[Optional[str]]:
+        """Send several leads (``send_lead`` keyword dicts); one error per lead, None on success.
+        
+        All of them share one ``deadline`` (default: ``CRM_SEND_BUDGET_SECONDS``
+        from now); leads not sent by then fail and are retried by the outbox.
+        """
+        if deadline is None:
+            deadline = time.monotonic() + CRM_SEND_BUDGET_SECONDS
+        results = []
+        for lead in leads:
+            if time.monotonic() >= deadline:
+                results.append("send budget spent")
+            else:
+                results.append(None if self.send_lead(**lead, deadline=deadline) else "delivery failed")
+        return results
         
     def send_lead(
         self,
@@ -22,9 +183,10 @@ class WebhookHandler:
         message: str,
         interested_products: List[str] = None,
         session_id: str = "",
-        chat_history: List[Dict] = None
+        chat_history: List[Dict] = None,
+        deadline: Optional[float] = None
     ) -> bool:
-        """Send lead data to CRM via webhook."""
+        """Send lead data to CRM via webhook (giving up at ``deadline``, if given)."""
         
         if not self.webhook_url:
             print("⚠️ No webhook URL configured")
@@ -72,11 +234,11 @@ class WebhookHandler:
             headers["X-Webhook-Secret"] = self.webhook_secret
         
         try:
-            response = requests.post(
+            response = self._post_paced(
                 self.webhook_url,
+                deadline=deadline,
                 json=payload,
-                headers=headers,
-                timeout=10
+                headers=headers
             )
             
             if response.status_code in [200, 201, 202]:
@@ -104,18 +266,14 @@ class WebhookHandler:
             })
         return summary
     
-    def send_chat_log(
+    def build_chat_log(
         self,
         session_id: str,
         chat_history: List[Dict],
         user_info: Optional[Dict] = None
-    ) -> bool:
-        """Send full chat log to webhook for analytics."""
-        
-        if not self.webhook_url:
-            return False
-        
-        payload = {
+    ) -> Dict:
+        """Build the analytics payload for one chat session."""
+        return {
             "type": "chat_log",
             "timestamp": datetime.now().isoformat(),
             "session_id": session_id,
@@ -126,6 +284,19 @@ class WebhookHandler:
                 "duration": self._calculate_duration(chat_history)
             }
         }
+    
+    def send_chat_log(
+        self,
+        session_id: str,
+        chat_history: List[Dict],
+        user_info: Optional[Dict] = None
+    ) -> bool:
+        """Send full chat log to webhook for analytics."""
+        
+        if not self.webhook_url:
+            return False
+        
+        payload = self.build_chat_log(session_id, chat_history, user_info)
         
         headers = {
             "Content-Type": "application/json",
@@ -133,7 +304,7 @@ class WebhookHandler:
         }
         
         try:
-            response = requests.post(
+            response = self.session.post(
                 self.webhook_url,
                 json=payload,
                 headers=headers,
@@ -143,6 +314,42 @@ class WebhookHandler:
         except:
             return False
     
+    def send_chat_logs(self, chat_logs: List[Dict], compress: bool = False) -> bool:
+        """Send several ``build_chat_log`` payloads in one ``chat_log_batch`` request."""
+        
+        if not self.webhook_url:
+            return False
+        
+        body = json.dumps({
+            "type": "chat_log_batch",
+            "timestamp": datetime.now().isoformat(),
+            "count": len(chat_logs),
+            "chat_logs": chat_logs,
+        }).encode("utf-8")
+        
+        headers = {
+            "Content-Type": "application/json",
+            "X-Webhook-Secret": self.webhook_secret
+        }
+        if compress:
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+        
+        try:
+            response = self.session.post(
+                self.webhook_url,
+                data=body,
+                headers=headers,
+                timeout=10
+            )
+            if response.status_code in [200, 201, 202]:
+                return True
+            print(f"❌ Chat log batch failed: {response.status_code} - {response.text[:200]}")
+            return False
+        except Exception as e:
+            print(f"❌ Chat log batch error: {str(e)}")
+            return False
+    
     def _calculate_duration(self, chat_history: List[Dict]) -> int:
         """Calculate chat duration in seconds."""
         if len(chat_history) < 2:
@@ -163,68 +370,174 @@ class WebhookHandler:
 
 # Webhook templates for popular CRMs
 
+def _split_name(name: str):
+    name_parts = name.strip().split(maxsplit=1)
+    return (name_parts[0] if name_parts else ""), (name_parts[1] if len(name_parts) > 1 else "")
+
+
+def _chunks(items: List, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
 class HubSpotWebhook(WebhookHandler):
-    """HubSpot-specific webhook handler."""
+    """HubSpot-specific webhook handler.
+    
+    Single leads go to the form URL in ``CRM_WEBHOOK_URL``. In batching mode,
+    with a private-app token in ``WEBHOOK_SECRET``, leads are created through
+    the contacts batch API (``HUBSPOT_BATCH_URL``), up to 100 per call.
+    """
+    
+    MAX_BATCH_RECORDS = 100
+    
+    def __init__(self):
+        super().__init__()
+        self.batch_url = os.getenv(
+            "HUBSPOT_BATCH_URL", "https://api.hubapi.com/crm/v3/objects/contacts/batch/create"
+        )
+    
+    def _fields(self, name: str, email: str, phone: str, message: str, **kwargs) -> Dict[str, str]:
+        first_name, last_name = _split_name(name)
+        fields = {
+            "firstname": first_name,
+            "lastname": last_name,
+            "email": email,
+            "phone": phone,
+            "message": message,
+            "lead_source": "Koolboks Chatbot"
+        }
+        
+        # Add interested products as custom field
+        if kwargs.get("interested_products"):
+            fields["interested_products"] = ", ".join(kwargs["interested_products"])
+        return fields
     
-    def send_lead(self, name: str, email: str, phone: str, message: str, **kwargs):
+    def send_lead(self, name: str, email: str, phone: str, message: str, deadline: Optional[float] = None, **kwargs):
         """Format lead data for HubSpot."""
         
         payload = {
             "fields": [
-                {"name": "firstname", "value": name.split()[0] if name else ""},
-                {"name": "lastname", "value": " ".join(name.split()[1:]) if len(name.split()) > 1 else ""},
-                {"name": "email", "value": email},
-                {"name": "phone", "value": phone},
-                {"name": "message", "value": message},
-                {"name": "lead_source", "value": "Koolboks Chatbot"}
+                {"name": field, "value": value}
+                for field, value in self._fields(name, email, phone, message, **kwargs).items()
             ]
         }
         
-        # Add interested products as custom field
-        if kwargs.get("interested_products"):
-            payload["fields"].append({
-                "name": "interested_products",
-                "value": ", ".join(kwargs["interested_products"])
-            })
-        
         try:
-            response = requests.post(
+            response = self._post_paced(
                 self.webhook_url,
-                json=payload,
-                timeout=10
+                deadline=deadline,
+                json=payload
             )
             return response.status_code in [200, 201, 202]
         except:
             return False
+    
+    def send_leads(self, leads: List[Dict], deadline: Optional[float] = None) -> List[Optional[str]]:
+        """Create contacts through the batch API, mapping errors back to each lead.
+        
+        Every call for these leads, including individual fallback sends,
+        shares one ``deadline`` (see ``WebhookHandler.send_leads``).
+        """
+        if deadline is None:
+            deadline = time.monotonic() + CRM_SEND_BUDGET_SECONDS
+        if not self.webhook_secret or len(leads) < 2:
+            return super().send_leads(leads, deadline)
+        results = []
+        for chunk in _chunks(leads, self.batch_size):
+            results.extend(self._create_contacts(chunk, deadline))
+        return results
+    
+    def _create_contacts(self, leads: List[Dict], deadline: float) -> List[Optional[str]]:
+        payload = {
+            "inputs": [
+                # The trace id comes back in error contexts, tying each error to its lead
+                {"properties": self._fields(**lead), "objectWriteTraceId": str(position)}
+                for position, lead in enumerate(leads)
+            ]
+        }
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.webhook_secret}"
+        }
+        
+        try:
+            response = self._post_paced(self.batch_url, deadline=deadline, json=payload, headers=headers)
+        except Exception as e:
+            print(f"❌ HubSpot batch error: {str(e)}")
+            return [str(e)] * len(leads)
+        
+        if response.status_code == 429:
+            return ["rate limited"] * len(leads)
+        if response.status_code in [200, 201, 207]:
+            results: List[Optional[str]] = [None] * len(leads)
+            try:
+                errors = response.json().get("errors", [])
+            except ValueError:
+                errors = []
+            for error in errors:
+                for position in error.get("context", {}).get("objectWriteTraceId", []):
+                    if str(position).isdigit() and int(position) < len(leads):
+                        results[int(position)] = error.get("message", "error")
+            failed = sum(result is not None for result in results)
+            print(f"✅ HubSpot batch: {len(leads) - failed} created, {failed} failed")
+            return results
+        if response.status_code < 500:
+            # The batch API rejects the whole batch for one bad contact; retry
+            # the leads one by one so the valid ones still go through
+            print(f"⚠️ HubSpot batch rejected ({response.status_code}); sending {len(leads)} leads individually")
+            return super().send_leads(leads, deadline)
+        print(f"❌ HubSpot batch failed: {response.status_code} - {response.text[:200]}")
+        return [f"HTTP {response.status_code}"] * len(leads)
 
 
 class ZohoCRMWebhook(WebhookHandler):
-    """Zoho CRM-specific webhook handler."""
+    """Zoho CRM-specific webhook handler.
+    
+    Posts to the Insert Records API, which takes up to 100 records per call
+    and reports a result per record, in order.
+    """
+    
+    MAX_BATCH_RECORDS = 100
     
-    def send_lead(self, name: str, email: str, phone: str, message: str, **kwargs):
+    def _record(self, name: str, email: str, phone: str, message: str, **kwargs) -> Dict:
         """Format lead data for Zoho CRM."""
-        
-        # Split name into first and last name
-        name_parts = name.strip().split(maxsplit=1)
-        first_name = name_parts[0] if name_parts else ""
-        last_name = name_parts[1] if len(name_parts) > 1 else ""
-        
-        payload = {
-            "data": [{
-                "First_Name": first_name,
-                "Last_Name": last_name,
-                "Email": email,
-                "Phone": phone,
-                "Description": message,
-                "Lead_Source": "Koolboks Chatbot",
-                "Company": kwargs.get("company", "Koolboks Customer")
-            }]
+        first_name, last_name = _split_name(name)
+        record = {
+            "First_Name": first_name,
+            "Last_Name": last_name,
+            "Email": email,
+            "Phone": phone,
+            "Description": message,
+            "Lead_Source": "Koolboks Chatbot",
+            "Company": kwargs.get("company", "Koolboks Customer")
         }
         
         # Add interested products if available
         if kwargs.get("interested_products"):
-            payload["data"][0]["Product_Interest"] = ", ".join(kwargs["interested_products"])
-        
+            record["Product_Interest"] = ", ".join(kwargs["interested_products"])
+        return record
+    
+    def send_lead(self, name: str, email: str, phone: str, message: str, deadline: Optional[float] = None, **kwargs):
+        """Send one lead to Zoho CRM."""
+        error = self._insert_records([self._record(name, email, phone, message, **kwargs)], deadline)[0]
+        if error is None:
+            print(f"✅ Lead sent to Zoho CRM: {name}")
+            return True
+        print(f"❌ Zoho CRM error: {error}")
+        return False
+    
+    def send_leads(self, leads: List[Dict], deadline: Optional[float] = None) -> List[Optional[str]]:
+        """Insert leads up to ``batch_size`` records per call; one error per lead, None on success."""
+        if deadline is None:
+            deadline = time.monotonic() + CRM_SEND_BUDGET_SECONDS
+        results = []
+        for chunk in _chunks(leads, self.batch_size):
+            results.extend(self._insert_records([self._record(**lead) for lead in chunk], deadline))
+        failed = sum(result is not None for result in results)
+        print(f"✅ Zoho CRM batch: {len(leads) - failed} inserted, {failed} failed")
+        return results
+    
+    def _insert_records(self, records: List[Dict], deadline: Optional[float] = None) -> List[Optional[str]]:
         headers = {
             "Content-Type": "application/json"
         }
@@ -234,23 +547,32 @@ class ZohoCRMWebhook(WebhookHandler):
             headers["Authorization"] = f"Zoho-oauthtoken {self.webhook_secret}"
         
         try:
-            response = requests.post(
+            response = self._post_paced(
                 self.webhook_url,
-                json=payload,
-                headers=headers,
-                timeout=10
+                deadline=deadline,
+                json={"data": records},
+                headers=headers
             )
-            
-            if response.status_code in [200, 201, 202]:
-                print(f"✅ Lead sent to Zoho CRM: {first_name} {last_name}")
-                return True
-            else:
-                print(f"❌ Zoho CRM error: {response.status_code} - {response.text}")
-                return False
         except Exception as e:
-            print(f"❌ Zoho CRM error: {str(e)}")
-            return False
+            return [str(e)] * len(records)
+        
+        if response.status_code == 429:
+            return ["rate limited"] * len(records)
+        # Zoho answers with one entry per record, in request order, even when some fail
+        try:
+            entries = response.json().get("data", [])
+        except (ValueError, AttributeError):
+            entries = []
+        if len(entries) == len(records):
+            return [
+                None if entry.get("status") == "success"
+                else f"{entry.get('code', 'ERROR')}: {entry.get('message', '')}"
+                for entry in entries
+            ]
+        if response.status_code in [200, 201, 202]:
+            return [None] * len(records)
+        return [f"HTTP {response.status_code} - {response.text[:200]}"] * len(records)
 
 
 # Initialize default webhook handler
-webhook_handler = WebhookHandler()
+webhook_handler = {"hubspot": HubSpotWebhook, "zoho": ZohoCRMWebhook}.get(CRM_PROVIDER, WebhookHandler)()
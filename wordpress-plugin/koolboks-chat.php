@@ -117,6 +117,7 @@ class Koolboks_Chat {
     public function register_settings() {
         // Connection settings
         register_setting('koolboks_chat_settings', 'koolboks_api_url');
+        register_setting('koolboks_chat_settings', 'koolboks_admin_token');
         register_setting('koolboks_chat_settings', 'koolboks_chat_enabled');
         
         // Appearance settings
@@ -170,6 +171,20 @@ class Koolboks_Chat {
                                         <p class="description">Your backend API URL (Railway, Render, or ngrok)</p>
                                     </td>
                                 </tr>
+                                <tr>
+                                    <th scope="row">
+                                        <label for="koolboks_admin_token">Admin Token</label>
+                                    </th>
+                                    <td>
+                                        <input type="password" 
+                                               id="koolboks_admin_token" 
+                                               name="koolboks_admin_token" 
+                                               value="<?php echo esc_attr(get_option('koolboks_admin_token', '')); ?>" 
+                                               class="regular-text"
+                                               autocomplete="off">
+                                        <p class="description">The API's ADMIN_TOKEN; required to upload documents from the Knowledge Base page</p>
+                                    </td>
+                                </tr>
                                 <tr>
                                     <th scope="row">
                                         <label for="koolboks_chat_enabled">Enable Chat</label>
@@ -709,6 +724,47 @@ class Koolboks_Chat {
             
             <script>
             jQuery(document).ready(function($) {
+                var apiUrl = '<?php echo esc_js(get_option('koolboks_api_url')); ?>';
+                // Only rendered on this admin-only page; uploads are rejected without it
+                var adminToken = '<?php echo esc_js(get_option('koolboks_admin_token', '')); ?>';
+                var POLL_INTERVAL_MS = 2000;
+                var POLL_TIMEOUT_MS = 10 * 60 * 1000;
+                
+                // Uploads are processed in the background: poll the job until it finishes
+                function waitForJob(jobId) {
+                    var deferred = $.Deferred();
+                    var deadline = Date.now() + POLL_TIMEOUT_MS;
+                    
+                    function pollAgain(message) {
+                        if (Date.now() > deadline) {
+                            deferred.reject(message);
+                        } else {
+                            setTimeout(poll, POLL_INTERVAL_MS);
+                        }
+                    }
+                    
+                    function poll() {
+                        $.getJSON(apiUrl + '/upload/' + encodeURIComponent(jobId)).done(function(job) {
+                            if (job.status === 'completed') {
+                                deferred.resolve(job);
+                            } else if (job.status === 'failed') {
+                                deferred.reject((job.errors || []).join('; ') || 'Processing failed.');
+                            } else {
+                                pollAgain('Processing is taking longer than expected. Check back later.');
+                            }
+                        }).fail(function(xhr) {
+                            if (xhr.status === 404) {
+                                deferred.reject('The server lost track of this upload. Please upload it again.');
+                            } else {
+                                pollAgain('Could not check the processing status. Please try again later.');
+                            }
+                        });
+                    }
+                    
+                    poll();
+                    return deferred.promise();
+                }
+                
                 $('#koolboks-upload-form').on('submit', function(e) {
                     e.preventDefault();
                     
@@ -720,32 +776,50 @@ class Koolboks_Chat {
                     
                     $('#upload-progress').show();
                     $('#upload-status').text('Uploading...');
+                    $('#upload-progress .progress-fill').css('width', '0%');
                     
-                    // Upload files one at a time
+                    // Upload files one at a time, then wait for each to be processed
                     var uploadPromises = [];
+                    var finished = 0;
                     for (var i = 0; i < files.length; i++) {
                         var formData = new FormData();
                         formData.append('file', files[i]);  // Changed from 'files[]' to 'file'
                         
                         uploadPromises.push(
                             $.ajax({
-                                url: '<?php echo esc_js(get_option('koolboks_api_url')); ?>/upload/',
+                                url: apiUrl + '/upload/',
                                 type: 'POST',
+                                headers: { 'X-Admin-Token': adminToken },
                                 data: formData,
                                 processData: false,
                                 contentType: false
+                            }).then(function(response) {
+                                if (!response.job_id) {
+                                    return $.Deferred().reject(response.error || 'Upload failed.').promise();
+                                }
+                                $('#upload-status').text('Processing documents...');
+                                return waitForJob(response.job_id);
+                            }, function(xhr) {
+                                if (xhr.status === 403 || xhr.status === 404) {
+                                    return $.Deferred().reject('Upload rejected: set the Admin Token in Koolboks Chat settings to the API\'s ADMIN_TOKEN.').promise();
+                                }
+                                return $.Deferred().reject('Upload failed. Please try again.').promise();
+                            }).done(function() {
+                                finished++;
+                                $('#upload-progress .progress-fill').css('width', (100 * finished / files.length) + '%');
+                                $('#upload-status').text('Processed ' + finished + ' of ' + files.length + ' documents...');
                             })
                         );
                     }
                     
                     $.when.apply($, uploadPromises).done(function() {
-                        $('#upload-status').text('Upload successful!');
+                        $('#upload-status').text('Upload successful! Documents are ready.');
                         $('#koolboks-pdf-file').val('');
                         setTimeout(function() {
                             $('#upload-progress').hide();
                         }, 2000);
-                    }).fail(function() {
-                        $('#upload-status').text('Upload failed. Please try again.');
+                    }).fail(function(error) {
+                        $('#upload-status').text(typeof error === 'string' ? error : 'Upload failed. Please try again.');
                     });
                 });
             });